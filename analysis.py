@@ -0,0 +1,361 @@
+import json
+import time
+from metrics import record
+from prompt import BATCH_CALL_ANALYSIS_PROMPT, BATCH_CALL_TEMPLATE, CALL_ANALYSIS_PROMPT
+
+
+def clean_json_response(response_text):
+    """Clean JSON response by removing markdown code blocks and extra formatting"""
+    # Remove markdown code blocks
+    response_text = response_text.strip()
+
+    # Remove ```json and ``` markers
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]  # Remove ```json
+    elif response_text.startswith('```'):
+        response_text = response_text[3:]   # Remove ```
+
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]  # Remove closing ```
+
+    # Clean up any extra whitespace
+    response_text = response_text.strip()
+
+    return response_text
+
+def parse_text_response(response_text):
+    """Parse the text format response from Gemini into a structured format"""
+    try:
+        lines = response_text.strip().split('\n')
+        parsed_data = {}
+        key_issues = []
+
+        for line in lines:
+            line = line.strip()
+            if line.startswith('Final Customer Sentiment:'):
+                parsed_data['final_customer_sentiment'] = line.split(':', 1)[1].strip()
+            elif line.startswith('Resolution Summary:'):
+                parsed_data['resolution_summary'] = line.split(':', 1)[1].strip()
+            elif line.startswith('Escalation Required:'):
+                parsed_data['escalation_required'] = line.split(':', 1)[1].strip()
+            elif line.startswith('[') and line.endswith(']') and line != '[Issue 1]' and line != '[Issue 2]':
+                # Extract issues from brackets
+                issue = line[1:-1].strip()
+                if issue and not issue.startswith('Issue'):
+                    key_issues.append(issue)
+
+        if key_issues:
+            parsed_data['key_issues'] = key_issues
+
+        return parsed_data if parsed_data else None
+    except Exception as e:
+        print(f"Error parsing text response: {e}")
+        return None
+
+def parse_analysis(response_text):
+    """Parse a Gemini response, trying JSON first and the text format second.
+
+    Returns (parsed, format) where format is 'json', 'text' or None. The
+    fallback taken (a markdown fence stripped, the text format) is recorded
+    as a metrics 'parse' event.
+    """
+    start = time.perf_counter()
+    fenced = response_text.strip().startswith('```')
+    try:
+        parsed, fmt = json.loads(clean_json_response(response_text)), 'json'
+    except json.JSONDecodeError:
+        parsed = parse_text_response(response_text)
+        fmt = 'text' if parsed else None
+    record('parse', time.perf_counter() - start, format='json_fenced' if fmt == 'json' and fenced else fmt)
+    return parsed, fmt
+
+def usage_from_response(response):
+    """Extract prompt/response token counts from a Gemini response"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return {}
+    return {
+        'prompt_tokens': usage.prompt_token_count,
+        'response_tokens': usage.candidates_token_count,
+    }
+
+def gemini_model_name(gemini_model):
+    """Model name of a GenerativeModel, without the 'models/' prefix"""
+    return getattr(gemini_model, 'model_name', str(gemini_model)).removeprefix('models/')
+
+# Ask Gemini for a bare JSON body; the fence/text fallbacks stay for models that ignore it
+JSON_RESPONSE_CONFIG = {'response_mime_type': 'application/json'}
+
+class IncrementalJSONParser:
+    """Pull completed top-level fields out of a JSON object while its text is still streaming in.
+
+    feed() takes the next chunk of text and returns the (key, value) pairs it
+    completed, in order. A leading markdown fence is tolerated.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = None  # start of the next unread key, once the opening brace is seen
+        self.fields = {}
+        self.closed = False
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos, chars=' \t\r\n'):
+        while pos < len(self.buffer) and self.buffer[pos] in chars:
+            pos += 1
+        return pos
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.pos is None:
+            start = self.buffer.find('{')
+            if start < 0:
+                return []
+            self.pos = start + 1
+
+        completed = []
+        while not self.closed:
+            pos = self._skip(self.pos, ' \t\r\n,')
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == '}':
+                self.closed = True
+                break
+            try:
+                key, pos = self._decoder.raw_decode(self.buffer, pos)
+                pos = self._skip(pos)
+                if pos >= len(self.buffer) or self.buffer[pos] != ':':
+                    break
+                pos = self._skip(pos + 1)
+                value, end = self._decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break  # the key or value is still arriving
+            if not isinstance(value, (str, list, dict)):
+                # "85" may still become "850": numbers and literals need a delimiter after them
+                after = self._skip(end)
+                if after >= len(self.buffer) or self.buffer[after] not in ',}':
+                    break
+            self.fields[key] = value
+            completed.append((key, value))
+            self.pos = end
+        return completed
+
+def analyze_transcript(gemini_model, transcript, cache=None, refresh=False):
+    """Run the call analysis prompt on a transcript and parse the result.
+
+    With an AnalysisCache, a previous analysis of the same transcript with the
+    same prompt template and model is returned instead of calling Gemini;
+    refresh=True skips the lookup and overwrites the cached entry.
+    """
+    if cache is not None:
+        key, parts = cache.make_key(transcript, CALL_ANALYSIS_PROMPT, gemini_model_name(gemini_model))
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                record('gemini', 0.0, cached=True, model=gemini_model_name(gemini_model))
+                return dict(cached, cached=True)
+
+    prompt = CALL_ANALYSIS_PROMPT.format(transcript=transcript)
+    start = time.perf_counter()
+    response = gemini_model.generate_content(prompt, generation_config=JSON_RESPONSE_CONFIG)
+    raw = response.text.strip()
+    usage = usage_from_response(response)
+    record('gemini', time.perf_counter() - start, cached=False, model=gemini_model_name(gemini_model), **usage)
+    parsed, fmt = parse_analysis(raw)
+    analysis = {
+        'parsed': parsed,
+        'format': fmt,
+        'raw': raw,
+        'usage': usage,
+    }
+
+    # Unparseable responses are not cached so the next attempt asks again
+    if cache is not None and parsed is not None:
+        cache.put(key, parts, analysis)
+    return dict(analysis, cached=False)
+
+def stream_analysis(gemini_model, transcript, cache=None, refresh=False):
+    """Streaming analyze_transcript: yields ('field', (key, value)) as each field completes, then ('done', analysis).
+
+    The final analysis has the same shape as analyze_transcript's plus
+    'timings' with time to the first field and total latency in seconds. A
+    cache hit replays the cached fields immediately.
+    """
+    start = time.perf_counter()
+    if cache is not None:
+        key, parts = cache.make_key(transcript, CALL_ANALYSIS_PROMPT, gemini_model_name(gemini_model))
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                if cached['format'] == 'json' and isinstance(cached['parsed'], dict):
+                    for item in cached['parsed'].items():
+                        yield 'field', item
+                elapsed = round(time.perf_counter() - start, 3)
+                record('gemini', elapsed, cached=True, model=gemini_model_name(gemini_model))
+                yield 'done', dict(cached, cached=True, timings={'first_field_s': elapsed, 'total_s': elapsed})
+                return
+
+    prompt = CALL_ANALYSIS_PROMPT.format(transcript=transcript)
+    response = gemini_model.generate_content(prompt, generation_config=JSON_RESPONSE_CONFIG, stream=True)
+    parser = IncrementalJSONParser()
+    chunks = []
+    first_field = None
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            continue  # chunks without text parts, e.g. a bare finish reason
+        chunks.append(text)
+        for item in parser.feed(text):
+            if first_field is None:
+                first_field = time.perf_counter() - start
+            yield 'field', item
+
+    raw = ''.join(chunks).strip()
+    usage = usage_from_response(response)
+    record('gemini', time.perf_counter() - start, cached=False, model=gemini_model_name(gemini_model),
+           first_field_s=round(first_field, 3) if first_field is not None else None, **usage)
+    parsed, fmt = parse_analysis(raw)
+    total = time.perf_counter() - start
+    analysis = {
+        'parsed': parsed,
+        'format': fmt,
+        'raw': raw,
+        'usage': usage,
+    }
+    if cache is not None and parsed is not None:
+        cache.put(key, parts, analysis)
+    timings = {'first_field_s': round(first_field if first_field is not None else total, 3), 'total_s': round(total, 3)}
+    yield 'done', dict(analysis, cached=False, timings=timings)
+
+def estimate_tokens(gemini_model, text):
+    """Token estimate for budgeting, using the scheduler's calibrated ratio when available"""
+    if hasattr(gemini_model, 'chars_per_token'):
+        return int(len(text) / gemini_model.chars_per_token)
+    return len(text) // 3
+
+def pack_batches(calls, token_budget, gemini_model=None):
+    """Group (call_id, transcript) pairs into batches whose prompts fit token_budget.
+
+    A transcript too large to share a batch goes in a batch of its own.
+    """
+    overhead = estimate_tokens(gemini_model, BATCH_CALL_ANALYSIS_PROMPT)
+    batches, current, used = [], [], overhead
+    for call_id, transcript in calls:
+        cost = estimate_tokens(gemini_model, BATCH_CALL_TEMPLATE.format(call_id=call_id, transcript=transcript))
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], overhead
+        current.append((call_id, transcript))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _iter_json_objects(text):
+    """Yield the complete objects of a JSON array, stopping at the first broken or truncated one"""
+    decoder = json.JSONDecoder()
+    pos = text.find('[')
+    if pos < 0:
+        return
+    pos += 1
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            return
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return
+        yield obj
+
+# An object in a batched response is only taken as a call's analysis with these fields
+BATCH_REQUIRED_FIELDS = ('final_customer_sentiment', 'sentiment_score', 'escalation_required', 'outcome')
+
+def parse_batch_response(response_text, call_ids):
+    """Split a batched response into {call_id: parsed} for the calls it answered validly.
+
+    Objects missing any of BATCH_REQUIRED_FIELDS are ignored, so their calls
+    are left unanswered and retried on their own.
+    """
+    wanted = {str(call_id): call_id for call_id in call_ids}
+    results = {}
+    for obj in _iter_json_objects(clean_json_response(response_text)):
+        if not isinstance(obj, dict) or any(obj.get(field) in (None, '') for field in BATCH_REQUIRED_FIELDS):
+            continue
+        call_id = wanted.get(str(obj.pop('call_id', '')))
+        if call_id is not None and call_id not in results:
+            results[call_id] = obj
+    return results
+
+def _analyze_single(gemini_model, transcript, cache):
+    """analyze_transcript for one call of a batch; a failure is returned instead of raised"""
+    try:
+        return analyze_transcript(gemini_model, transcript, cache=cache)
+    except Exception as e:
+        return {'parsed': None, 'format': None, 'raw': '', 'usage': {}, 'cached': False, 'error': str(e)}
+
+def analyze_batch(gemini_model, calls, token_budget=8000, cache=None):
+    """Analyze many (call_id, transcript) pairs with as few requests as the token budget allows.
+
+    Returns {call_id: analysis} with the same shape as analyze_transcript,
+    so call ids must be unique. Analyses are cached under the same key as
+    analyze_transcript's. Usage is split evenly across the calls of a batch.
+    Calls missing from a partial or malformed batch response are retried one
+    by one and marked batch_retry, with batch_error set if the request failed.
+    """
+    call_ids = [call_id for call_id, _ in calls]
+    if len(set(call_ids)) != len(call_ids):
+        raise ValueError("analyze_batch needs unique call ids")
+    model_name = gemini_model_name(gemini_model)
+    analyses = {}
+    keys = {}
+    pending = []
+    for call_id, transcript in calls:
+        if cache is not None:
+            keys[call_id] = cache.make_key(transcript, CALL_ANALYSIS_PROMPT, model_name)
+            cached = cache.get(keys[call_id][0])
+            if cached is not None:
+                record('gemini', 0.0, cached=True, model=model_name)
+                analyses[call_id] = dict(cached, cached=True)
+                continue
+        pending.append((call_id, transcript))
+
+    transcripts = dict(pending)
+    for batch in pack_batches(pending, token_budget, gemini_model):
+        if len(batch) == 1:
+            call_id, transcript = batch[0]
+            analyses[call_id] = _analyze_single(gemini_model, transcript, cache)
+            continue
+
+        body = "\n".join(BATCH_CALL_TEMPLATE.format(call_id=call_id, transcript=transcript) for call_id, transcript in batch)
+        start = time.perf_counter()
+        batch_error = None
+        try:
+            response = gemini_model.generate_content(BATCH_CALL_ANALYSIS_PROMPT.format(transcripts=body),
+                                                     generation_config=JSON_RESPONSE_CONFIG)
+            raw = response.text.strip()
+            usage = usage_from_response(response)
+            record('gemini', time.perf_counter() - start, cached=False, model=model_name, batch_size=len(batch), **usage)
+        except Exception as e:
+            record('gemini', time.perf_counter() - start, cached=False, model=model_name, batch_size=len(batch),
+                   error=type(e).__name__)
+            raw, usage, batch_error = '', {}, str(e)
+
+        answered = parse_batch_response(raw, [call_id for call_id, _ in batch])
+        share = {k: round(v / len(batch)) for k, v in usage.items()}
+        for call_id, parsed in answered.items():
+            analysis = {'parsed': parsed, 'format': 'json', 'raw': json.dumps(parsed, ensure_ascii=False),
+                        'usage': dict(share, batch_size=len(batch))}
+            if cache is not None:
+                cache.put(keys[call_id][0], keys[call_id][1], analysis)
+            analyses[call_id] = dict(analysis, cached=False)
+
+        for call_id, _ in batch:
+            if call_id not in answered:
+                analysis = dict(_analyze_single(gemini_model, transcripts[call_id], cache), batch_retry=True)
+                if batch_error is not None:
+                    analysis['batch_error'] = batch_error
+                analyses[call_id] = analysis
+    return analyses
@@ -1,12 +1,16 @@
 import os
-import json
+import sys
+import secrets
+import subprocess
 from dotenv import load_dotenv
-import whisper
-import google.generativeai as genai
 import streamlit as st
-from prompt import CALL_ANALYSIS_PROMPT
+from datetime import datetime
+from cache import TranscriptCache, hash_audio
+from churn import CHURN_FLAG_RATE, CHURN_WARN_RATE
+from jobs import JobQueue
+from metrics import load_events, set_source, summarize, timed
 from reps_data import reps_data
-import random
+from store import SCORE_BANDS, CallStore
 # Page config
 st.set_page_config(page_title="Call Center Dashboard", page_icon="📞")
 
@@ -17,33 +21,50 @@ if not GEMINI_API_KEY:
     st.error("GEMINI_API_KEY not set. Please add it to your .env file or Streamlit secrets.")
     st.stop()
 
-genai.configure(api_key=GEMINI_API_KEY)
-model_name = 'gemini-1.5-flash-latest'
+CALLS_PER_PAGE = 20
+SEARCH_RESULTS = 50
+SCORE_BAND_LABELS = {"high": "High (80+)", "medium": "Medium (60-79)", "low": "Low (<60)"}
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_POLL_SECONDS = 1.0
+RECENT_JOBS = 10
+JOB_STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌"}
+METRICS_WINDOWS = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "All retained": None}
+STAGE_LABELS = {"upload": "Upload", "decode": "Audio decode", "transcribe": "Whisper transcription",
+                "prompt": "Prompt build", "gemini": "Gemini round trip", "parse": "Response parsing"}
 
-# Cache models
+set_source("app")
+
+# Transcription and analysis run in worker.py processes, never in a script run
 @st.cache_resource
-def load_whisper_model():
-    """Load and cache Whisper model"""
-    return whisper.load_model("turbo")
+def start_job_workers():
+    """Start JOB_WORKERS worker processes that exit with this server (none when JOB_WORKERS=0)"""
+    if JOB_WORKERS <= 0:
+        return None
+    worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+    return subprocess.Popen([sys.executable, worker_script, "--workers", str(JOB_WORKERS), "--parent-pid", str(os.getpid())])
 
 @st.cache_resource
-def get_gemini_model():
-    """Load and cache Gemini model"""
-    return genai.GenerativeModel(model_name)
-
-# Initialize models
-try:
-    whisper_model = load_whisper_model()
-    gemini_model = get_gemini_model()
-except Exception as e:
-    st.error(f"Error loading models: {str(e)}")
-    st.stop()
+def get_job_queue():
+    """Open the shared upload job queue"""
+    return JobQueue()
 
-# Helper functions
-def find_rep_by_id(rep_id):
-    """Find representative by ID"""
-    return next((r for r in reps_data if r['id'] == rep_id), None)
+@st.cache_resource
+def get_transcript_cache():
+    """Open the shared on-disk transcript cache"""
+    return TranscriptCache()
 
+@st.cache_resource
+def get_call_store():
+    """Open the call store, seeding it with the sample reps on first run"""
+    store = CallStore()
+    store.seed(reps_data)
+    return store
+
+call_store = get_call_store()
+job_queue = get_job_queue()
+start_job_workers()
+
+# Helper functions
 def get_sentiment_color(sentiment_score):
     """Get color based on sentiment score"""
     if sentiment_score >= 80:
@@ -53,77 +74,142 @@ def get_sentiment_color(sentiment_score):
     else:
         return "red"
 
-def clean_json_response(response_text):
-    """Clean JSON response by removing markdown code blocks and extra formatting"""
-    # Remove markdown code blocks
-    response_text = response_text.strip()
-    
-    # Remove ```json and ``` markers
-    if response_text.startswith('```json'):
-        response_text = response_text[7:]  # Remove ```json
-    elif response_text.startswith('```'):
-        response_text = response_text[3:]   # Remove ```
-    
-    if response_text.endswith('```'):
-        response_text = response_text[:-3]  # Remove closing ```
-    
-    # Clean up any extra whitespace
-    response_text = response_text.strip()
-    
-    return response_text
-
-def parse_text_response(response_text):
-    """Parse the text format response from Gemini into a structured format"""
-    try:
-        lines = response_text.strip().split('\n')
-        parsed_data = {}
-        key_issues = []
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Final Customer Sentiment:'):
-                parsed_data['final_customer_sentiment'] = line.split(':', 1)[1].strip()
-            elif line.startswith('Resolution Summary:'):
-                parsed_data['resolution_summary'] = line.split(':', 1)[1].strip()
-            elif line.startswith('Escalation Required:'):
-                parsed_data['escalation_required'] = line.split(':', 1)[1].strip()
-            elif line.startswith('[') and line.endswith(']') and line != '[Issue 1]' and line != '[Issue 2]':
-                # Extract issues from brackets
-                issue = line[1:-1].strip()
-                if issue and not issue.startswith('Issue'):
-                    key_issues.append(issue)
-        
-        if key_issues:
-            parsed_data['key_issues'] = key_issues
-        
-        return parsed_data if parsed_data else None
-    except Exception as e:
-        print(f"Error parsing text response: {e}")
-        return None
+def render_analysis_metric(slots, key, value):
+    """Fill the metric placeholder for a streamed analysis field, if it has one"""
+    slot = slots.get(key)
+    if slot is None:
+        return
+    with slot.container():
+        if key == 'sentiment_score':
+            st.metric("Sentiment Score", f"{value}/100", delta=None)
+            st.markdown(f"<div style='color: {get_sentiment_color(value)}'>●</div>", unsafe_allow_html=True)
+        elif key == 'outcome':
+            st.metric("Outcome", str(value).title())
+        elif key == 'escalation_required':
+            st.metric("Escalation Required", value)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(job_id):
+    """Poll a queued or running job, showing its progress and streamed metrics, until it finishes"""
+    job = job_queue.get(job_id)
+    if job['status'] not in ('queued', 'running'):
+        st.rerun()
+    if job['status'] == 'queued':
+        retry_note = f" (attempt {job['attempts'] + 1}, last error: {job['error']})" if job['error'] else ""
+        st.info(f"⏳ {job['filename']}: queued, {job_queue.position(job_id)} job(s) ahead{retry_note}")
+    else:
+        st.info(f"⚙️ {job['filename']}: {job['progress']}")
+    if job['partial']:
+        col1, col2, col3 = st.columns(3)
+        metric_slots = {'sentiment_score': col1.empty(), 'outcome': col2.empty(), 'escalation_required': col3.empty()}
+        for key, value in job['partial'].items():
+            render_analysis_metric(metric_slots, key, value)
+    st.caption("You can leave or reload this page; the job keeps running and stays under Recent jobs.")
+
+def render_job_result(job):
+    """Transcript and analysis of a finished job"""
+    if job['status'] == 'failed':
+        st.error(f"Processing {job['filename']} failed after {job['attempts']} attempt(s): {job['error']}")
+        return
+    result = job['result']['transcript']
+    cache_stats = get_transcript_cache().stats()
+    cached_note = " (this transcript was cached)" if job['result']['transcript_cached'] else ""
+    st.caption(f"Transcript cache - Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']}{cached_note}")
+
+    transcript = result.get('text', '')
+    segments = result.get('segments', [])
+
+    # Display transcript with confidence info
+    st.subheader("📝 Transcript")
+    st.write(transcript)
+
+    if segments:
+        avg_confidence = sum(seg.get('avg_logprob', 0) for seg in segments) / len(segments)
+        st.info(f"Average confidence: {avg_confidence:.2f}")
+
+    if result.get('skipped_seconds'):
+        st.caption(f"Skipped {result['skipped_seconds']:.0f}s of silence/hold audio out of {result['audio_seconds']:.0f}s")
+
+    analysis = job['result']['analysis']
+    if analysis is None:
+        st.warning("No transcript text found to analyze.")
+        return
+
+    # Sentiment analysis
+    st.subheader("📊 Sentiment Analysis Result")
+    sentiment_response = analysis['raw']
+
+    # JSON responses are shown as metrics
+    if analysis['format'] == 'json':
+        parsed = analysis['parsed']
+        col1, col2, col3 = st.columns(3)
+        metric_slots = {'sentiment_score': col1.empty(), 'outcome': col2.empty(), 'escalation_required': col3.empty()}
+        for key, value in parsed.items():
+            render_analysis_metric(metric_slots, key, value)
+
+        # Full JSON display
+        with st.expander("View Full Analysis", expanded=True):
+            st.json(parsed)
 
-def safe_transcribe_audio(audio_file, whisper_model):
-    """Safely transcribe audio with error handling"""
-    try:
-        # Create temp directory if it doesn't exist
-        temp_dir = "/tmp"
-        if not os.path.exists(temp_dir):
-            temp_dir = "."  # Fallback to current directory
-        
-        temp_path = os.path.join(temp_dir, audio_file.name)
-        
-        with open(temp_path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        
-        result = whisper_model.transcribe(temp_path, language="ar")
-        
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
-        return result
-    except Exception as e:
-        st.error(f"Error transcribing audio: {str(e)}")
-        return None
+    else:
+        # If JSON parsing failed, fall back to the text format
+        st.info("Received text format response. Parsing...")
+        parsed_data = analysis['parsed']
+
+        if parsed_data:
+            # Display parsed data
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                sentiment = parsed_data.get('final_customer_sentiment', 'Unknown')
+                st.metric("Final Sentiment", sentiment)
+
+            with col2:
+                outcome = "resolved" if parsed_data.get('escalation_required', 'Yes') == 'No' else "unresolved"
+                st.metric("Outcome", outcome.title())
+
+            with col3:
+                escalation = parsed_data.get('escalation_required', 'Unknown')
+                st.metric("Escalation Required", escalation)
+
+            # Show resolution summary
+            if 'resolution_summary' in parsed_data:
+                st.subheader("Resolution Summary")
+                st.write(parsed_data['resolution_summary'])
+
+            # Show key issues
+            if 'key_issues' in parsed_data and parsed_data['key_issues']:
+                st.subheader("Key Issues")
+                for issue in parsed_data['key_issues']:
+                    st.write(f"• {issue}")
+
+            # Show raw response in expander
+            with st.expander("View Raw Response"):
+                st.text(sentiment_response)
+        else:
+            st.warning("Could not parse response. Raw output:")
+            st.text(sentiment_response)
+
+    # Token usage info
+    usage = analysis['usage']
+    if usage:
+        source = " (cached, no tokens spent)" if analysis['cached'] else ""
+        st.caption(f"Tokens used - Prompt: {usage['prompt_tokens']}, Response: {usage['response_tokens']}{source}")
+    compaction = analysis.get('compaction')
+    if compaction and compaction['tokens'] < compaction['original_tokens']:
+        dropped = ", ".join(f"{count} {reason.replace('_', ' ')}" for reason, count in compaction['dropped'].items() if count)
+        st.caption(f"Transcript compacted for analysis: ~{compaction['original_tokens']} → ~{compaction['tokens']} tokens"
+                   f"{f' (segments dropped: {dropped})' if dropped else ''}")
+    triage = analysis.get('triage')
+    if triage and triage['routed'] == 'local':
+        st.caption(f"Answered by local triage (confidence {triage['confidence']:.2f}), without calling Gemini")
+    elif triage:
+        st.caption(f"Sent to Gemini by local triage: {triage['reason']} (confidence {triage['confidence']:.2f})")
+    timings = analysis['timings']
+    st.caption(f"First metric after {timings['first_field_s']:.2f}s, full analysis after {timings['total_s']:.2f}s")
+    if analysis['parsed']:
+        rep_name = dict(call_store.rep_choices()).get(job['rep_id'], 'unassigned calls')
+        st.caption(f"Saved to call history for {rep_name}")
 
 # Initialize session state
 if 'selected_rep_id' not in st.session_state:
@@ -136,6 +222,20 @@ url_rep_id = params.get("rep_id")
 # Update session state from URL params
 if url_rep_id and url_rep_id != st.session_state.selected_rep_id:
     st.session_state.selected_rep_id = url_rep_id
+# Uploads belong to a token kept in the URL, so a reload, reconnect or bookmark still lists them
+if 'owner' not in st.session_state:
+    st.session_state.owner = params.get("owner") or secrets.token_urlsafe(16)
+if params.get("owner") != st.session_state.owner:
+    st.query_params["owner"] = st.session_state.owner
+# The job being viewed is kept in the URL so a reload or reconnect shows it again
+if params.get("job", "").isdigit():
+    st.session_state.job_id = int(params["job"])
+
+
+def clear_query_params():
+    """Drop deep-link params, keeping the upload owner token"""
+    st.query_params.clear()
+    st.query_params["owner"] = st.session_state.owner
 
 # Sidebar styling and navigation
 st.sidebar.markdown("""
@@ -216,6 +316,14 @@ st.sidebar.markdown("""
         content: "👤 ";
         margin-right: 8px;
     }
+    .stRadio div[role="radiogroup"] > label:nth-child(4)::before {
+        content: "🔍 ";
+        margin-right: 8px;
+    }
+    .stRadio div[role="radiogroup"] > label:nth-child(5)::before {
+        content: "⚙️ ";
+        margin-right: 8px;
+    }
     /* Alerts and warnings */
     .stAlert {
         margin-top: 1rem;
@@ -253,12 +361,22 @@ st.sidebar.title("📞 Call Center Dashboard")
 
 # Determine default page based on selected rep
 default_page_index = 2 if st.session_state.selected_rep_id else 0
-page = st.sidebar.radio("Navigate", ["Upload & Analyze", "Reps Overview", "Rep Profiles"], index=default_page_index)
+page = st.sidebar.radio("Navigate", ["Upload & Analyze", "Reps Overview", "Rep Profiles", "Search Calls", "Admin"], index=default_page_index)
+
+# Job worker status (refreshed on every interaction)
+live_workers = job_queue.live_workers()
+queued_jobs = job_queue.counts().get('queued', 0)
+if live_workers:
+    st.sidebar.caption(f"🟢 {len(live_workers)} job worker(s) online, {queued_jobs} job(s) queued")
+    for worker in live_workers:
+        st.sidebar.caption(worker['state'])
+else:
+    st.sidebar.caption(f"🔴 No job workers running, {queued_jobs} job(s) queued")
 
 # Clear selected rep when navigating away from profiles
 if page != "Rep Profiles" and st.session_state.selected_rep_id:
     st.session_state.selected_rep_id = None
-    st.query_params.clear()
+    clear_query_params()
 
 # Upload & Analyze tab
 if page == "Upload & Analyze":
@@ -276,122 +394,65 @@ if page == "Upload & Analyze":
         st.info(f"File: {audio_file.name} ({audio_file.size / 1024 / 1024:.2f} MB)")
         st.audio(audio_file)
         
+        rep_names = dict(call_store.rep_choices())
+        assigned_rep = st.selectbox(
+            "Assign to rep", [None, *rep_names], format_func=lambda rep_id: rep_names.get(rep_id, "Unassigned")
+        )
+        refresh_analysis = st.checkbox("Ignore cached analysis", help="Re-run Gemini even if this transcript was already analyzed")
+
         if st.button("🔄 Transcribe & Analyze", type="primary"):
-            # Transcription
-            with st.spinner("🎤 Transcribing with Whisper..."):
-                result = safe_transcribe_audio(audio_file, whisper_model)
-                
-            if result:
-                transcript = result.get('text', '')
-                segments = result.get('segments', [])
-                
-                # Display transcript with confidence info
-                st.subheader("📝 Transcript")
-                st.write(transcript)
-                
-                if segments:
-                    avg_confidence = sum(seg.get('avg_logprob', 0) for seg in segments) / len(segments)
-                    st.info(f"Average confidence: {avg_confidence:.2f}")
-
-                # Sentiment analysis
-                if transcript.strip():
-                    with st.spinner("🧠 Analyzing with Gemini..."):
-                        try:
-                            prompt = CALL_ANALYSIS_PROMPT.format(transcript=transcript)
-                            response = gemini_model.generate_content(prompt)
-                            sentiment_response = response.text.strip()
-
-                            st.subheader("📊 Sentiment Analysis Result")
-                            
-                            # Clean the response to remove markdown formatting
-                            clean_response = clean_json_response(sentiment_response)
-                            
-                            # Try to parse as JSON first
-                            try:
-                                parsed = json.loads(clean_response)
-                                
-                                # Display key metrics in columns
-                                col1, col2, col3 = st.columns(3)
-                                
-                                if 'sentiment_score' in parsed:
-                                    with col1:
-                                        score = parsed['sentiment_score']
-                                        color = get_sentiment_color(score)
-                                        st.metric("Sentiment Score", f"{score}/100", delta=None)
-                                        st.markdown(f"<div style='color: {color}'>●</div>", unsafe_allow_html=True)
-                                
-                                if 'outcome' in parsed:
-                                    with col2:
-                                        st.metric("Outcome", parsed['outcome'].title())
-                                
-                                if 'escalation_required' in parsed:
-                                    with col3:
-                                        risk = parsed['escalation_required']
-                                        st.metric("Escalation Required", risk)
-                                
-                                # Full JSON display
-                                with st.expander("View Full Analysis", expanded=True):
-                                    st.json(parsed)
-                                    
-                            except json.JSONDecodeError:
-                                # If JSON parsing fails, parse the text format
-                                st.info("Received text format response. Parsing...")
-                                parsed_data = parse_text_response(sentiment_response)
-                                
-                                if parsed_data:
-                                    # Display parsed data
-                                    col1, col2, col3 = st.columns(3)
-                                    
-                                    with col1:
-                                        sentiment = parsed_data.get('final_customer_sentiment', 'Unknown')
-                                        st.metric("Final Sentiment", sentiment)
-                                    
-                                    with col2:
-                                        outcome = "resolved" if parsed_data.get('escalation_required', 'Yes') == 'No' else "unresolved"
-                                        st.metric("Outcome", outcome.title())
-                                    
-                                    with col3:
-                                        escalation = parsed_data.get('escalation_required', 'Unknown')
-                                        st.metric("Escalation Required", escalation)
-                                    
-                                    # Show resolution summary
-                                    if 'resolution_summary' in parsed_data:
-                                        st.subheader("Resolution Summary")
-                                        st.write(parsed_data['resolution_summary'])
-                                    
-                                    # Show key issues
-                                    if 'key_issues' in parsed_data and parsed_data['key_issues']:
-                                        st.subheader("Key Issues")
-                                        for issue in parsed_data['key_issues']:
-                                            st.write(f"• {issue}")
-                                    
-                                    # Show raw response in expander
-                                    with st.expander("View Raw Response"):
-                                        st.text(sentiment_response)
-                                else:
-                                    st.warning("Could not parse response. Raw output:")
-                                    st.text(sentiment_response)
-
-                            # Token usage info
-                            if hasattr(response, 'usage_metadata'):
-                                st.caption(f"Tokens used - Prompt: {response.usage_metadata.prompt_token_count}, Response: {response.usage_metadata.candidates_token_count}")
-                        
-                        except Exception as e:
-                            st.error(f"Error during analysis: {str(e)}")
-                else:
-                    st.warning("No transcript text found to analyze.")
+            # Queued rather than run here, so reruns, navigation and dropped connections don't lose the work
+            with timed("upload", bytes=audio_file.size):
+                job_id = job_queue.submit(
+                    audio_file.getvalue(), audio_file.name, hash_audio(audio_file.getbuffer()),
+                    rep_id=assigned_rep, refresh=refresh_analysis, owner=st.session_state.owner,
+                )
+            st.session_state.job_id = job_id
+            st.query_params["job"] = str(job_id)
+
+    job_id = st.session_state.get('job_id')
+    job = job_queue.get(job_id) if job_id else None
+    if job is not None and job['owner'] != st.session_state.owner:
+        job = None  # someone else's upload
+    if job is not None:
+        if job['status'] in ('queued', 'running'):
+            render_job_progress(job_id)
+        else:
+            render_job_result(job)
+
+    # Past uploads, newest first
+    recent_jobs = job_queue.recent(RECENT_JOBS, owner=st.session_state.owner)
+    if recent_jobs:
+        st.subheader("🗂️ Recent jobs")
+        rep_names = dict(call_store.rep_choices())
+        for past_job in recent_jobs:
+            col1, col2, col3 = st.columns([4, 3, 1])
+            with col1:
+                st.write(f"{JOB_STATUS_ICONS.get(past_job['status'], '')} **{past_job['filename']}**")
+            with col2:
+                submitted = datetime.fromtimestamp(past_job['created_at']).strftime('%Y-%m-%d %H:%M')
+                st.caption(f"{submitted} · {rep_names.get(past_job['rep_id'], 'Unassigned')} · {past_job['progress']}")
+            with col3:
+                if st.button("View", key=f"job_{past_job['id']}", disabled=past_job['id'] == job_id):
+                    st.session_state.job_id = past_job['id']
+                    st.query_params["job"] = str(past_job['id'])
+                    st.rerun()
 
 # Reps Overview tab
 elif page == "Reps Overview":
     st.title("📊 Call Center Reps Overview")
+
+    # Usually a no-op: job workers rescore reps as they save calls; this catches calls saved by src.py
+    call_store.refresh_churn()
     
     # Summary metrics
     col1, col2, col3, col4 = st.columns(4)
     
-    total_reps = len(reps_data)
-    total_calls = sum(len(rep['calls']) for rep in reps_data)
-    avg_sentiment = sum(rep['sentiment_score'] for rep in reps_data) / total_reps if total_reps > 0 else 0
-    total_escalations = sum(rep['escalations'] for rep in reps_data)
+    summary = call_store.summary()
+    total_reps = summary['reps']
+    total_calls = summary['calls']
+    avg_sentiment = summary['avg_sentiment']
+    total_escalations = summary['escalations']
     
     with col1:
         st.metric("Total Reps", total_reps)
@@ -401,54 +462,116 @@ elif page == "Reps Overview":
         st.metric("Avg Resolution", f"{avg_sentiment:.1f}")
     with col4:
         st.metric("Escalations", total_escalations)
-
-    # Sorting options
-    sort_by = st.selectbox("Sort by", ["Sentiment Score", "Call Volume", "Escalations"])
-    
-    if sort_by == "Sentiment Score":
-        sorted_reps = sorted(reps_data, key=lambda r: r['sentiment_score'], reverse=True)
-    elif sort_by == "Call Volume":
-        sorted_reps = sorted(reps_data, key=lambda r: len(r['calls']), reverse=True)
+    if summary['outcomes']:
+        st.caption("Outcomes - " + ", ".join(f"{outcome.title()}: {count}" for outcome, count in summary['outcomes'].items()))
+
+    # Filters, sorting and view options
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4)
+    with filter_col1:
+        sort_by = st.selectbox("Sort by", ["Sentiment Score", "Call Volume", "Escalations"])
+    with filter_col2:
+        team = st.selectbox("Team", [None, *call_store.teams()], format_func=lambda t: t or "All teams")
+    with filter_col3:
+        score_band = st.selectbox("Score", [None, *SCORE_BANDS], format_func=lambda b: SCORE_BAND_LABELS.get(b, "All scores"))
+    with filter_col4:
+        page_size = st.selectbox("Per page", [10, 25, 50, 100])
+
+    option_col1, option_col2 = st.columns(2)
+    with option_col1:
+        flagged_only = st.checkbox("Flagged for review only", help=f"Churn risk of {CHURN_FLAG_RATE:g}% or more")
+    with option_col2:
+        view_mode = st.radio("View", ["Cards", "Table"], horizontal=True, label_visibility="collapsed")
+
+    filters = dict(team=team, score_band=score_band, flagged=True if flagged_only else None)
+    total_matching = call_store.count_reps(**filters)
+    page_count = max(1, -(-total_matching // page_size))
+
+    # Only the visible page is fetched and rendered
+    page_number = st.number_input(
+        f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1,
+        key=f"overview_page_{team}_{score_band}_{flagged_only}_{page_size}_{sort_by}",
+    )
+    sort_columns = {"Sentiment Score": "sentiment_score", "Call Volume": "call_count", "Escalations": "escalations"}
+    page_reps = call_store.list_reps(
+        sort_by=sort_columns[sort_by], limit=page_size, offset=(page_number - 1) * page_size, **filters
+    )
+    if page_reps:
+        first = (page_number - 1) * page_size + 1
+        st.caption(f"Showing {first}-{first + len(page_reps) - 1} of {total_matching} reps")
     else:
-        sorted_reps = sorted(reps_data, key=lambda r: r['escalations'], reverse=True)
+        st.info("No reps match these filters.")
+
+    if view_mode == "Table":
+        # Compact mode: one dataframe for the whole page instead of a card per rep
+        st.dataframe(
+            [
+                {
+                    "Name": rep['name'],
+                    "Team": rep['team'] or "",
+                    "Score": round(rep['sentiment_score'] or 0),
+                    "Calls": rep['call_count'],
+                    "Escalations": rep['escalations'],
+                    "Churn %": rep['churn_rate'],
+                    "Flagged": "⚠️" if rep['flagged'] else "",
+                }
+                for rep in page_reps
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+        if page_reps:
+            names = {rep['id']: rep['name'] for rep in page_reps}
+            profile_col1, profile_col2 = st.columns([3, 1])
+            with profile_col1:
+                profile_rep = st.selectbox("Rep", list(names), format_func=names.get, label_visibility="collapsed")
+            with profile_col2:
+                if st.button("👤 View Profile", type="secondary"):
+                    st.session_state.selected_rep_id = profile_rep
+                    st.query_params.update(rep_id=profile_rep)
+                    st.rerun()
 
     # Display reps in a more structured way
-    for i, rep in enumerate(sorted_reps):
+    for i, rep in enumerate(page_reps if view_mode == "Cards" else []):
         with st.container():
             col1, col2 = st.columns([3, 1])
 
             with col1:
-                sentiment_color = get_sentiment_color(rep['sentiment_score'])
+                score = rep['sentiment_score'] or 0
                 st.markdown(f"### {rep['name']}")
 
                 # Progress bar for sentiment
-                st.progress(rep['sentiment_score'] / 100)
+                st.progress(min(score, 100) / 100)
 
                 # Metrics in columns
                 metric_col1, metric_col2, metric_col3 = st.columns(3)
                 with metric_col1:
-                    st.markdown(f"**Resolution:** {rep['sentiment_score']}/100")
+                    st.markdown(f"**Resolution:** {score:.0f}/100")
                 with metric_col2:
-                    st.markdown(f"**Calls:** {len(rep['calls'])}")
+                    st.markdown(f"**Calls:** {rep['call_count']}")
                 with metric_col3:
                     st.markdown(f"**Escalations:** {rep['escalations']}")
 
-                # Example churn rate (replace with real logic if available)
-                churn_rate = random.choice([3, 5, 13, 12, 15]) if rep["name"] == "Liam Novak" else random.randint(1, 10)
+                if rep['flagged']:
+                    st.markdown(f"<div style='color:red;font-weight:bold;'>⚠️ Flagged for Review</div>", unsafe_allow_html=True)
+
+                # Churn risk for the rep's latest month of calls, precomputed by the call store (churn.py)
+                churn_rate = rep['churn_rate']
 
                 # Churn color coding
-                if churn_rate >= 12:
+                if churn_rate is None:
+                    churn_color = "gray"
+                elif churn_rate >= CHURN_FLAG_RATE:
                     churn_color = "red"
-                    st.markdown(f"<div style='color:red;font-weight:bold;'>⚠️ Flagged for Review</div>", unsafe_allow_html=True)
-                elif churn_rate >= 5:
+                elif churn_rate >= CHURN_WARN_RATE:
                     churn_color = "orange"
                 else:
                     churn_color = "green"
 
+                churn_label = f"{churn_rate:.1f}% ({rep['churn_month']})" if churn_rate is not None else "No calls yet"
                 st.markdown(
                     f"<div style='margin-top:8px;'>"
                     f"<strong>Churn Rate (month):</strong> "
-                    f"<span style='color:{churn_color}; font-weight:bold;'>{churn_rate}%</span>"
+                    f"<span style='color:{churn_color}; font-weight:bold;'>{churn_label}</span>"
                     f"</div>",
                     unsafe_allow_html=True
                 )
@@ -459,7 +582,7 @@ elif page == "Reps Overview":
                     st.query_params.update(rep_id=rep['id'])
                     st.rerun()
 
-        if i < len(sorted_reps) - 1:
+        if i < len(page_reps) - 1:
             st.divider()
 
 # Rep Profiles tab
@@ -471,7 +594,7 @@ elif page == "Rep Profiles":
         if st.button("← Go to Overview"):
             st.switch_page("Reps Overview")
     else:
-        rep = find_rep_by_id(rep_id)
+        rep = call_store.get_rep(rep_id)
         
         if rep:
             # Header with back button
@@ -479,7 +602,7 @@ elif page == "Rep Profiles":
             with col1:
                 if st.button("← Back to Overview"):
                     st.session_state.selected_rep_id = None
-                    st.query_params.clear()
+                    clear_query_params()
                     st.rerun()
             
             with col2:
@@ -489,51 +612,160 @@ elif page == "Rep Profiles":
             col1, col2, col3 = st.columns(3)
             with col1:
                 sentiment_color = get_sentiment_color(rep['sentiment_score'])
-                st.metric("Sentiment Score", f"{rep['sentiment_score']}/100")
+                st.metric("Sentiment Score", f"{rep['sentiment_score']:.0f}/100")
             with col2:
-                st.metric("Total Calls", len(rep['calls']))
+                st.metric("Total Calls", rep['call_count'])
             with col3:
                 st.metric("Escalations", rep['escalations'])
+            if rep['outcomes']:
+                st.caption("Outcomes - " + ", ".join(f"{outcome.title()}: {count}" for outcome, count in rep['outcomes'].items()))
+            churn = rep['churn_indicators']
+            if churn:
+                trend = f", sentiment {churn['sentiment_trend']:+.1f} vs previous month" if churn['sentiment_trend'] is not None else ""
+                st.caption(
+                    f"Churn risk {rep['churn_rate']:.1f}% for {rep['churn_month']} ({churn['calls']} calls) - "
+                    f"unresolved {churn['unresolved_rate']:.0%}, escalated {churn['escalation_rate']:.0%}, "
+                    f"cancellation talk {churn['churn_intent_rate']:.0%}{trend}"
+                )
             
             st.divider()
             
             # Recent calls section
             st.subheader("📞 Recent Calls")
             
-            if rep['calls']:
-                for i, call in enumerate(rep['calls']):
-                    with st.expander(f"Call {i+1} - {call['date']} ({call['sentiment']['outcome'].title()})"):
-                        # Call outcome badge
-                        outcome = call['sentiment']['outcome']
-                        badge_color = "green" if outcome == "resolved" else "red"
+            # Headers come from the calls index; a call's transcript and analysis are loaded only when opened
+            call_pages = max(1, -(-rep['call_count'] // CALLS_PER_PAGE))
+            call_page = st.number_input(
+                f"Page (of {call_pages})", min_value=1, max_value=call_pages, value=1, step=1,
+                key=f"calls_page_{rep['id']}",
+            ) if call_pages > 1 else 1
+            calls = call_store.get_calls(rep['id'], limit=CALLS_PER_PAGE, offset=(call_page - 1) * CALLS_PER_PAGE)
+            if calls:
+                for i, call in enumerate(calls):
+                    number = (call_page - 1) * CALLS_PER_PAGE + i + 1
+                    outcome = call['outcome'] or "unknown"
+                    badge_color = "green" if outcome == "resolved" else "red"
+                    score = f" - {call['sentiment_score']:.0f}/100" if call['sentiment_score'] is not None else ""
+
+                    header_col, toggle_col = st.columns([4, 1])
+                    with header_col:
                         st.markdown(
-                            f"**Status:** <span style='color:{badge_color}; font-weight: bold'>{outcome.upper()}</span>",
+                            f"**Call {number}** - {call['call_date']} - "
+                            f"<span style='color:{badge_color}; font-weight: bold'>{outcome.upper()}</span>{score}",
                             unsafe_allow_html=True
                         )
-                        
-                        # Transcript
-                        st.text_area("Transcript", call['transcript'], height=120, key=f"transcript_{rep['id']}_{i}")
-                        
-                        # Sentiment analysis - using columns instead of nested expander
-                        st.subheader("Sentiment Analysis")
-                        
-                        # Display key metrics in a structured way
-                        if 'sentiment_score' in call['sentiment']:
-                            sentiment_col1, sentiment_col2 = st.columns(2)
-                            with sentiment_col1:
-                                st.metric("Sentiment Score", f"{call['sentiment']['sentiment_score']}/100")
-                            with sentiment_col2:
-                                if 'escalation_risk' in call['sentiment']:
-                                    st.metric("Escalation Risk", call['sentiment']['escalation_risk'].title())
-                        
-                        # Show full JSON in a code block instead of expander
-                        st.subheader("Full Analysis")
-                        st.json(call['sentiment'])
+                    with toggle_col:
+                        opened = st.toggle("Details", key=f"call_open_{call['id']}")
+
+                    if opened:
+                        detail = call_store.get_call_detail(call['id'])
+                        with st.container(border=True):
+                            # Transcript
+                            st.text_area("Transcript", detail['transcript'], height=120, key=f"transcript_{call['id']}")
+                            
+                            # Sentiment analysis - using columns instead of nested expander
+                            st.subheader("Sentiment Analysis")
+                            
+                            # Display key metrics in a structured way
+                            analysis = detail['analysis']
+                            if 'sentiment_score' in analysis:
+                                sentiment_col1, sentiment_col2 = st.columns(2)
+                                with sentiment_col1:
+                                    st.metric("Sentiment Score", f"{analysis['sentiment_score']}/100")
+                                with sentiment_col2:
+                                    if 'escalation_required' in analysis:
+                                        st.metric("Escalation Required", analysis['escalation_required'])
+                            
+                            # Show full JSON in a code block instead of expander
+                            st.subheader("Full Analysis")
+                            st.json(analysis)
             else:
                 st.info("No calls recorded for this representative.")
         else:
             st.error("❌ Representative not found. Please try selecting again from the overview tab.")
             if st.button("← Go to Overview"):
                 st.session_state.selected_rep_id = None
-                st.query_params.clear()
-                st.rerun()
\ No newline at end of file
+                clear_query_params()
+                st.rerun()
+
+# Search Calls tab
+elif page == "Search Calls":
+    st.title("🔍 Search Call Transcripts")
+
+    query = st.text_input(
+        "Search transcripts",
+        help='Words must all appear; use "quotes" for an exact phrase and a trailing * for a prefix. '
+             'Arabic spelling variants and diacritics are ignored.'
+    )
+    filter_col1, filter_col2, filter_col3 = st.columns(3)
+    with filter_col1:
+        rep_names = dict(call_store.rep_choices())
+        search_rep = st.selectbox("Rep", [None, *rep_names], format_func=lambda rep_id: rep_names.get(rep_id, "All reps"))
+    with filter_col2:
+        date_from = st.date_input("From", value=None)
+    with filter_col3:
+        date_to = st.date_input("To", value=None)
+
+    if query.strip():
+        results = call_store.search_calls(
+            query, rep_id=search_rep,
+            date_from=date_from.isoformat() if date_from else None,
+            date_to=date_to.isoformat() if date_to else None,
+            limit=SEARCH_RESULTS,
+        )
+        st.caption(f"{len(results)} best matching calls" if len(results) == SEARCH_RESULTS else f"{len(results)} matching calls")
+        for result in results:
+            with st.container(border=True):
+                header_col, button_col = st.columns([4, 1])
+                with header_col:
+                    outcome = result['outcome'] or "unknown"
+                    st.markdown(f"**{rep_names.get(result['rep_id'], 'Unassigned')}** - {result['call_date']} - {outcome.title()}")
+                    st.markdown(result['snippet'])
+                with button_col:
+                    if result['rep_id'] and st.button("👤 View Profile", key=f"search_view_{result['id']}"):
+                        st.session_state.selected_rep_id = result['rep_id']
+                        st.query_params.update(rep_id=result['rep_id'])
+                        st.rerun()
+
+# Admin tab
+elif page == "Admin":
+    st.title("⚙️ Pipeline Metrics")
+    st.caption("Stage timings from the app, its job workers, src.py and batch.py (see metrics.py)")
+
+    window = st.selectbox("Window", list(METRICS_WINDOWS))
+    since = datetime.now().timestamp() - METRICS_WINDOWS[window] if METRICS_WINDOWS[window] else None
+    summary = summarize(load_events(since))
+    if not summary['events']:
+        st.info("No metrics recorded in this window yet.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Events", summary['events'])
+        for col, (cache, counts) in zip((col2, col3), summary['caches'].items()):
+            lookups = counts['hits'] + counts['misses']
+            with col:
+                st.metric(f"{cache.title()} cache hits", f"{counts['hits'] / lookups:.0%}" if lookups else "-")
+        with col4:
+            rtf = summary['transcribe_rtf_p50']
+            st.metric("Median RTF", f"{rtf:.2f}" if rtf is not None else "-",
+                      help="Transcription seconds per second of audio")
+
+        st.subheader("Latency by stage")
+        st.dataframe([
+            {"Stage": STAGE_LABELS.get(stage, stage), "Runs": row['count'], "p50 (s)": row['p50_s'],
+             "p95 (s)": row['p95_s'], "Total (s)": row['total_s'], "Errors": row['errors']}
+            for stage, row in summary['stages'].items()
+        ], hide_index=True, use_container_width=True)
+
+        if summary['transcribe_queue_wait_p95_s'] is not None:
+            st.caption(f"Transcription queue wait p95: {summary['transcribe_queue_wait_p95_s']:.2f}s (not in the transcribe timings)")
+        tokens = summary['tokens']
+        st.caption(f"Gemini tokens - Prompt: {tokens['prompt']:,}, Response: {tokens['response']:,}")
+        if summary['parse_formats']:
+            formats = ", ".join(f"{count} {fmt.replace('_', ' ')}" for fmt, count in summary['parse_formats'].items())
+            st.caption(f"Analysis responses parsed as: {formats}")
+
+    # From the call store, so it covers every saved call regardless of the window
+    sources = call_store.analysis_sources()
+    if sources:
+        st.caption("Saved analyses by source: " + ", ".join(f"{name}: {count}" for name, count in sources.items()))
@@ -0,0 +1,287 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from metrics import record
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 4  # float32
+PIPE_CHUNK_BYTES = 1024 * 1024
+# Containers whose index can sit at the end of the file, which ffmpeg cannot read from a pipe
+SEEKABLE_FORMATS = (".mp4", ".m4a", ".mov")
+
+
+def _ffmpeg_command(source, sr):
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-threads", "0",
+        "-i", source,
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(sr),
+        "pipe:1",
+    ]
+
+
+def _drain(stream, sink):
+    sink.append(stream.read())
+
+
+def iter_audio_chunks(data, sr=SAMPLE_RATE, chunk_bytes=PIPE_CHUNK_BYTES):
+    """Decode an in-memory audio file by piping it through ffmpeg.
+
+    data is any buffer (bytes, memoryview from UploadedFile.getbuffer(), ...).
+    It is written to ffmpeg's stdin in chunk_bytes slices without copying, and
+    mono float32 samples at sr are yielded as numpy arrays of at most
+    chunk_bytes / 4 samples each.
+    """
+    proc = subprocess.Popen(
+        _ffmpeg_command("pipe:0", sr), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    view = memoryview(data).cast("B")
+
+    def feed():
+        try:
+            for start in range(0, len(view), chunk_bytes):
+                proc.stdin.write(view[start:start + chunk_bytes])
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg stopped reading; its exit status reports why
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    errors = []
+    writer = threading.Thread(target=feed, daemon=True)
+    err_reader = threading.Thread(target=_drain, args=(proc.stderr, errors), daemon=True)
+    writer.start()
+    err_reader.start()
+
+    remainder = b""
+    completed = False
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            if remainder:
+                chunk = remainder + chunk
+            usable = len(chunk) - len(chunk) % BYTES_PER_SAMPLE
+            remainder = chunk[usable:]
+            if usable:
+                yield np.frombuffer(chunk, dtype=np.float32, count=usable // BYTES_PER_SAMPLE)
+        completed = True
+    finally:
+        if not completed:
+            proc.kill()  # consumer stopped early
+        proc.stdout.close()
+        writer.join()
+        proc.wait()
+        err_reader.join()
+
+    if proc.returncode != 0:
+        message = errors[0].decode("utf-8", "replace").strip() if errors else ""
+        raise RuntimeError(f"Failed to decode audio: {message}")
+
+
+def decode_audio(data, sr=SAMPLE_RATE, filename=None, chunk_bytes=PIPE_CHUNK_BYTES):
+    """Decode an in-memory audio file to the float32 array whisper.transcribe accepts.
+
+    Decoded chunks are appended to one growing buffer that the returned array
+    views directly, so there is no temp file and no final concatenation copy.
+    MP4/M4A files whose index is at the end cannot be decoded from a pipe; for
+    those (filename tells us the container) we fall back to a private temp file.
+    """
+    start = time.perf_counter()
+    buffer = bytearray()
+    try:
+        for chunk in iter_audio_chunks(data, sr, chunk_bytes):
+            buffer += chunk.data
+        audio = np.frombuffer(buffer, dtype=np.float32)
+    except RuntimeError:
+        if not (filename and filename.lower().endswith(SEEKABLE_FORMATS)):
+            raise
+        audio = _decode_via_temp_file(data, sr, os.path.splitext(filename)[1])
+    record("decode", time.perf_counter() - start, bytes=len(data), audio_seconds=round(len(audio) / sr, 2))
+    return audio
+
+
+def _decode_via_temp_file(data, sr, suffix):
+    """Decode through a uniquely named temp file (for non-streamable containers)"""
+    with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+        f.write(data)
+        f.flush()
+        out = subprocess.run(_ffmpeg_command(f.name, sr), capture_output=True, check=False)
+    if out.returncode != 0:
+        raise RuntimeError(f"Failed to decode audio: {out.stderr.decode('utf-8', 'replace').strip()}")
+    return np.frombuffer(bytearray(out.stdout), dtype=np.float32)
+
+
+def frame_levels(audio, sr=SAMPLE_RATE, frame_seconds=0.03):
+    """RMS level in dBFS for consecutive non-overlapping frames"""
+    frame = max(1, int(sr * frame_seconds))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def silence_threshold(levels, margin_db=12.0, headroom_db=20.0):
+    """Adaptive silence threshold in dBFS for a recording's frame levels.
+
+    A frame is silent when it is within margin_db of the noise floor (5th
+    percentile) and at least headroom_db below the loud level (95th
+    percentile), so it works for clean and noisy line audio, and for calls
+    with very little silence.
+    """
+    floor, loud = np.percentile(levels, [5, 95])
+    return min(floor + margin_db, loud - headroom_db)
+
+
+def find_silences(audio, sr=SAMPLE_RATE, min_silence=0.5, frame_seconds=0.03):
+    """Find silent stretches as (start_s, end_s) pairs"""
+    levels = frame_levels(audio, sr, frame_seconds)
+    if len(levels) == 0:
+        return []
+    threshold = silence_threshold(levels)
+    silent = np.concatenate(([False], levels < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    min_frames = int(min_silence / frame_seconds)
+    keep = (ends - starts) >= min_frames
+    return [(s * frame_seconds, e * frame_seconds) for s, e in zip(starts[keep], ends[keep])]
+
+
+def split_on_silence(audio, sr=SAMPLE_RATE, target_seconds=120.0, max_seconds=300.0, min_silence=0.5):
+    """Split audio into chunks of about target_seconds, cutting in the middle of silences.
+
+    Returns (start_sample, end_sample) pairs covering the whole input, none
+    longer than max_seconds. When no silence falls within max_seconds of the
+    previous cut, a hard cut is made.
+    """
+    total = len(audio)
+    if total <= max_seconds * sr:
+        return [(0, total)]
+
+    cut_points = np.array([(s + e) / 2 for s, e in find_silences(audio, sr, min_silence)])
+    chunks = []
+    start_s = 0.0
+    total_s = total / sr
+    # A remainder up to 1.5x the target is kept whole, unless that would exceed max_seconds
+    while total_s - start_s > min(target_seconds * 1.5, max_seconds):
+        window = cut_points[(cut_points > start_s + target_seconds / 2) & (cut_points <= start_s + max_seconds)]
+        if len(window):
+            cut_s = window[np.argmin(np.abs(window - (start_s + target_seconds)))]
+        elif total_s - start_s > max_seconds:
+            cut_s = start_s + max_seconds
+        else:
+            break
+        chunks.append((int(start_s * sr), int(cut_s * sr)))
+        start_s = cut_s
+    chunks.append((int(start_s * sr), total))
+    return chunks
+
+
+class OffsetMap:
+    """Maps times in trimmed audio back to the original recording.
+
+    pieces are (trimmed_start_s, original_start_s, duration_s) for every kept
+    span, in order.
+    """
+
+    def __init__(self, pieces, original_seconds):
+        self.pieces = pieces
+        self.original_seconds = original_seconds
+        self.kept_seconds = sum(duration for _, _, duration in pieces)
+        self.skipped_seconds = original_seconds - self.kept_seconds
+
+    def to_original(self, t):
+        """Original-recording time for time t in the trimmed audio"""
+        for trimmed_start, original_start, duration in self.pieces:
+            if t <= trimmed_start + duration:
+                return original_start + max(0.0, t - trimmed_start)
+        if not self.pieces:
+            return t
+        trimmed_start, original_start, duration = self.pieces[-1]
+        return original_start + (t - trimmed_start)
+
+    def remap_result(self, result):
+        """Shift a Whisper result's segment (and word) timestamps onto the original timeline"""
+        segments = []
+        for seg in result.get("segments", []):
+            seg = dict(seg, start=self.to_original(seg["start"]), end=self.to_original(seg["end"]))
+            if "words" in seg:
+                seg["words"] = [
+                    dict(w, start=self.to_original(w["start"]), end=self.to_original(w["end"])) for w in seg["words"]
+                ]
+            segments.append(seg)
+        return dict(result, segments=segments)
+
+
+def speech_mask(audio, sr=SAMPLE_RATE, frame_seconds=0.03, music_std_db=4.0, window_seconds=1.0):
+    """Per-frame boolean mask of likely speech.
+
+    A frame is speech when it is above the silence threshold and its
+    surrounding window_seconds shows the level swings of syllables. Hold music,
+    ringback tones and IVR jingles are compressed and steady, so their level
+    varies by less than music_std_db.
+    """
+    levels = frame_levels(audio, sr, frame_seconds)
+    if len(levels) == 0:
+        return np.zeros(0, dtype=bool)
+    loud = levels >= silence_threshold(levels)
+
+    window = max(1, int(window_seconds / frame_seconds))
+    if len(levels) < window:
+        return loud
+    rolling_std = np.lib.stride_tricks.sliding_window_view(levels, window).std(axis=1)
+    # Centre the window on each frame and extend the edges
+    pad_left = window // 2
+    rolling_std = np.pad(rolling_std, (pad_left, len(levels) - len(rolling_std) - pad_left), mode="edge")
+    return loud & (rolling_std >= music_std_db)
+
+
+def trim_non_speech(audio, sr=SAMPLE_RATE, min_gap=2.0, pad=0.25, frame_seconds=0.03):
+    """Drop silence, hold music and other non-speech stretches longer than min_gap seconds.
+
+    Shorter pauses are kept so Whisper still sees natural turn-taking, and each
+    kept span is padded by pad seconds. Returns (trimmed_audio, OffsetMap).
+    """
+    original_seconds = len(audio) / sr
+    mask = speech_mask(audio, sr, frame_seconds)
+    if not mask.any():
+        return audio[:0], OffsetMap([], original_seconds)
+
+    # Speech runs as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+
+    # Merge runs separated by gaps shorter than min_gap, then pad
+    gap_frames = int(min_gap / frame_seconds)
+    spans = []
+    for start, end in zip(starts, ends):
+        if spans and start - spans[-1][1] < gap_frames:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    pad_samples = int(pad * sr)
+    frame = int(sr * frame_seconds)
+    pieces = []
+    kept = []
+    trimmed_start = 0.0
+    last_end = 0
+    for start, end in spans:
+        s = int(max(last_end, start * frame - pad_samples))
+        e = int(min(len(audio), end * frame + pad_samples))
+        if e <= s:
+            continue
+        kept.append(audio[s:e])
+        pieces.append((trimmed_start, s / sr, (e - s) / sr))
+        trimmed_start += (e - s) / sr
+        last_end = e
+    return np.concatenate(kept), OffsetMap(pieces, original_seconds)
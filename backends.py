@@ -0,0 +1,119 @@
+"""Transcription backends: one interface over openai-whisper and int8 CPU engines.
+
+TRANSCRIBE_BACKEND picks the engine used by the job workers, batch.py and src.py:
+
+- "whisper" (default): openai-whisper, float32 on CPU (memory-mapped when converted, see models.py)
+- "whisper-int8": the same model with its Linear layers dynamically quantized to int8; CPU only
+- "faster-whisper": the CTranslate2 int8 runtime; needs `pip install faster-whisper`
+
+Every backend has transcribe(audio, **options), taking whisper.transcribe
+options and returning its {"text", "segments", "language"} result, and
+decode_windows(windows, options) for the transcription server.
+TRANSCRIBE_THREADS sets the CPU threads per process (default: the runtime's own).
+"""
+import os
+import warnings
+
+from inference import decode_windows
+
+BACKENDS = ("whisper", "whisper-int8", "faster-whisper")
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "whisper")
+TRANSCRIBE_THREADS = int(os.getenv("TRANSCRIBE_THREADS", 0)) or None
+
+# whisper.transcribe options faster-whisper accepts, by its name for them
+FASTER_WHISPER_OPTIONS = {
+    "language": "language", "task": "task", "temperature": "temperature", "beam_size": "beam_size",
+    "best_of": "best_of", "patience": "patience", "initial_prompt": "initial_prompt",
+    "condition_on_previous_text": "condition_on_previous_text", "without_timestamps": "without_timestamps",
+    "word_timestamps": "word_timestamps", "compression_ratio_threshold": "compression_ratio_threshold",
+    "logprob_threshold": "log_prob_threshold", "no_speech_threshold": "no_speech_threshold",
+    "sample_len": "max_new_tokens",
+}
+
+
+def backend_id(model_name, backend=None):
+    """Model name as used in transcript cache keys; backends other than whisper get their own entries"""
+    backend = backend or TRANSCRIBE_BACKEND
+    return model_name if backend == "whisper" else f"{model_name}:{backend}"
+
+
+class WhisperBackend:
+    """An openai-whisper model, quantized or not"""
+
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+
+    def transcribe(self, audio, **options):
+        return self.model.transcribe(audio, **options)
+
+    def decode_windows(self, windows, options):
+        return decode_windows(self.model, windows, options)
+
+
+class FasterWhisperBackend:
+    """A faster_whisper.WhisperModel; its results are converted to whisper's format"""
+
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+
+    def transcribe(self, audio, **options):
+        kwargs = {FASTER_WHISPER_OPTIONS[key]: value for key, value in options.items() if key in FASTER_WHISPER_OPTIONS}
+        segments, info = self.model.transcribe(audio, **kwargs)
+        segments = [{
+            "id": segment.id, "seek": segment.seek, "start": segment.start, "end": segment.end,
+            "text": segment.text, "tokens": list(segment.tokens), "temperature": segment.temperature,
+            "avg_logprob": segment.avg_logprob, "compression_ratio": segment.compression_ratio,
+            "no_speech_prob": segment.no_speech_prob,
+        } for segment in segments]  # a generator: decoding happens here
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": info.language}
+
+    def decode_windows(self, windows, options):
+        # CTranslate2 is not batched here; each window is decoded on its own, like inference.decode_windows
+        options = dict(options, without_timestamps=True, condition_on_previous_text=False)
+        return [self.transcribe(window, **options) for window in windows]
+
+
+def quantize_whisper(model):
+    """Dynamically quantize a Whisper model's Linear layers to int8, in place, on CPU.
+
+    Whisper's own Linear subclass casts weights to the input dtype, which the
+    quantizer does not recognise, so each is first swapped for a plain
+    nn.Linear sharing its weights. Convolutions and the token embedding
+    (also used for the output logits) stay float32.
+    """
+    import torch
+    import whisper.model
+    model = model.cpu()
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if type(child) is whisper.model.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight, linear.bias = child.weight, child.bias
+                setattr(module, name, linear)
+    with warnings.catch_warnings():
+        # Newer torch releases warn that torch.ao quantized tensors are deprecated
+        warnings.filterwarnings("ignore", message=".*quantize_per_tensor.*deprecated")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_backend(model_name, backend=None, threads=None):
+    """Load model_name with the chosen backend (default TRANSCRIBE_BACKEND) and CPU thread count"""
+    backend = backend or TRANSCRIBE_BACKEND
+    threads = threads or TRANSCRIBE_THREADS
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+    if backend == "faster-whisper":
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=threads or 0)
+        return FasterWhisperBackend(model, f"{model_name} (faster-whisper int8)")
+
+    import torch
+    from models import load_whisper
+    if threads:
+        torch.set_num_threads(threads)
+    model = load_whisper(model_name)
+    if backend == "whisper-int8":
+        return WhisperBackend(quantize_whisper(model), f"{model_name} (int8)")
+    return WhisperBackend(model, model_name)
@@ -0,0 +1,286 @@
+"""Headless batch analysis for a directory (or manifest) of call recordings.
+
+Usage:
+    python batch.py recordings/ --output results.jsonl --workers 4
+    python batch.py manifest.txt --output results.jsonl
+
+Transcription is fanned out over a pool of worker processes (each loads the
+Whisper model once) and overlapped with concurrent Gemini analysis through
+CALL_ANALYSIS_PROMPT (see pipeline.py); one JSONL record is written per call
+as soon as it finishes. Re-running with the same --output skips calls that
+already have a record, so a killed run resumes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import metrics
+from analysis import analyze_batch, analyze_transcript
+from backends import backend_id
+from cache import AnalysisCache, TranscriptCache, hash_audio
+from compaction import prompt_transcript
+from models import configure_gemini
+from pipeline import PipelineStats, run_pipeline
+from scheduler import DEFAULT_RPM, DEFAULT_TPM, GeminiScheduler
+from transcription import create_worker_pool, transcribe_file_in_worker
+from triage import LOCAL_TRIAGE, route
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".mp4")
+WHISPER_MODEL_NAME = "turbo"
+GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
+
+def collect_inputs(source):
+    """List audio files from a directory or a manifest file (one path per line)"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def load_completed(output_path, retry_failed=False):
+    """Read an existing output file and return the set of files already done.
+
+    A run killed mid-write can leave a partial last line; it is truncated so
+    new records are appended on a clean line boundary.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, "rb+") as f:
+        valid_end = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid_end += len(line)
+            if retry_failed and record.get("status") != "ok":
+                continue
+            done.add(record["file"])
+        f.truncate(valid_end)
+    return done
+
+
+def build_record(path, status, timings, error=None, result=None, analysis=None, include_segments=False):
+    """Build the JSONL record for one call"""
+    record = {
+        "file": path,
+        "status": status,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if error:
+        record["error"] = error
+    if result is not None:
+        record["transcript"] = result.get("text", "")
+        if "skipped_seconds" in result:
+            record["audio_seconds"] = result["audio_seconds"]
+            record["skipped_seconds"] = result["skipped_seconds"]
+        if include_segments:
+            record["segments"] = result.get("segments", [])
+    if analysis is not None:
+        record["analysis"] = analysis["parsed"]
+        record["usage"] = analysis["usage"]
+        record["analysis_cached"] = analysis["cached"]
+        if analysis["parsed"] is None:
+            record["raw_response"] = analysis["raw"]
+    return record
+
+
+def run(args):
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        sys.exit("GEMINI_API_KEY not set. Please add it to your .env file.")
+    genai = configure_gemini(api_key)
+    gemini_model = GeminiScheduler(genai.GenerativeModel(args.gemini_model), rpm=args.rpm, tpm=args.tpm)
+
+    inputs = collect_inputs(args.source)
+    done = load_completed(args.output, retry_failed=args.retry_failed)
+    pending = [p for p in inputs if p not in done]
+    print(f"{len(inputs)} recordings, {len(inputs) - len(pending)} already done, {len(pending)} to process",
+          file=sys.stderr)
+    if not pending:
+        return
+
+    transcript_cache = TranscriptCache()
+    analysis_cache = None if args.no_analysis_cache else AnalysisCache()
+    transcribe_options = {"language": args.language}
+    cache_options = dict(transcribe_options, trim_non_speech=not args.no_trim)
+    cache_keys = {}
+    cached = []
+    for path in pending:
+        try:
+            cache_keys[path] = TranscriptCache.make_key(hash_audio(path), backend_id(args.whisper_model), cache_options)
+        except OSError:
+            # Unreadable files are reported by the worker like any other failure
+            continue
+        result = transcript_cache.get(cache_keys[path])
+        if result is not None:
+            cached.append((path, result))
+    cached_paths = {path for path, _ in cached}
+    to_transcribe = [p for p in pending if p not in cached_paths]
+
+    def analyze_one(text):
+        return analyze_transcript(gemini_model, text, cache=analysis_cache)
+
+    def finish(transcription, analyze_fn, timings):
+        path, result, transcribe_s, error = transcription
+        cached = path in cached_paths
+        if result is not None and not cached and path in cache_keys:
+            transcript_cache.put(cache_keys[path], result)
+        if cached:
+            metrics.record("transcribe", 0.0, cached=True, backend=backend_id(args.whisper_model))
+        elif result is not None:
+            audio_seconds = result["audio_seconds"]
+            metrics.record("transcribe", transcribe_s, cached=False, backend=backend_id(args.whisper_model),
+                           audio_seconds=audio_seconds, rtf=round(transcribe_s / audio_seconds, 4) if audio_seconds else None)
+        else:
+            metrics.record("transcribe", transcribe_s, cached=False, backend=backend_id(args.whisper_model), error="transcription")
+        record = process_call(path, result, dict(timings, transcribe_s=transcribe_s), error, analyze_fn,
+                              args.segments, args.local_triage)
+        if cached:
+            record["transcript_cached"] = True
+        return record
+
+    def analyze(transcription):
+        return finish(transcription, analyze_one, {})
+
+    def analyze_many(transcriptions):
+        # Pack the analyzable transcripts into as few prompts as the token budget allows
+        texts = {path: prompt_transcript(result)["text"] for path, result, _, error in transcriptions
+                 if not error and result.get("text", "").strip()
+                 and not (args.local_triage and route(result)[0] is not None)}
+        # The prompt gets short ids rather than file paths, which the model would have to echo back exactly
+        call_ids = {path: f"c{i}" for i, path in enumerate(texts)}
+        start = time.perf_counter()
+        analyses = analyze_batch(gemini_model, [(call_ids[path], text) for path, text in texts.items()],
+                                 token_budget=args.prompt_batch_tokens, cache=analysis_cache) if texts else {}
+        share = (time.perf_counter() - start) / max(1, len(texts))
+        return [finish(t, lambda text, path=t[0]: analyses[call_ids[path]], {"analyze_s": share} if t[0] in texts else {})
+                for t in transcriptions]
+
+    counts = {"ok": 0, "failed": 0}
+    stats = PipelineStats()
+
+    async def drive(pool, out):
+        jobs = [(path, transcribe_options, not args.no_trim) for path in to_transcribe]
+        ready = [(path, result, 0.0, None) for path, result in cached]
+        batched = args.prompt_batch_size > 1
+        async for record in run_pipeline(jobs, transcribe_file_in_worker, analyze_many if batched else analyze, pool,
+                                         args.workers, analyze_concurrency=args.gemini_concurrency,
+                                         queue_size=max(args.queue_size, args.prompt_batch_size), ready=ready,
+                                         stats=stats, analyze_batch_size=args.prompt_batch_size):
+            write_record(out, record, counts)
+            if args.stats_every and stats.finished % args.stats_every == 0:
+                print(json.dumps(dict(stats.snapshot(), gemini=gemini_model.stats())), file=sys.stderr)
+
+    with open(args.output, "a", encoding="utf-8") as out, create_worker_pool(args.whisper_model, args.workers) as pool:
+        asyncio.run(drive(pool, out))
+
+    print(f"Done: {counts['ok']} ok, {counts['failed']} failed "
+          f"(transcript cache hits: {len(cached)}, misses: {len(to_transcribe)})", file=sys.stderr)
+    print(json.dumps(dict(stats.snapshot(), gemini=gemini_model.stats()), indent=2), file=sys.stderr)
+
+
+def process_call(path, result, timings, error, analyze_fn, include_segments=False, local_triage=False):
+    """Analyze one transcription result with analyze_fn(text) and build its record.
+
+    With local_triage, clear-cut calls are answered by triage.route instead.
+    """
+    if error:
+        record = build_record(path, "error", timings, error=f"transcription: {error}")
+    elif not result.get("text", "").strip():
+        record = build_record(path, "error", timings, error="empty transcript", result=result,
+                              include_segments=include_segments)
+    else:
+        start = time.perf_counter()
+        analyze_s = timings.get("analyze_s", 0.0)
+        try:
+            analysis, triage = route(result) if local_triage else (None, None)
+            compaction = None
+            if analysis is None:
+                compaction = prompt_transcript(result)
+                analysis = analyze_fn(compaction["text"])
+            timings["analyze_s"] = analyze_s + time.perf_counter() - start
+            if analysis.get("error"):
+                raise RuntimeError(analysis["error"])
+            status = "ok" if analysis["parsed"] is not None else "unparsed"
+            record = build_record(path, status, timings, result=result, analysis=analysis,
+                                  include_segments=include_segments)
+            if compaction:
+                record["compaction"] = {key: value for key, value in compaction.items() if key != "text"}
+            if triage:
+                record["triage"] = triage
+        except Exception as e:
+            timings["analyze_s"] = analyze_s + time.perf_counter() - start
+            record = build_record(path, "error", timings, error=f"analysis: {e}", result=result,
+                                  include_segments=include_segments)
+
+    record["timings"]["total_s"] = round(sum(timings.values()), 3)
+    return record
+
+
+def write_record(out, record, counts):
+    """Append one record to the output and report failures"""
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+    if record["status"] == "ok":
+        counts["ok"] += 1
+    else:
+        counts["failed"] += 1
+        print(f"[{record['status']}] {record['file']}: {record.get('error', 'could not parse analysis')}",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch transcribe and analyze call recordings")
+    parser.add_argument("source", help="Directory of recordings or a manifest file with one path per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL output file (appended to on resume)")
+    parser.add_argument("-w", "--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of transcription worker processes")
+    parser.add_argument("--gemini-concurrency", type=int, default=4, help="Gemini requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Gemini requests-per-minute quota")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="Gemini tokens-per-minute quota")
+    parser.add_argument("--prompt-batch-size", type=int, default=1,
+                        help="Pack up to this many transcripts into one Gemini request (1 = one call per request)")
+    parser.add_argument("--prompt-batch-tokens", type=int, default=8000,
+                        help="Token budget for one batched prompt")
+    parser.add_argument("--queue-size", type=int, default=8,
+                        help="Transcripts allowed to wait for analysis before transcription pauses")
+    parser.add_argument("--stats-every", type=int, default=50, help="Print pipeline stats every N calls (0 to disable)")
+    parser.add_argument("--language", default="ar")
+    parser.add_argument("--whisper-model", default=WHISPER_MODEL_NAME)
+    parser.add_argument("--gemini-model", default=GEMINI_MODEL_NAME)
+    parser.add_argument("--no-trim", action="store_true", help="Transcribe silence and hold music instead of skipping them")
+    parser.add_argument("--segments", action="store_true", help="Include Whisper segments in each record")
+    parser.add_argument("--no-analysis-cache", action="store_true", help="Always call Gemini, ignoring cached analyses")
+    parser.add_argument("--local-triage", action="store_true", default=LOCAL_TRIAGE,
+                        help="Answer clear-cut calls locally instead of with Gemini (default: LOCAL_TRIAGE)")
+    parser.add_argument("--retry-failed", action="store_true", help="Reprocess files whose last record was not ok")
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
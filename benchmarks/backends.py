@@ -0,0 +1,129 @@
+"""Accuracy vs speed of the transcription backends on sample call recordings.
+
+Usage:
+    python benchmarks/backends.py test_audio/*.mp3 --model turbo --threads 4
+    python benchmarks/backends.py calls/ --backends whisper whisper-int8 faster-whisper
+
+Each backend runs in a fresh process (so thread settings and memory do not
+leak between them), loads the model once and transcribes every recording
+with the app's options. Reports load time, real-time factor (transcription
+seconds per audio second, lower is faster), peak RSS and word error rate.
+A recording with a `.txt` file of the same name is scored against that
+reference; otherwise the first backend's transcript is the reference, so
+"wer" is the disagreement with it. Words are compared after the Arabic
+normalization used by transcript search. A backend that cannot be loaded
+(e.g. faster-whisper not installed) is reported with its error.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE, decode_audio
+from backends import BACKENDS, load_backend
+from search import terms
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".mp4")
+TRANSCRIBE_OPTIONS = {"language": "ar"}
+
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def word_errors(reference, hypothesis):
+    """Substitutions + deletions + insertions between two word lists (Levenshtein)"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def transcribe_all(backend, model, threads, files, queue):
+    try:
+        start = time.perf_counter()
+        engine = load_backend(model, backend, threads)
+        load_s = time.perf_counter() - start
+        texts, audio_s, transcribe_s = [], 0.0, 0.0
+        for path in files:
+            with open(path, "rb") as f:
+                audio = decode_audio(f.read(), filename=path)
+            start = time.perf_counter()
+            texts.append(engine.transcribe(audio, **TRANSCRIBE_OPTIONS)["text"])
+            transcribe_s += time.perf_counter() - start
+            audio_s += len(audio) / SAMPLE_RATE
+        queue.put({
+            "texts": texts, "load_s": load_s, "rtf": transcribe_s / audio_s,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def run_backend(backend, model, threads, files):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=transcribe_all, args=(backend, model, threads, files, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("audio", nargs="+", help="Recordings or directories of recordings")
+    parser.add_argument("--model", default="turbo", help="Whisper model name or checkpoint path")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, help="CPU threads per backend (default: TRANSCRIBE_THREADS or the runtime's own)")
+    args = parser.parse_args()
+
+    files = collect(args.audio)
+    if not files:
+        sys.exit("No recordings found")
+    references = []
+    for path in files:
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding="utf-8") as f:
+                references.append(terms(f.read()))
+        else:
+            references.append(None)
+
+    report = {"files": len(files), "references": sum(r is not None for r in references), "backends": {}}
+    baseline = None
+    for backend in args.backends:
+        result = run_backend(backend, args.model, args.threads, files)
+        row = {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items() if key != "texts"}
+        if "texts" in result:
+            hypotheses = [terms(text) for text in result["texts"]]
+            baseline = baseline or hypotheses
+            scored = [(ref if ref is not None else base, hyp) for ref, base, hyp in zip(references, baseline, hypotheses)]
+            row["wer"] = round(sum(word_errors(ref, hyp) for ref, hyp in scored) / max(1, sum(len(ref) for ref, _ in scored)), 4)
+        report["backends"][backend] = row
+        print(json.dumps({backend: row}), file=sys.stderr)
+
+    first = report["backends"].get(args.backends[0], {})
+    for row in report["backends"].values():
+        if "wer" in row and "wer" in first:
+            row["wer_delta"] = round(row["wer"] - first["wer"], 4)
+            row["speedup"] = round(first["rtf"] / row["rtf"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
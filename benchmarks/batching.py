@@ -0,0 +1,88 @@
+"""Tokens-per-call and calls-per-minute for single-call vs batched analysis prompts.
+
+Usage:
+    python benchmarks/batching.py --calls 60 --token-budget 8000 --drop-rate 0.05
+
+Runs against FakeGeminiModel, whose latency grows with the response length,
+so the comparison reflects both the fixed prompt overhead saved per call and
+the longer per-request decode time of batched responses.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_batch, analyze_transcript
+from fake_gemini import FakeGeminiModel
+
+SENTENCES = [
+    "السلام عليكم، عندي مشكلة في الفاتورة.",
+    "تم خصم مبلغ إضافي من رصيدي بدون سبب.",
+    "الموظف: أعتذر عن الإزعاج، سأقوم بإرجاع المبلغ الآن.",
+    "شكراً جزيلاً، تم حل المشكلة.",
+    "الإنترنت بطيء جداً منذ أسبوع.",
+]
+
+
+def make_calls(n, min_sentences, max_sentences, seed):
+    rng = random.Random(seed)
+    return [
+        (f"call-{i:04d}", " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(min_sentences, max_sentences))))
+        for i in range(n)
+    ]
+
+
+def summarize(mode, analyses, requests, elapsed):
+    prompt = sum(a["usage"].get("prompt_tokens", 0) for a in analyses)
+    response = sum(a["usage"].get("response_tokens", 0) for a in analyses)
+    parsed = sum(1 for a in analyses if a["parsed"] is not None)
+    return {
+        "mode": mode,
+        "calls": len(analyses),
+        "parsed": parsed,
+        "requests": requests,
+        "prompt_tokens_per_call": round(prompt / len(analyses), 1),
+        "response_tokens_per_call": round(response / len(analyses), 1),
+        "calls_per_minute": round(len(analyses) / elapsed * 60, 1),
+        "individual_retries": sum(1 for a in analyses if a.get("batch_retry")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--min-sentences", type=int, default=3)
+    parser.add_argument("--max-sentences", type=int, default=12)
+    parser.add_argument("--token-budget", type=int, default=8000)
+    parser.add_argument("--drop-rate", type=float, default=0.05, help="Fraction of calls the fake omits from a batch")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--output-token-latency", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    calls = make_calls(args.calls, args.min_sentences, args.max_sentences, args.seed)
+
+    def fake():
+        return FakeGeminiModel(latency=(args.latency, args.latency), output_token_latency=args.output_token_latency,
+                               batch_drop_rate=args.drop_rate, seed=args.seed)
+
+    single = fake()
+    start = time.perf_counter()
+    single_results = [analyze_transcript(single, transcript) for _, transcript in calls]
+    single_report = summarize("single", single_results, single.calls["requests"], time.perf_counter() - start)
+
+    batched = fake()
+    start = time.perf_counter()
+    batch_results = analyze_batch(batched, calls, token_budget=args.token_budget)
+    batch_report = summarize("batched", list(batch_results.values()), batched.calls["requests"],
+                             time.perf_counter() - start)
+
+    print(json.dumps({"single": single_report, "batched": batch_report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
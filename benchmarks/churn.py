@@ -0,0 +1,117 @@
+"""Churn scoring cost: a full vectorized pass, and incremental refreshes in the call store.
+
+Usage:
+    python benchmarks/churn.py --calls 100000 1000000 --reps 10000
+    python benchmarks/churn.py --store-reps 2000 --store-calls 100000 --path /tmp/churn-bench.sqlite3
+
+First times churn.compute_churn on synthetic call columns of each size
+(every rep rescored at once, as on a store's first refresh). Then builds
+(or reuses) a call store and times its first refresh_churn(), a refresh
+after one new call (one rep rescored), a refresh with nothing to do, and a
+page of list_reps, which reads the stored churn rates.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from churn import compute_churn
+from metrics import percentile
+from store import CallStore
+
+OUTCOMES = np.array(["resolved", "resolved", "resolved", "unresolved", "escalated"], dtype=object)
+
+
+def synthetic_columns(n_calls, n_reps, seed):
+    rng = np.random.default_rng(seed)
+    rep_ids = np.char.add("rep", rng.integers(1, n_reps + 1, n_calls).astype(str)).astype(object)
+    dates = (np.datetime64("2025-01-01") + rng.integers(0, 365, n_calls)).astype(str)
+    outcomes = OUTCOMES[rng.integers(0, len(OUTCOMES), n_calls)]
+    escalation = (outcomes == "escalated") | (rng.random(n_calls) < 0.05)
+    scores = np.where(rng.random(n_calls) < 0.1, np.nan, rng.uniform(20, 100, n_calls))
+    churn_intents = rng.random(n_calls) < 0.03
+    return rep_ids, dates, outcomes, escalation, scores, churn_intents
+
+
+def synthetic_reps(n_reps, n_calls, seed):
+    rng = random.Random(seed)
+    for i in range(n_reps):
+        calls = []
+        for _ in range(max(1, n_calls // n_reps)):
+            outcome = rng.choice(OUTCOMES)
+            calls.append({
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "transcript": "Synthetic call.",
+                "sentiment": {"outcome": outcome, "score": round(rng.uniform(0.2, 1.0), 2)},
+            })
+        yield {"id": f"rep{i + 1:05d}", "name": f"Rep {i + 1}", "calls": calls}
+
+
+def timed_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(samples, 50), 3), "p95_ms": round(percentile(samples, 95), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--reps", type=int, default=10_000)
+    parser.add_argument("--store-reps", type=int, default=2000)
+    parser.add_argument("--store-calls", type=int, default=100_000)
+    parser.add_argument("--path", default="/tmp/churn-bench.sqlite3")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = {"compute": {}}
+    for n_calls in args.calls:
+        columns = synthetic_columns(n_calls, args.reps, args.seed)
+        start = time.perf_counter()
+        scores = compute_churn(*columns)
+        report["compute"][n_calls] = {"reps": len(scores), "seconds": round(time.perf_counter() - start, 3)}
+
+    store = CallStore(args.path)
+    start = time.perf_counter()
+    added = store.seed(synthetic_reps(args.store_reps, args.store_calls, args.seed))
+    load_s = time.perf_counter() - start
+    store.rebuild_stats()
+    start = time.perf_counter()
+    rescored = store.refresh_churn()
+    first_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+
+    def add_and_refresh():
+        store.add_call(f"rep{rng.randint(1, args.store_reps):05d}", "2025-12-31", "Benchmark call.",
+                       {"sentiment_score": 40, "escalation_required": "Yes", "outcome": "unresolved"},
+                       source="benchmark")
+        start = time.perf_counter()
+        store.refresh_churn()
+        return time.perf_counter() - start
+
+    incremental = [add_and_refresh() * 1000 for _ in range(args.repeats)]
+    report["store"] = {
+        "reps": args.store_reps,
+        "calls": store.summary()["calls"],
+        "load_s": round(load_s, 1) if added else "reused",
+        "first_refresh": {"reps": rescored, "seconds": round(first_s, 3)},
+        "refresh_after_one_call": {"p50_ms": round(percentile(incremental, 50), 3),
+                                   "p95_ms": round(percentile(incremental, 95), 3)},
+        "refresh_nothing_new": timed_ms(store.refresh_churn, args.repeats),
+        "list_reps_page": timed_ms(lambda: store.list_reps("sentiment_score", limit=50), args.repeats),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
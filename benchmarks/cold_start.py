@@ -0,0 +1,76 @@
+"""Cold-start time per page: fresh process to first rendered page.
+
+Usage:
+    python benchmarks/cold_start.py --runs 3
+
+Every sample starts a new Python process, so imports and model loads are
+paid again, and runs the app script with streamlit's AppTest until the
+requested page has rendered. Pages other than the default one need a second
+script run to navigate, which is included. Needs the app's dependencies and
+GEMINI_API_KEY set (no requests are sent). Run with JOB_WORKERS=0 to time
+pages without job worker processes competing for the CPU.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from metrics import percentile
+
+HEAVY_MODULES = ("whisper", "torch", "google.generativeai")
+PAGES = ["Upload & Analyze", "Reps Overview", "Rep Profiles", "Search Calls"]
+
+
+def render_page(page):
+    """Run in a fresh process: render page and print which heavy modules got imported"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=600)
+    app.run()
+    if page != PAGES[0]:
+        app.sidebar.radio[0].set_value(page).run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    print(json.dumps(sorted(name for name in HEAVY_MODULES if name in sys.modules)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--pages", nargs="+", default=PAGES)
+    parser.add_argument("--page", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.page:
+        os.chdir(ROOT)
+        render_page(args.page)
+        return
+
+    report = {}
+    for page in args.pages:
+        samples, imported = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--page", page],
+                capture_output=True, text=True, check=True,
+            )
+            wall = time.perf_counter() - start
+            samples.append(wall)
+            imported = json.loads(out.stdout.strip().splitlines()[-1])
+        report[page] = {
+            "cold_start_p50_s": round(percentile(samples, 50), 2),
+            "cold_start_max_s": round(max(samples), 2),
+            "heavy_modules_imported": imported,
+        }
+        print(json.dumps({page: report[page]}), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Prompt tokens saved by transcript compaction, and agreement with analyses of the full transcript.
+
+Usage:
+    python benchmarks/compaction.py --calls 40 --minutes 5 30 --token-budget 6000
+    python batch.py calls/ --output results.jsonl --segments
+    python benchmarks/compaction.py --results results.jsonl --gemini
+
+Every call is analyzed twice, once with its full text and once compacted
+(compaction.compact_transcript), and the report compares prompt tokens,
+latency and the fields the prompt's rules decide: final sentiment,
+escalation, outcome and the sentiment score. Calls come from a batch.py
+output written with --segments, or are synthetic: an opening complaint,
+filler-heavy middle turns with Whisper-style repeats, hallucinations and
+low-confidence segments, and a closing that is either resolved or not.
+--gemini sends both prompts to Gemini (GEMINI_API_KEY); otherwise a fake
+that reads the outcome off the opening and closing turns stands in, so its
+agreement only checks that compaction keeps the turns those rules need.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_transcript
+from compaction import compact_transcript
+from fake_gemini import FakeGeminiModel
+from metrics import percentile
+
+OPENINGS = [
+    ("السلام عليكم، عندي مشكلة في الفاتورة هذا الشهر، تم خصم مبلغ إضافي.", "Billing discrepancy"),
+    ("مرحبا، الإنترنت عندي بطيء جداً منذ أسبوع ولا يعمل في المساء.", "Slow internet"),
+    ("أهلا، تم تفعيل خدمة التجوال بدون طلبي وخصموا من رصيدي.", "Unexpected roaming charge"),
+]
+MIDDLE = [
+    "الموظف: يعني ممكن رقم الهوية لو سمحت؟",
+    "العميل: اه اه تفضل، الرقم عندي هنا.",
+    "الموظف: امم خليني أتحقق من النظام يعني لحظة.",
+    "العميل: انا انا انا اتصلت قبل كده ومحدش رد علي.",
+    "الموظف: أفهم ذلك، سأراجع سجل المكالمات السابقة.",
+    "العميل: يعني المشكلة دي بتتكرر كل شهر تقريباً.",
+    "الموظف: النظام يظهر عملية بتاريخ الخامس من الشهر.",
+]
+CLOSINGS = {
+    "resolved": ["الموظف: تم إرجاع المبلغ إلى حسابك وسيظهر خلال يوم.", "العميل: شكراً جزيلاً، تم حل المشكلة."],
+    "unresolved": ["الموظف: سيتصل بك الفريق الفني لاحقاً.", "العميل: أنا غير راضٍ، أريد التحدث مع المدير."],
+}
+HALLUCINATION = "ترجمة نانسي قنقر"
+
+
+def segment(text, rng, avg_logprob=None, no_speech_prob=None, compression_ratio=None):
+    return {
+        "text": " " + text,
+        "avg_logprob": avg_logprob if avg_logprob is not None else rng.uniform(-0.6, -0.1),
+        "no_speech_prob": no_speech_prob if no_speech_prob is not None else rng.uniform(0.0, 0.1),
+        "compression_ratio": compression_ratio if compression_ratio is not None else rng.uniform(1.1, 1.8),
+    }
+
+
+def synthetic_call(minutes, rng):
+    """A Whisper-style result of about minutes length (one segment per ~5 s)"""
+    opening, _ = rng.choice(OPENINGS)
+    segments = [segment(opening, rng)]
+    for _ in range(int(minutes * 12)):
+        roll = rng.random()
+        if roll < 0.05 and len(segments) > 1:
+            segments.append(dict(segments[-1]))  # Whisper repeating the previous segment
+        elif roll < 0.07:
+            segments.append(segment(HALLUCINATION, rng, avg_logprob=-0.8, no_speech_prob=0.4))
+        elif roll < 0.12:
+            segments.append(segment(rng.choice(MIDDLE), rng, avg_logprob=rng.uniform(-2.5, -1.6)))
+        else:
+            segments.append(segment(rng.choice(MIDDLE), rng))
+    segments += [segment(text, rng) for text in CLOSINGS[rng.choice(list(CLOSINGS))]]
+    return {"text": "".join(s["text"] for s in segments), "segments": segments}
+
+
+class RuleFollowingFake(FakeGeminiModel):
+    """Answers from the transcript's opening issue and closing turns, the way the prompt's rules ask"""
+
+    def respond(self, prompt, json_mode=False):
+        transcript = prompt.split("Customer Call Transcript:", 1)[1].split("Guidelines for analysis:", 1)[0]
+        closing = transcript[-300:]
+        resolved = "تم حل" in closing or "شكرا" in closing
+        angry = "غير راض" in closing or "المدير" in closing
+        analysis = {
+            "final_customer_sentiment": "Negative" if angry else "Positive" if resolved else "Neutral",
+            "sentiment_score": 25 if angry else 85 if resolved else 55,
+            "resolution_summary": "Derived from the closing turns.",
+            "key_issues": [issue for opening, issue in OPENINGS if opening[:20] in transcript[:400]] or ["Unknown"],
+            "escalation_required": "No" if resolved and not angry else "Yes",
+            "outcome": "resolved" if resolved and not angry else "unresolved",
+        }
+        return json.dumps(analysis, ensure_ascii=False)
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [{"text": r["transcript"], "segments": r["segments"]} for r in records if r.get("segments")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", help="batch.py output written with --segments (default: synthetic calls)")
+    parser.add_argument("--calls", type=int, default=40, help="Synthetic calls")
+    parser.add_argument("--minutes", type=float, nargs=2, default=[5, 30], help="Synthetic call length range")
+    parser.add_argument("--token-budget", type=int, default=6000)
+    parser.add_argument("--gemini", action="store_true", help="Analyze with Gemini instead of the rule-following fake")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.results:
+        calls = load_results(args.results)
+    else:
+        calls = [synthetic_call(rng.uniform(*args.minutes), rng) for _ in range(args.calls)]
+    if args.gemini:
+        from dotenv import load_dotenv
+        from models import load_gemini
+        load_dotenv()
+        gemini_model = load_gemini("gemini-1.5-flash-latest", os.environ.get("GEMINI_API_KEY"))
+    else:
+        gemini_model = RuleFollowingFake(latency=(0.0, 0.0))
+
+    fields = ("final_customer_sentiment", "escalation_required", "outcome")
+    agree = {field: 0 for field in fields}
+    score_diffs, tokens, latencies, compared = [], {"full": [], "compacted": []}, {"full": [], "compacted": []}, 0
+    for result in calls:
+        compaction = compact_transcript(result, args.token_budget, gemini_model)
+        analyses = {}
+        for mode, text in (("full", result["text"]), ("compacted", compaction["text"])):
+            start = time.perf_counter()
+            analyses[mode] = analyze_transcript(gemini_model, text)
+            latencies[mode].append(time.perf_counter() - start)
+            tokens[mode].append(analyses[mode]["usage"].get("prompt_tokens", 0))
+        full, compacted = analyses["full"]["parsed"], analyses["compacted"]["parsed"]
+        if not (isinstance(full, dict) and isinstance(compacted, dict)):
+            continue
+        compared += 1
+        for field in fields:
+            agree[field] += str(full.get(field)).lower() == str(compacted.get(field)).lower()
+        if isinstance(full.get("sentiment_score"), (int, float)) and isinstance(compacted.get("sentiment_score"), (int, float)):
+            score_diffs.append(abs(full["sentiment_score"] - compacted["sentiment_score"]))
+
+    report = {
+        "calls": len(calls),
+        "compared": compared,
+        "token_budget": args.token_budget,
+        "prompt_tokens_full_mean": round(sum(tokens["full"]) / len(calls)),
+        "prompt_tokens_compacted_mean": round(sum(tokens["compacted"]) / len(calls)),
+        "prompt_tokens_saved": round(1 - sum(tokens["compacted"]) / max(1, sum(tokens["full"])), 3),
+        "prompt_tokens_compacted_max": max(tokens["compacted"]),
+        "latency_full_p50_s": round(percentile(latencies["full"], 50), 3),
+        "latency_compacted_p50_s": round(percentile(latencies["compacted"], 50), 3),
+        "agreement": {field: round(count / max(1, compared), 3) for field, count in agree.items()},
+        "sentiment_score_abs_diff_mean": round(sum(score_diffs) / len(score_diffs), 1) if score_diffs else None,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
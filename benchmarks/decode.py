@@ -0,0 +1,108 @@
+"""Compare the old temp-file decode path with in-memory ffmpeg piping.
+
+Usage:
+    python benchmarks/decode.py [recording.mp3] [--minutes 60] [--repeat 3]
+
+Without a recording, a synthetic call of --minutes length is generated with
+ffmpeg. Each method runs in a fresh process so peak RSS is measured cleanly.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from audio import SAMPLE_RATE, decode_audio
+
+
+def make_recording(path, minutes):
+    """Generate a synthetic stereo 44.1 kHz MP3 (tone plus noise)"""
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={minutes * 60}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:sample_rate=44100:duration={minutes * 60}",
+        "-filter_complex", "amix=inputs=2,aformat=channel_layouts=stereo",
+        "-b:a", "64k", path,
+    ], check=True)
+
+
+def decode_via_temp_file(data, name):
+    """The previous app path: write the upload to /tmp, then whisper.audio.load_audio"""
+    temp_dir = tempfile.mkdtemp()  # not /tmp itself, so the input recording is never overwritten
+    temp_path = os.path.join(temp_dir, name)
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    # Same command and conversion as whisper.audio.load_audio
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", temp_path,
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    os.remove(temp_path)
+    os.rmdir(temp_dir)
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def _measure(method, path, queue):
+    with open(path, "rb") as f:
+        data = f.read()  # stands in for the UploadedFile buffer
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if method == "temp_file":
+        audio = decode_via_temp_file(memoryview(data), os.path.basename(path))
+    else:
+        audio = decode_audio(memoryview(data), filename=path)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        "seconds": elapsed,
+        "samples": int(audio.shape[0]),
+        "peak_rss_delta_mb": (peak_rss - base_rss) / 1024,
+    })
+
+
+def run_method(method, path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(method, path, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        raise RuntimeError(f"{method} benchmark process failed with exit code {proc.exitcode}")
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", nargs="?")
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.recording
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"decode_bench_{int(args.minutes)}min.mp3")
+        if not os.path.exists(path):
+            print(f"Generating {args.minutes:g}-minute recording at {path}", file=sys.stderr)
+            make_recording(path, args.minutes)
+
+    report = {"recording": path, "bytes": os.path.getsize(path), "methods": {}}
+    for method in ("temp_file", "pipe"):
+        runs = [run_method(method, path) for _ in range(args.repeat)]
+        report["methods"][method] = {
+            "best_seconds": round(min(r["seconds"] for r in runs), 3),
+            "median_seconds": round(sorted(r["seconds"] for r in runs)[len(runs) // 2], 3),
+            "peak_rss_delta_mb": round(max(r["peak_rss_delta_mb"] for r in runs), 1),
+            "samples": runs[0]["samples"],
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Offline end-to-end benchmark: synthetic calls through transcription, analysis against a fake Gemini server, parsing and the overview.
+
+Usage:
+    python benchmarks/end_to_end.py --minutes 1 5 --calls 3 --whisper-model tiny --output report.json
+    python benchmarks/end_to_end.py --whisper-model none --latency 0.2 0.8 --error-rate 0.1 --formats json fenced text
+
+Needs no network and no API key; everything runs in a temporary directory
+(caches, call store, metrics log). The phases are:
+
+1. transcription: syllable-rate noise WAVs of each --minutes length are
+   decoded (audio.decode_audio) and transcribed with --backend. Whisper
+   weights must already be on disk (a downloaded model or a checkpoint
+   path); --whisper-model none skips this phase.
+2. analysis: synthetic Arabic call transcripts (benchmarks/compaction.py)
+   are compacted and analyzed with --concurrency threads through
+   GeminiScheduler and GeminiHTTPClient against a local FakeGeminiServer
+   with the given latency, error rate and response formats. Formats other
+   than json ignore JSON mode, so the fenced and text fallbacks are hit.
+3. parsing: clean_json_response + json.loads and parse_text_response on
+   canned responses of each format.
+4. overview: a call store seeded with --reps synthetic reps
+   (benchmarks/store.py), timing the Reps Overview queries.
+
+The report (stdout, and --output) has RTF per call length, per-call
+analysis latency percentiles, retries, tokens per call, parse formats,
+per-stage p50/p95 from the metrics log (metrics.py) and peak RSS after each
+phase. Transcription runs on noise, so its transcripts are not analyzed.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from analysis import analyze_transcript, clean_json_response, parse_text_response, stream_analysis
+from audio import SAMPLE_RATE, decode_audio
+from backends import BACKENDS, TRANSCRIBE_BACKEND
+from compaction import prompt_transcript
+from fake_gemini import CANNED_ANALYSIS, RESPONSE_FORMATS, FakeGeminiModel, FakeGeminiServer, GeminiHTTPClient
+from metrics import load_events, percentile, summarize
+from scheduler import GeminiScheduler
+from store import CallStore
+
+TRANSCRIBE_OPTIONS = {"language": "ar"}
+
+
+def load_benchmark(name):
+    """Another script in this directory, loaded by path (its name may clash with a root module)"""
+    spec = importlib.util.spec_from_file_location(f"benchmark_{name}", os.path.join(HERE, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def percentiles(samples):
+    return {f"p{q}_s": round(percentile(samples, q), 3) for q in (50, 95, 99)}
+
+
+def bench_transcription(args):
+    from backends import load_backend
+    make_wav = load_benchmark("job_queue").make_wav
+    start = time.perf_counter()
+    engine = load_backend(args.whisper_model, args.backend)
+    report = {"model": args.whisper_model, "backend": args.backend or TRANSCRIBE_BACKEND,
+              "load_s": round(time.perf_counter() - start, 2), "lengths": {}}
+    for minutes in args.minutes:
+        rtfs = []
+        for i in range(args.calls):
+            audio = decode_audio(make_wav(minutes * 60, args.seed + i), filename="call.wav")
+            start = time.perf_counter()
+            engine.transcribe(audio, **TRANSCRIBE_OPTIONS)
+            rtfs.append((time.perf_counter() - start) / (len(audio) / SAMPLE_RATE))
+        report["lengths"][f"{minutes:g}m"] = {"rtf_p50": round(percentile(rtfs, 50), 4),
+                                              "rtf_max": round(max(rtfs), 4)}
+    return report
+
+
+def bench_analysis(args):
+    synthetic_call = load_benchmark("compaction").synthetic_call
+    rng = random.Random(args.seed)
+    results = [synthetic_call(minutes, rng) for minutes in args.minutes for _ in range(args.calls)]
+    fake = FakeGeminiModel(latency=tuple(args.latency), error_rate=args.error_rate, formats=args.formats,
+                           ignore_json_mode=args.formats != ["json"], seed=args.seed)
+
+    def analyze(result):
+        start = time.perf_counter()
+        text = prompt_transcript(result, gemini_model)["text"]
+        if args.stream:
+            analysis = [payload for event, payload in stream_analysis(gemini_model, text) if event == "done"][0]
+        else:
+            analysis = analyze_transcript(gemini_model, text)
+        return time.perf_counter() - start, analysis
+
+    with FakeGeminiServer(fake) as server:
+        # No quota to wait for, but transient errors are retried as in production
+        gemini_model = GeminiScheduler(GeminiHTTPClient(server.url), rpm=1_000_000, tpm=10**10, base_delay=0.05)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            outcomes = list(executor.map(analyze, results))
+        elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in outcomes]
+    analyses = [analysis for _, analysis in outcomes]
+    stats = gemini_model.stats()
+    return {
+        "calls": len(results),
+        "calls_per_minute": round(len(results) / elapsed * 60, 1),
+        "latency": percentiles(latencies),
+        "retries": stats.get("retries", 0),
+        "prompt_tokens_per_call": round(sum(a["usage"].get("prompt_tokens", 0) for a in analyses) / len(analyses)),
+        "response_tokens_per_call": round(sum(a["usage"].get("response_tokens", 0) for a in analyses) / len(analyses)),
+        # From the metrics log, which tells fenced JSON apart from bare JSON
+        "formats": summarize(load_events())["parse_formats"],
+    }
+
+
+def bench_parsing(repeats):
+    report = {}
+    for fmt, render in RESPONSE_FORMATS.items():
+        text = render(CANNED_ANALYSIS)
+        parse = parse_text_response if fmt == "text" else lambda t: json.loads(clean_json_response(t))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            parse(text)
+        report[fmt] = {"us_per_call": round((time.perf_counter() - start) / repeats * 1e6, 2)}
+    return report
+
+
+def bench_overview(args, path):
+    synthetic_reps = load_benchmark("store").synthetic_reps
+    store = CallStore(path)
+    start = time.perf_counter()
+    store.seed(synthetic_reps(args.reps, args.reps * args.calls_per_rep, args.seed))
+    seed_s = time.perf_counter() - start
+    rng = random.Random(args.seed)
+    pages = max(1, args.reps // 50)
+    samples = {"summary": [], "count_reps": [], "list_reps_page": []}
+    for _ in range(args.repeats):
+        for name, fn in (("summary", store.summary), ("count_reps", store.count_reps),
+                         ("list_reps_page", lambda: store.list_reps("sentiment_score", limit=50,
+                                                                    offset=rng.randrange(pages) * 50))):
+            start = time.perf_counter()
+            fn()
+            samples[name].append(time.perf_counter() - start)
+    report = {"reps": args.reps, "calls": store.summary()["calls"], "seed_s": round(seed_s, 2)}
+    for name, values in samples.items():
+        report[name] = {"p50_ms": round(percentile(values, 50) * 1000, 3),
+                        "p95_ms": round(percentile(values, 95) * 1000, 3)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5], help="Synthetic call lengths")
+    parser.add_argument("--calls", type=int, default=3, help="Calls per length")
+    parser.add_argument("--whisper-model", default="tiny", help="Model name or checkpoint path, or 'none' to skip")
+    parser.add_argument("--backend", choices=BACKENDS, help="Default: TRANSCRIBE_BACKEND")
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.2, 0.6], help="Fake Gemini latency range (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Gemini requests failing with 503")
+    parser.add_argument("--formats", nargs="+", default=["json", "fenced", "text"], choices=RESPONSE_FORMATS)
+    parser.add_argument("--stream", action="store_true", help="Analyze with streaming, as the job workers do")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent analyses")
+    parser.add_argument("--reps", type=int, default=1000, help="Synthetic reps for the overview phase")
+    parser.add_argument("--calls-per-rep", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=50, help="Repeats of the overview queries")
+    parser.add_argument("--parse-repeats", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "peak_rss_mb": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Caches, the metrics log and the call store all default to paths under the working directory
+        os.chdir(workdir)
+        if args.whisper_model != "none":
+            report["transcription"] = bench_transcription(args)
+            report["peak_rss_mb"]["transcription"] = peak_rss_mb()
+        report["analysis"] = bench_analysis(args)
+        report["peak_rss_mb"]["analysis"] = peak_rss_mb()
+        report["parsing"] = bench_parsing(args.parse_repeats)
+        report["overview"] = bench_overview(args, os.path.join(workdir, "calls.sqlite3"))
+        report["peak_rss_mb"]["overview"] = peak_rss_mb()
+        report["stages"] = summarize(load_events())["stages"]
+        os.chdir(HERE)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
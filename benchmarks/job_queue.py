@@ -0,0 +1,144 @@
+"""Job latency and throughput of the background job queue per number of worker processes.
+
+Usage:
+    python benchmarks/job_queue.py --workers 1 2 4 --jobs 16 --seconds 60
+
+For each worker count, starts that many worker processes (as worker.py
+does) with stand-in models: Whisper is replaced by a decode function that
+sleeps --batch-cost + --window-cost per window of each batch, Gemini by
+FakeGeminiModel. It then times single jobs on an idle queue (upload to
+result, including polling) and a burst of --jobs uploads submitted at once.
+Everything runs in a temporary directory; needs ffmpeg to decode the
+generated WAV uploads. Keep --seconds under LONG_AUDIO_SECONDS: longer
+uploads go to the long-audio process pool, which loads the real Whisper.
+"""
+import argparse
+import functools
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE
+from cache import hash_audio
+from fake_gemini import FakeGeminiModel
+from inference import TranscriptionServer
+from jobs import JobQueue
+from metrics import percentile
+from models import LazyModel
+from worker import Worker
+
+
+def make_wav(seconds, seed):
+    """Noise with a syllable-rate level swing, so silence trimming keeps all of it"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.1 + 0.9 * (np.sin(2 * np.pi * 4 * t) > 0)
+    samples = (np.random.default_rng(seed).standard_normal(len(t)) * envelope * 3000).astype(np.int16)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    return out.getvalue()
+
+
+def fake_decode(model, windows, options, batch_cost, window_cost):
+    time.sleep(batch_cost + window_cost * len(windows))
+    return [{"text": "السلام عليكم، عندي مشكلة في الفاتورة.", "segments": [], "language": "ar"} for _ in windows]
+
+
+def run_worker(index, concurrency, batch_cost, window_cost, gemini_latency):
+    models = {
+        "whisper": LazyModel("Whisper (stand-in)", lambda: None),
+        "gemini": LazyModel("Gemini (stand-in)", lambda: FakeGeminiModel(latency=(gemini_latency, gemini_latency))),
+    }
+    decode = functools.partial(fake_decode, batch_cost=batch_cost, window_cost=window_cost)
+    server = TranscriptionServer(lambda: None, decode=decode)
+    Worker(f"bench:{index}", models=models, server=server).run(concurrency)
+
+
+def wait_done(queue, job_ids):
+    while True:
+        jobs = [queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] in ("done", "failed") for job in jobs):
+            return jobs
+        time.sleep(0.05)
+
+
+def submit(queue, seconds, seed):
+    data = make_wav(seconds, seed)
+    return queue.submit(data, f"call{seed}.wav", hash_audio(data), refresh=True)
+
+
+def run(workers, args, seeds):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=run_worker, args=(i, args.concurrency, args.batch_cost, args.window_cost, args.gemini_latency))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    queue = JobQueue()
+    try:
+        while len([w for w in queue.live_workers() if w["name"].startswith("bench:")]) < workers:
+            time.sleep(0.1)
+        single = []
+        for _ in range(args.single):
+            job, = wait_done(queue, [submit(queue, args.seconds, next(seeds))])
+            single.append(job["finished_at"] - job["created_at"])
+
+        start = time.perf_counter()
+        job_ids = [submit(queue, args.seconds, next(seeds)) for _ in range(args.jobs)]
+        jobs = wait_done(queue, job_ids)
+        wall = time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+        queue.close()
+    latencies = [job["finished_at"] - job["created_at"] for job in jobs]
+    return {
+        "workers": workers,
+        "single_job_p50_s": round(percentile(single, 50), 2),
+        "burst_wall_s": round(wall, 2),
+        "burst_jobs_per_s": round(args.jobs / wall, 2),
+        "burst_latency_p50_s": round(percentile(latencies, 50), 2),
+        "burst_latency_p95_s": round(percentile(latencies, 95), 2),
+        "failed_jobs": sum(job["status"] == "failed" for job in jobs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs per worker process")
+    parser.add_argument("--jobs", type=int, default=16, help="Uploads in the burst")
+    parser.add_argument("--single", type=int, default=3, help="Jobs timed one at a time")
+    parser.add_argument("--seconds", type=float, default=60, help="Length of each upload")
+    parser.add_argument("--batch-cost", type=float, default=0.2, help="Stand-in Whisper seconds per batch")
+    parser.add_argument("--window-cost", type=float, default=0.05, help="Stand-in Whisper seconds per window")
+    parser.add_argument("--gemini-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    # Queue, uploads, caches and call store all use relative default paths
+    os.chdir(tempfile.mkdtemp(prefix="job_queue_bench"))
+    seeds = iter(range(10 ** 9))
+    report = []
+    for workers in args.workers:
+        row = run(workers, args, seeds)
+        report.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Real-time factor of chunked long-audio transcription versus worker count.
+
+Usage:
+    python benchmarks/long_audio.py call.mp3 --workers 1 2 4 8
+
+RTF is transcription wall time divided by audio duration (lower is better).
+workers=1 runs whisper's own transcribe on the whole recording as the baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE, decode_audio, split_on_silence
+from transcription import create_worker_pool, transcribe_in_worker, transcribe_long
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--model", default="turbo")
+    parser.add_argument("--language", default="ar")
+    args = parser.parse_args()
+
+    with open(args.recording, "rb") as f:
+        audio = decode_audio(f.read(), filename=args.recording)
+    duration = len(audio) / SAMPLE_RATE
+    options = {"language": args.language}
+    report = {
+        "recording": args.recording,
+        "audio_seconds": round(duration, 1),
+        "chunks": len(split_on_silence(audio)),
+        "runs": [],
+    }
+
+    for workers in args.workers:
+        with create_worker_pool(args.model, workers) as pool:
+            # One sleeping task per worker forces every worker to start and load its model before timing
+            list(pool.map(time.sleep, [1.0] * workers))
+            start = time.perf_counter()
+            if workers == 1:
+                result = pool.submit(transcribe_in_worker, audio, options).result()
+            else:
+                result = transcribe_long(pool, audio, options)
+            elapsed = time.perf_counter() - start
+        report["runs"].append({
+            "workers": workers,
+            "seconds": round(elapsed, 2),
+            "rtf": round(elapsed / duration, 4),
+            "segments": len(result["segments"]),
+        })
+        print(json.dumps(report["runs"][-1]), file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
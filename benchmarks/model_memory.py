@@ -0,0 +1,98 @@
+"""Load time and memory of N processes each holding a Whisper model.
+
+Usage:
+    python models.py turbo          # once, writes data/whisper/turbo.mmap.pt
+    python benchmarks/model_memory.py --model turbo --processes 1 2 4
+
+For each process count, starts that many spawned processes that load the
+model the regular way (whisper.load_model) and then from the memory-mapped
+checkpoint, run one encoder/decoder pass so every weight page is touched,
+and report per-process load time, RSS and PSS (proportional set size, which
+splits shared pages between the processes that map them) while all of them
+hold the model. The PSS total is what the processes cost the machine together.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import load_whisper_mmap, mmap_checkpoint_path
+
+
+def memory_kb(path, fields):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in fields:
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def hold_model(method, model, barrier, results):
+    import torch
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    if method == "mmap":
+        whisper_model = load_whisper_mmap(mmap_checkpoint_path(model))
+    else:
+        import whisper
+        whisper_model = whisper.load_model(model, device="cpu")
+    load_s = time.perf_counter() - start
+    with torch.no_grad():
+        mel = torch.zeros(1, whisper_model.dims.n_mels, whisper_model.dims.n_audio_ctx * 2)
+        tokens = torch.zeros(1, 1, dtype=torch.long)
+        whisper_model.logits(tokens, whisper_model.embed_audio(mel))
+    usage = memory_kb("/proc/self/smaps_rollup", ("Rss", "Pss"))
+    results.put({"load_s": load_s, "rss_mb": usage["Rss"] / 1024, "pss_mb": usage["Pss"] / 1024})
+    # Keep the model alive until every process has been measured
+    barrier.wait()
+    barrier.wait()
+
+
+def run(method, model, processes):
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(processes + 1)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=hold_model, args=(method, model, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    samples = [results.get() for _ in workers]
+    barrier.wait()
+    for worker in workers:
+        worker.join()
+    return {
+        "load_s_max": round(max(s["load_s"] for s in samples), 2),
+        "rss_mb_per_process": round(sum(s["rss_mb"] for s in samples) / processes),
+        "pss_mb_total": round(sum(s["pss_mb"] for s in samples)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="turbo", help="Whisper model name or checkpoint path")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--methods", nargs="+", default=["load_model", "mmap"], choices=["load_model", "mmap"])
+    args = parser.parse_args()
+
+    if "mmap" in args.methods and not os.path.exists(mmap_checkpoint_path(args.model)):
+        sys.exit(f"No converted checkpoint at {mmap_checkpoint_path(args.model)}; run python3 models.py {args.model}")
+
+    report = []
+    for processes in args.processes:
+        row = {"processes": processes}
+        for method in args.methods:
+            row[method] = run(method, args.model, processes)
+        report.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
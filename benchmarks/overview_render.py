@@ -0,0 +1,101 @@
+"""Reps Overview render time and element count at growing headcounts.
+
+Usage:
+    python benchmarks/overview_render.py --reps 100 1000 10000 --calls-per-rep 5
+
+Seeds a throwaway call store per headcount and runs the app script with
+streamlit's AppTest on the Reps Overview page, in card and table mode. The
+element count is a proxy for the websocket payload sent to the browser.
+Needs the app's dependencies and GEMINI_API_KEY set (no requests are sent).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import store
+from metrics import percentile
+
+TEAMS = ["Billing", "Technical", "Sales", "Retention"]
+
+
+def synthetic_reps(n_reps, calls_per_rep, seed):
+    rng = random.Random(seed)
+    for i in range(n_reps):
+        yield {
+            "id": f"rep{i + 1:05d}",
+            "name": f"Rep {i + 1}",
+            "team": rng.choice(TEAMS),
+            "sentiment_score": rng.randint(40, 98),
+            "calls": [
+                {
+                    "date": f"2025-06-{rng.randint(1, 28):02d}",
+                    "transcript": "Synthetic call.",
+                    "sentiment": {"outcome": rng.choice(["resolved", "resolved", "escalated"]),
+                                  "score": round(rng.uniform(0.3, 1.0), 2)},
+                }
+                for _ in range(calls_per_rep)
+            ],
+        }
+
+
+def count_elements(node):
+    children = getattr(node, "children", None) or {}
+    return 1 + sum(count_elements(child) for child in children.values())
+
+
+def render(app, view, runs):
+    app.sidebar.radio[0].set_value("Reps Overview").run()
+    if view == "Table":
+        next(r for r in app.radio if r.label == "View").set_value("Table").run()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return {
+        "render_p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "render_p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "elements": count_elements(app._tree),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reps", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--calls-per-rep", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    report = []
+    for n_reps in args.reps:
+        path = os.path.join(tempfile.mkdtemp(), "calls.sqlite3")
+        store.CallStore(path).seed(synthetic_reps(n_reps, args.calls_per_rep, args.seed))
+        # AppTest runs app.py in this process: point it at the new store and drop the cached handle
+        store.DEFAULT_STORE_PATH = path
+        st.cache_resource.clear()
+        row = {"reps": n_reps}
+        for view in ("Cards", "Table"):
+            app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+            app.run()
+            row[view.lower()] = render(app, view, args.runs)
+        report.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Drive GeminiScheduler against FakeGeminiModel with injected 429s, errors and latency.
+
+Usage:
+    python benchmarks/scheduler.py --requests 200 --threads 16 --rpm 300 --rate-limit-rate 0.05 --error-rate 0.05
+
+The fake enforces --server-rpm (defaults to --rpm) on its side, so a
+scheduler that over-sends shows up as rate_limited retries. Exits non-zero if
+any request was lost.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_transcript
+from fake_gemini import FakeGeminiModel
+from scheduler import GeminiScheduler
+
+SAMPLE_TRANSCRIPT = "السلام عليكم، عندي مشكلة في الفاتورة هذا الشهر. " * 40
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rpm", type=int, default=300)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    parser.add_argument("--server-rpm", type=int)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.1, 0.4])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeGeminiModel(latency=tuple(args.latency), rpm_limit=args.server_rpm or args.rpm,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_delay=1,
+                           seed=args.seed)
+    scheduler = GeminiScheduler(fake, rpm=args.rpm, tpm=args.tpm, base_delay=0.5, max_delay=10)
+
+    def one(i):
+        try:
+            analyze_transcript(scheduler, f"{i}: {SAMPLE_TRANSCRIPT}")
+            return True
+        except Exception as e:
+            print(f"request {i} failed: {e}", file=sys.stderr)
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        ok = sum(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "requests": args.requests,
+        "succeeded": ok,
+        "lost": args.requests - ok,
+        "elapsed_s": round(elapsed, 2),
+        "achieved_rpm_overall": round(ok / elapsed * 60, 1),
+        "scheduler": scheduler.stats(),
+        "server": dict(fake.calls),
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["lost"] else 0)
+
+
+if __name__ == "__main__":
+    main()
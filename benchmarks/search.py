@@ -0,0 +1,100 @@
+"""Transcript search latency over a large synthetic call store.
+
+Usage:
+    python benchmarks/search.py --calls 2000000 --reps 2000 --path /tmp/search-bench.sqlite3
+
+Builds (or reuses) a store of synthetic Arabic transcripts and times the
+queries the Search Calls page issues: common and rare terms, a phrase, a
+prefix, and the same with rep and date filters.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+from store import CallStore
+
+SENTENCES = [
+    "السلام عليكم، عندي مشكلة في الفاتورة هذا الشهر.",
+    "تم خصم مبلغ إضافي من رصيدي بدون سبب.",
+    "أعتذر عن الإزعاج، سأقوم بإرجاع المبلغ الآن.",
+    "شكراً جزيلاً، تم حل المشكلة.",
+    "الإنترنت بطيء جداً منذ أسبوع.",
+    "أريد إلغاء الاشتراك والانتقال إلى شركة أخرى.",
+    "هل يمكنني ترقية الباقة إلى باقة أسرع؟",
+    "سيتصل بك الفريق الفني خلال يومين.",
+]
+RARE_WORDS = ["المنافس", "التعويض", "الراوتر", "الشكوى"]
+
+QUERIES = {
+    "common_term": "الفاتورة",
+    "rare_term": "الراوتر",
+    "phrase": '"إلغاء الاشتراك"',
+    "prefix": "ترقي*",
+    "two_terms": "الإنترنت بطيء",
+}
+
+
+def synthetic_reps(n_reps, n_calls, seed):
+    rng = random.Random(seed)
+    per_rep = max(1, n_calls // n_reps)
+    for i in range(n_reps):
+        calls = []
+        for _ in range(per_rep):
+            sentences = [rng.choice(SENTENCES) for _ in range(rng.randint(4, 12))]
+            if rng.random() < 0.01:
+                sentences.append(f"ذكر العميل {rng.choice(RARE_WORDS)}.")
+            calls.append({
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "transcript": " ".join(sentences),
+                "sentiment": {"outcome": rng.choice(["resolved", "escalated"]), "score": round(rng.random(), 2)},
+            })
+        yield {"id": f"rep{i + 1:05d}", "name": f"Rep {i + 1}", "sentiment_score": 70, "calls": calls}
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(samples, 50), 2), "p95_ms": round(percentile(samples, 95), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--reps", type=int, default=2000)
+    parser.add_argument("--path", default="/tmp/search-bench.sqlite3")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = CallStore(args.path)
+    start = time.perf_counter()
+    added = store.seed(synthetic_reps(args.reps, args.calls, args.seed))
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    report = {"calls": store.summary()["calls"], "load_s": round(load_s, 1) if added else "reused"}
+    for name, query in QUERIES.items():
+        report[name] = timed(lambda: store.search_calls(query, limit=args.limit), args.repeats)
+        report[name + "_by_rep"] = timed(
+            lambda: store.search_calls(query, rep_id=f"rep{rng.randint(1, args.reps):05d}", limit=args.limit),
+            args.repeats,
+        )
+        report[name + "_by_month"] = timed(
+            lambda: store.search_calls(query, date_from="2025-03-01", date_to="2025-03-31", limit=args.limit),
+            args.repeats,
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Lookup and listing latency of the call store at dashboard scale.
+
+Usage:
+    python benchmarks/store.py --reps 10000 --calls 5000000 --path /tmp/calls-bench.sqlite3
+
+Builds (or reuses) a store with synthetic reps and calls, then times the
+queries the dashboard pages issue: rep lookup, a page of a rep's call
+headers, one call's transcript and analysis, a page of the sorted rep list, escalated-call search and the overview summary, plus
+the cost of ingesting one call including its rollup updates.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+from store import CallStore
+
+OUTCOMES = ["resolved", "resolved", "resolved", "unresolved", "escalated"]
+
+
+def synthetic_reps(n_reps, n_calls, seed):
+    rng = random.Random(seed)
+    per_rep = max(1, n_calls // n_reps)
+    for i in range(n_reps):
+        score = rng.randint(40, 98)
+        calls = []
+        for j in range(per_rep):
+            outcome = rng.choice(OUTCOMES)
+            calls.append({
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "transcript": f"Synthetic call {j} for rep {i}.",
+                "sentiment": {"outcome": outcome, "score": round(rng.uniform(0.2, 1.0), 2)},
+            })
+        yield {"id": f"rep{i + 1:05d}", "name": f"Rep {i + 1}", "sentiment_score": score,
+               "escalations": rng.randint(0, 10), "calls": calls}
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(samples, 50), 3), "p95_ms": round(percentile(samples, 95), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reps", type=int, default=10_000)
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--path", default="/tmp/calls-bench.sqlite3")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = CallStore(args.path)
+    start = time.perf_counter()
+    added = store.seed(synthetic_reps(args.reps, args.calls, args.seed))
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    rep_ids = [f"rep{rng.randint(1, args.reps):05d}" for _ in range(args.repeats)]
+    ids = iter(rep_ids * 8)
+    total_calls = store.summary()["calls"]
+    report = {
+        "reps": args.reps,
+        "calls": total_calls,
+        "load_s": round(load_s, 1) if added else "reused",
+        "get_rep": timed(lambda: store.get_rep(next(ids)), args.repeats),
+        "call_headers_page": timed(lambda: store.get_calls(next(ids), limit=20), args.repeats),
+        "call_detail": timed(lambda: store.get_call_detail(rng.randint(1, total_calls)), args.repeats),
+        "list_reps_page": timed(lambda: store.list_reps("sentiment_score", limit=50, offset=rng.randint(0, 100) * 50),
+                                args.repeats),
+        "escalated_calls_page": timed(lambda: store.find_calls(escalation=True, limit=50), args.repeats),
+        "summary": timed(store.summary, max(1, args.repeats // 20)),
+        "add_call": timed(lambda: store.add_call(next(ids), "2025-12-31", "Benchmark call.",
+                                                 {"sentiment_score": 70, "escalation_required": "No",
+                                                  "outcome": "resolved"}, source="benchmark"), args.repeats),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Time-to-first-metric and total latency for streamed vs blocking call analysis.
+
+Usage:
+    python benchmarks/streaming.py --requests 20 --latency 0.4 --output-token-latency 0.01
+
+Runs against FakeGeminiModel, which paces streamed chunks by
+output_token_latency, so the gap between the first parsed field and the full
+response reflects how long the page would otherwise show only a spinner.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_transcript, stream_analysis
+from fake_gemini import FakeGeminiModel
+from metrics import percentile
+
+SAMPLE_TRANSCRIPT = "السلام عليكم، عندي مشكلة في الفاتورة هذا الشهر. " * 40
+
+
+def summarize(values):
+    return {"p50_s": round(percentile(values, 50), 3), "p95_s": round(percentile(values, 95), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.4, help="Seconds before the first chunk")
+    parser.add_argument("--output-token-latency", type=float, default=0.01)
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeGeminiModel(latency=(args.latency, args.latency), output_token_latency=args.output_token_latency,
+                           stream_chunk_chars=args.chunk_chars, seed=args.seed)
+
+    blocking = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        analyze_transcript(fake, SAMPLE_TRANSCRIPT)
+        blocking.append(time.perf_counter() - start)
+
+    first, total, fields = [], [], 0
+    for _ in range(args.requests):
+        for event, payload in stream_analysis(fake, SAMPLE_TRANSCRIPT):
+            if event == "field":
+                fields += 1
+            else:
+                first.append(payload["timings"]["first_field_s"])
+                total.append(payload["timings"]["total_s"])
+
+    report = {
+        "requests": args.requests,
+        "blocking_total": summarize(blocking),
+        "streaming_first_metric": summarize(first),
+        "streaming_total": summarize(total),
+        "fields_per_response": round(fields / args.requests, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
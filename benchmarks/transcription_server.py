@@ -0,0 +1,128 @@
+"""Concurrent sessions transcribing through the shared model vs the transcription server.
+
+Usage:
+    python benchmarks/transcription_server.py --model turbo --sessions 4 --batch-windows 1 8
+
+Each session submits one recording at the same moment (lengths cycle through
+--seconds). "shared_model" is the previous behaviour: every session thread
+calls transcribe() on the one cached model. The server rows run the same
+load through TranscriptionServer at each batch size. Reports wall time,
+audio seconds transcribed per second, and per-session latency; the shortest
+recording's latency shows whether long uploads starve short ones.
+Synthetic noise is used as audio, so only timing is meaningful.
+
+Before timing, it checks that no window the server would decode is longer
+than WINDOW_SECONDS (whisper.pad_or_trim would drop the rest) for a sweep
+of call lengths, with and without silences; --check-windows stops there.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE
+from inference import WINDOW_SECONDS, TranscriptionJob, TranscriptionServer
+from metrics import percentile
+from models import load_whisper
+
+
+def summarize(latencies, seconds, wall, failed=0):
+    shortest = min(range(len(seconds)), key=seconds.__getitem__)
+    return {
+        "failed_sessions": failed,
+        "wall_s": round(wall, 2),
+        "audio_s_per_s": round(sum(seconds) / wall, 2),
+        "latency_p50_s": round(percentile(latencies, 50), 2),
+        "latency_max_s": round(max(latencies), 2),
+        "shortest_call_latency_s": round(latencies[shortest], 2),
+    }
+
+
+def run_shared_model(model, recordings, options):
+    latencies = [None] * len(recordings)
+    failed = []
+
+    def session(i):
+        start = time.perf_counter()
+        try:
+            model.transcribe(recordings[i], **options)
+        except Exception as e:
+            # Concurrent decodes share the model's kv-cache hooks and can break each other
+            failed.append(repr(e))
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(len(recordings))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, len(failed)
+
+
+def run_server(model, recordings, options, batch_windows):
+    server = TranscriptionServer(lambda: model, batch_windows=batch_windows)
+    start = time.perf_counter()
+    jobs = [server.submit(f"session{i}", audio, options) for i, audio in enumerate(recordings)]
+    for job in jobs:
+        job.wait()
+    wall = time.perf_counter() - start
+    return [job.finished_at - job.submitted_at for job in jobs], wall, sum(job.error is not None for job in jobs)
+
+
+def check_windows(rng):
+    """Window lengths of TranscriptionJobs for calls of 1 s to 4 min; exits on any over WINDOW_SECONDS"""
+    longest = 0.0
+    for seconds in range(1, 241):
+        audio = (rng.standard_normal(seconds * SAMPLE_RATE) * 0.05).astype(np.float32)
+        if seconds % 2:
+            # Silences every 7 s, so cuts can land anywhere relative to the window size
+            for start in range(0, seconds, 7):
+                audio[start * SAMPLE_RATE:(start + 1) * SAMPLE_RATE] = 0.0
+        job = TranscriptionJob("check", audio, {})
+        lengths = [len(window) / SAMPLE_RATE for window in job.windows]
+        if max(lengths) > WINDOW_SECONDS or abs(sum(lengths) - seconds) > 1e-3:
+            sys.exit(f"A {seconds} s call was cut into windows of {lengths} s")
+        longest = max(longest, max(lengths))
+    return {"calls_checked": 240, "longest_window_s": round(longest, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="turbo", help="Whisper model name or checkpoint path")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[120, 20, 60, 20])
+    parser.add_argument("--batch-windows", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--sample-len", type=int, default=32, help="Cap on tokens decoded per window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check-windows", action="store_true", help="Only check window lengths")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    windows = check_windows(rng)
+    print(json.dumps({"windows": windows}), file=sys.stderr)
+    if args.check_windows:
+        return
+    seconds = [args.seconds[i % len(args.seconds)] for i in range(args.sessions)]
+    recordings = [(rng.standard_normal(int(s * SAMPLE_RATE)) * 0.05).astype(np.float32) for s in seconds]
+    options = {"language": "ar", "temperature": 0.0, "sample_len": args.sample_len}
+    model = load_whisper(args.model)
+
+    report = {"sessions": args.sessions, "seconds": seconds, "windows": windows}
+    latencies, wall, failed = run_shared_model(model, recordings, options)
+    report["shared_model"] = summarize(latencies, seconds, wall, failed)
+    for batch_windows in args.batch_windows:
+        latencies, wall, failed = run_server(model, recordings, options, batch_windows)
+        report[f"server_batch_{batch_windows}"] = summarize(latencies, seconds, wall, failed)
+        print(json.dumps({batch_windows: report[f"server_batch_{batch_windows}"]}), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""How many calls local triage answers without Gemini, and how often it agrees with Gemini's answer.
+
+Usage:
+    python benchmarks/triage.py --calls 500
+    python batch.py calls/ --output results.jsonl --segments
+    python benchmarks/triage.py --results results.jsonl --thresholds 0.7 0.8 0.85 0.9
+
+Every labelled call is classified with triage.classify, and for each
+confidence threshold the report gives the share routed locally, agreement
+with the label on those calls (final sentiment, escalation, outcome), the
+escalations it would have missed and the sentiment score difference. Labels
+come from a batch.py output of Gemini analyses (run without --local-triage)
+or from synthetic calls whose closing turns decide the label: clearly
+resolved, thanks without a fix, a handed-off follow-up, a polite ending
+with nothing fixed, or an angry escalation.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+from triage import TRIAGE_MIN_CONFIDENCE, classify
+
+OPENINGS = [
+    "السلام عليكم، عندي مشكلة في الفاتورة هذا الشهر، تم خصم مبلغ إضافي.",
+    "مرحبا، الإنترنت عندي بطيء جداً منذ أسبوع ولا يعمل في المساء.",
+    "أهلا، تم تفعيل خدمة التجوال بدون طلبي وخصموا من رصيدي.",
+    "السلام عليكم، أبغى أغير الباقة لباقة أرخص.",
+]
+MIDDLE = [
+    "الموظف: ممكن رقم الهوية لو سمحت؟",
+    "العميل: تفضل، الرقم عندي هنا.",
+    "الموظف: خليني أتحقق من النظام لحظة.",
+    "العميل: اتصلت قبل كده ومحدش رد علي.",
+    "الموظف: أفهم ذلك، سأراجع سجل المكالمات السابقة.",
+    "الموظف: النظام يظهر عملية بتاريخ الخامس من الشهر.",
+]
+# (closing turns, label) per kind of ending
+CLOSINGS = {
+    "resolved": (["الموظف: تم إرجاع المبلغ إلى حسابك.", "العميل: شكراً جزيلاً، تم حل المشكلة."],
+                 {"final_customer_sentiment": "Positive", "sentiment_score": 85, "escalation_required": "No",
+                  "outcome": "resolved"}),
+    "thanks_only": (["الموظف: للأسف لا أستطيع تعديل الفاتورة من عندي.", "العميل: طيب شكراً، مع السلامة."],
+                    {"final_customer_sentiment": "Neutral", "sentiment_score": 50, "escalation_required": "Yes",
+                     "outcome": "unresolved"}),
+    "follow_up": (["الموظف: سيتصل بك الفريق الفني خلال يومين.", "العميل: تمام، شكراً."],
+                  {"final_customer_sentiment": "Neutral", "sentiment_score": 60, "escalation_required": "Yes",
+                   "outcome": "unresolved"}),
+    "polite_unresolved": (["الموظف: حاضر، سأسجل ملاحظتك في النظام.", "العميل: تمام، شكراً، الله يسعدك."],
+                          {"final_customer_sentiment": "Neutral", "sentiment_score": 55, "escalation_required": "Yes",
+                           "outcome": "unresolved"}),
+    "angry": (["الموظف: هذا هو النظام المعمول به.", "العميل: أنا غير راضٍ، أريد التحدث مع المدير."],
+              {"final_customer_sentiment": "Negative", "sentiment_score": 20, "escalation_required": "Yes",
+               "outcome": "unresolved"}),
+}
+FIELDS = ("final_customer_sentiment", "escalation_required", "outcome")
+
+
+def synthetic_call(rng, max_turns=60):
+    """(Whisper-style result, label) with a random ending"""
+    turns = [rng.choice(OPENINGS)] + [rng.choice(MIDDLE) for _ in range(rng.randint(4, max_turns))]
+    closing, label = CLOSINGS[rng.choice(list(CLOSINGS))]
+    segments = [{"text": " " + text, "avg_logprob": rng.uniform(-0.6, -0.1)} for text in turns + closing]
+    return {"text": "".join(s["text"] for s in segments), "segments": segments}, label
+
+
+def load_results(path):
+    """(result, label) pairs from a batch.py output, skipping calls local triage answered"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [({"text": r["transcript"], "segments": r.get("segments", [])}, r["analysis"]) for r in records
+            if r["status"] == "ok" and isinstance(r.get("analysis"), dict) and "triage" not in r]
+
+
+def same(a, b):
+    return str(a).strip().lower() == str(b).strip().lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", help="batch.py output with Gemini analyses (default: synthetic calls)")
+    parser.add_argument("--calls", type=int, default=500, help="Synthetic calls")
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=sorted({0.6, 0.7, 0.8, TRIAGE_MIN_CONFIDENCE, 0.9}))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.results:
+        calls = load_results(args.results)
+    else:
+        rng = random.Random(args.seed)
+        calls = [synthetic_call(rng) for _ in range(args.calls)]
+    if not calls:
+        sys.exit("No labelled calls found")
+
+    classified, latencies = [], []
+    for result, label in calls:
+        start = time.perf_counter()
+        classified.append((classify(result), label))
+        latencies.append(time.perf_counter() - start)
+
+    sweep = {}
+    for threshold in args.thresholds:
+        local = [(answer, label) for answer, label in classified
+                 if answer["escalation_required"] == "No" and answer["confidence"] >= threshold]
+        score_diffs = [abs(answer["sentiment_score"] - label["sentiment_score"]) for answer, label in local
+                       if isinstance(label.get("sentiment_score"), (int, float))]
+        sweep[str(threshold)] = {
+            "routed_local": round(len(local) / len(classified), 3),
+            "agreement": {field: round(sum(same(answer[field], label.get(field)) for answer, label in local)
+                                       / max(1, len(local)), 3) for field in FIELDS},
+            "missed_escalations": sum(same(label.get("escalation_required"), "Yes") for _, label in local),
+            "sentiment_score_abs_diff_mean": round(sum(score_diffs) / len(score_diffs), 1) if score_diffs else None,
+        }
+
+    report = {
+        "calls": len(classified),
+        "escalations": sum(same(label.get("escalation_required"), "Yes") for _, label in classified),
+        "classify_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "classify_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "thresholds": sweep,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
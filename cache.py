@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+DEFAULT_TRANSCRIPT_CACHE_BYTES = 512 * 1024 * 1024
+DEFAULT_ANALYSIS_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_audio(source):
+    """SHA-256 of audio content, from bytes/memoryview or a file path"""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, default=float).encode("utf-8"))
+
+
+def _decode(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def normalize_transcript(transcript):
+    """Normalize a transcript for hashing: Unicode NFKC and collapsed whitespace"""
+    return " ".join(unicodedata.normalize("NFKC", transcript).split())
+
+
+def prompt_fingerprint(template):
+    """Short fingerprint of a prompt template, so editing prompt.py changes cache keys"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class _SQLiteCache:
+    """Shared connection, locking and counter handling for the on-disk caches"""
+
+    filename = None
+    schema = ""
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, self.filename)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.schema + """
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _counters(self):
+        return dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+
+
+class TranscriptCache(_SQLiteCache):
+    """Persistent Whisper result cache keyed by audio content and decode settings.
+
+    Entries are evicted least-recently-used once the stored (compressed) size
+    goes over max_bytes. Hit/miss counters are persisted so they cover every
+    process sharing the cache file.
+    """
+
+    filename = "transcripts.sqlite3"
+    schema = """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            key TEXT PRIMARY KEY,
+            result BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transcripts_last_access ON transcripts(last_access);
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_TRANSCRIPT_CACHE_BYTES):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(audio_hash, model_name, options):
+        """Build the cache key from the audio hash, model name and decode options (including language)"""
+        settings = json.dumps({"model": model_name, "options": options}, sort_keys=True)
+        return hashlib.sha256(f"{audio_hash}:{settings}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached Whisper result for key, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump("misses")
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE transcripts SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump("hits")
+            self._conn.commit()
+        return _decode(row[0])
+
+    def put(self, key, result):
+        """Store a Whisper result (text, segments, language) and evict if over budget"""
+        blob = _encode(result)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts(key, result, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM transcripts ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            total -= size
+            self._bump("evictions")
+
+    def stats(self):
+        """Hit/miss/eviction counts and current size"""
+        with self._lock:
+            counters = self._counters()
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts"
+            ).fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+class AnalysisCache(_SQLiteCache):
+    """Persistent Gemini analysis cache.
+
+    Keyed by the normalized transcript hash, the prompt template fingerprint
+    and the Gemini model name, so editing the prompt or switching models
+    misses automatically. Entries older than ttl seconds are treated as
+    misses (ttl=None keeps them forever).
+    """
+
+    filename = "analyses.sqlite3"
+    schema = """
+        CREATE TABLE IF NOT EXISTS analyses (
+            key TEXT PRIMARY KEY,
+            transcript_hash TEXT NOT NULL,
+            prompt_fingerprint TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            analysis BLOB NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_analyses_transcript ON analyses(transcript_hash);
+        CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses(created_at);
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_ANALYSIS_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+
+    @staticmethod
+    def transcript_hash(transcript):
+        return hashlib.sha256(normalize_transcript(transcript).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def make_key(cls, transcript, prompt_template, model_name):
+        """Build the cache key and its parts from transcript, prompt template and model"""
+        parts = (cls.transcript_hash(transcript), prompt_fingerprint(prompt_template), model_name)
+        return hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest(), parts
+
+    def get(self, key):
+        """Return the cached analysis (parsed, raw, format, usage) for key, or None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT analysis, created_at FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and row[1] + self.ttl < time.time():
+                self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                self._bump("expired")
+                row = None
+            if row is None:
+                self._bump("misses")
+                self._conn.commit()
+                return None
+            analysis = _decode(row[0])
+            usage = analysis.get("usage") or {}
+            self._bump("hits")
+            self._bump("tokens_saved", usage.get("prompt_tokens", 0) + usage.get("response_tokens", 0))
+            self._conn.commit()
+        return analysis
+
+    def put(self, key, parts, analysis):
+        """Store an analysis under key; parts is the (transcript_hash, prompt_fingerprint, model_name) tuple"""
+        blob = _encode(analysis)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses"
+                "(key, transcript_hash, prompt_fingerprint, model_name, analysis, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, *parts, blob, time.time()),
+            )
+            self._conn.commit()
+
+    def invalidate(self, transcript=None, model_name=None, prompt_template=None):
+        """Drop cached analyses matching all given filters (no filters clears everything)"""
+        clauses, params = [], []
+        if transcript is not None:
+            clauses.append("transcript_hash = ?")
+            params.append(self.transcript_hash(transcript))
+        if model_name is not None:
+            clauses.append("model_name = ?")
+            params.append(model_name)
+        if prompt_template is not None:
+            clauses.append("prompt_fingerprint = ?")
+            params.append(prompt_fingerprint(prompt_template))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM analyses{where}", params).rowcount
+            self._bump("invalidated", removed)
+            self._conn.commit()
+        return removed
+
+    def purge_expired(self):
+        """Delete all entries older than the TTL"""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM analyses WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self._bump("expired", removed)
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        """Hit/miss counts, cached entry count and token totals saved by hits"""
+        with self._lock:
+            counters = self._counters()
+            entries = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "expired": counters.get("expired", 0),
+            "invalidated": counters.get("invalidated", 0),
+            "tokens_saved": counters.get("tokens_saved", 0),
+            "entries": entries,
+        }
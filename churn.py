@@ -0,0 +1,111 @@
+"""Churn risk per rep for the latest month of their calls, computed with numpy over the calls table.
+
+Each call gets a churn risk from its stored fields: a base rate, plus fixed
+amounts for an unresolved or escalated outcome, an escalation flag, a
+churn-intent issue (the customer talked about cancelling, leaving or
+switching, see churn_intent) and low sentiment, scaled by how far the score
+is below LOW_SENTIMENT. A rep's churn rate is the mean risk of their calls
+in their latest month with calls, raised by TREND_FACTOR when the month's
+average sentiment fell at least TREND_DROP points from the month before.
+
+compute_churn() works on whole columns at once, so rescoring every rep is
+one pass over the calls. CallStore.refresh_churn() feeds it only the calls
+of reps with calls saved since their last scoring and stores the results,
+which the overview reads with the rep rows.
+"""
+import os
+
+import numpy as np
+
+from search import normalize_arabic
+from triage import CANCELLATION
+
+BASE_RISK = 0.02
+UNRESOLVED_RISK = 0.06
+ESCALATION_RISK = 0.05
+CHURN_INTENT_RISK = 0.10
+LOW_SENTIMENT_RISK = 0.08  # at a score of 0, falling linearly to nothing at LOW_SENTIMENT
+LOW_SENTIMENT = 70
+TREND_DROP = 10
+TREND_FACTOR = 1.25
+# Churn rates (%) shown orange, and red and flagged for review, on the Reps Overview
+CHURN_WARN_RATE = 5.0
+CHURN_FLAG_RATE = float(os.getenv("CHURN_FLAG_RATE", 12))
+UNRESOLVED_OUTCOMES = ("unresolved", "escalated")
+
+# Matched in the analysis's key issues and resolution summary (lowercased, Arabic normalized). Only ending the
+# line, account or contract, or moving to another provider: cancelling a bundle or being transferred is routine.
+# The Arabic phrases are triage's CANCELLATION, which it counts as dissatisfaction, so no call is both.
+CHURN_TERMS = ("cancel the line", "cancel my line", "cancel the account", "cancel my account", "cancel the contract",
+               "cancel the subscription", "account cancellation", "line cancellation", "contract cancellation",
+               "terminate the", "terminating the", "termination", "close the account", "close my account",
+               "end the contract", "end my contract", "switch provider", "switching provider", "switch to another",
+               "switching to another", "competitor", "another provider", "another operator", "port out", "porting out",
+               "number porting") + CANCELLATION
+
+
+def churn_intent(analysis):
+    """Whether an analysis mentions the customer cancelling, leaving or switching provider"""
+    analysis = analysis or {}
+    issues = analysis.get("key_issues") or []
+    if isinstance(issues, str):
+        issues = [issues]
+    text = normalize_arabic(" ".join([*map(str, issues), str(analysis.get("resolution_summary") or "")]).lower())
+    return any(term in text for term in CHURN_TERMS)
+
+
+def call_risk(unresolved, escalation, churn_intents, scores):
+    """Per-call churn risk (0-1) from boolean arrays and a float score array (nan when unscored)"""
+    shortfall = np.clip((LOW_SENTIMENT - np.nan_to_num(scores, nan=LOW_SENTIMENT)) / LOW_SENTIMENT, 0.0, 1.0)
+    return (BASE_RISK + UNRESOLVED_RISK * unresolved + ESCALATION_RISK * escalation
+            + CHURN_INTENT_RISK * churn_intents + LOW_SENTIMENT_RISK * shortfall)
+
+
+def compute_churn(rep_ids, call_dates, outcomes, escalation, scores, churn_intents):
+    """{rep_id: (month, churn_rate %, indicators)} from one column per call field.
+
+    call_dates are ISO dates; scores may hold None. Indicators cover the
+    rep's latest month: calls, unresolved, escalation and churn-intent rates,
+    average sentiment and its change from the previous month (None without
+    scored calls in both).
+    """
+    if len(rep_ids) == 0:
+        return {}
+    reps, rep_index = np.unique(np.asarray(rep_ids, dtype=str), return_inverse=True)
+    months = np.asarray(call_dates, dtype="datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    unresolved = np.isin(np.asarray(outcomes, dtype=object), UNRESOLVED_OUTCOMES)
+    escalation = np.asarray(escalation, dtype=bool)
+    churn_intents = np.asarray(churn_intents, dtype=bool)
+    scores = np.asarray(scores, dtype=float)
+    scored = ~np.isnan(scores)
+    risk = call_risk(unresolved, escalation, churn_intents, scores)
+
+    latest = np.full(len(reps), np.iinfo(np.int64).min)
+    np.maximum.at(latest, rep_index, months)
+    current = months == latest[rep_index]
+    previous = months == latest[rep_index] - 1
+
+    def per_rep(values, mask):
+        return np.bincount(rep_index, weights=np.where(mask, values, 0.0), minlength=len(reps))
+
+    calls = per_rep(1.0, current)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sentiment = per_rep(scores, current & scored) / per_rep(1.0, current & scored)
+        trend = sentiment - per_rep(scores, previous & scored) / per_rep(1.0, previous & scored)
+    rates = {name: per_rep(values, current) / calls for name, values in
+             (("risk", risk), ("unresolved", unresolved), ("escalation", escalation), ("churn_intent", churn_intents))}
+    churn_rate = 100 * rates["risk"] * np.where(trend <= -TREND_DROP, TREND_FACTOR, 1.0)
+
+    results = {}
+    for i, rep_id in enumerate(reps):
+        indicators = {
+            "calls": int(calls[i]),
+            "unresolved_rate": round(float(rates["unresolved"][i]), 3),
+            "escalation_rate": round(float(rates["escalation"][i]), 3),
+            "churn_intent_rate": round(float(rates["churn_intent"][i]), 3),
+            "sentiment_avg": None if np.isnan(sentiment[i]) else round(float(sentiment[i]), 1),
+            "sentiment_trend": None if np.isnan(trend[i]) else round(float(trend[i]), 1),
+        }
+        month = str(np.datetime64(int(latest[i]), "M"))
+        results[str(rep_id)] = (month, round(float(churn_rate[i]), 1), indicators)
+    return results
@@ -0,0 +1,184 @@
+"""Fit a Whisper transcript into a token budget before it goes into the analysis prompt.
+
+compact_transcript() works on the result's segments:
+
+1. Segments Whisper itself marks as unreliable are dropped: silence decoded
+   as words (high no_speech_prob with low avg_logprob), very low avg_logprob,
+   and repetition loops (high compression ratio).
+2. Repeated segments and known subtitle-credit hallucinations are dropped,
+   filler words are removed and stutters ("انا انا انا") collapsed.
+3. If the transcript is still over the budget, the least confident middle
+   segments are dropped (marked with "[...]") until it fits.
+
+The opening (where the customer states the problem) and the closing turns
+(which decide final sentiment and escalation) only lose unreliable segments
+and hallucinations; otherwise they reach the prompt verbatim. If the filters
+would leave nothing, the full text (cut to the budget) is used instead. Set
+COMPACT_TRANSCRIPTS=0 to send the full text instead. The call store and
+search index always keep the full text.
+"""
+import os
+import re
+import time
+
+from analysis import estimate_tokens
+from metrics import record
+from search import normalize_arabic
+
+COMPACT_TRANSCRIPTS = os.getenv("COMPACT_TRANSCRIPTS", "1") != "0"
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", 6000))
+# Estimated tokens kept verbatim from the start (about the first minute) and end of the call,
+# at most HEAD_SHARE and TAIL_SHARE of the budget
+HEAD_TOKENS, HEAD_SHARE = 400, 0.25
+TAIL_TOKENS, TAIL_SHARE = 600, 0.35
+
+# whisper.transcribe's thresholds, plus a floor for segments that survived its temperature fallback
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+MIN_AVG_LOGPROB = -1.5
+COMPRESSION_RATIO_THRESHOLD = 2.4
+REPEAT_WINDOW = 3  # a segment equal to one of the last few kept ones is a repeat
+REPEAT_MIN_WORDS = 3  # shorter ones ("نعم") are often real repeated replies
+
+FILLER_WORDS = {"يعني", "اه", "اهه", "ااه", "ام", "امم", "اممم", "مم", "ممم", "هم", "همم", "uh", "um", "uhm", "hmm"}
+# Text Whisper produces from silence, learnt from subtitled videos (normalized)
+HALLUCINATIONS = ("اشتركوا في القناه", "ترجمه نانسي قنقر", "شكرا للمشاهده", "subtitles by", "amara.org")
+OMITTED = "[...]"
+
+_WORD = re.compile(r"\S+")
+_PUNCTUATION = ".,!?؟،؛:…\"'()-"
+
+
+def _unreliable(segment):
+    avg_logprob = segment.get("avg_logprob", 0.0)
+    if segment.get("no_speech_prob", 0.0) > NO_SPEECH_THRESHOLD and avg_logprob < LOGPROB_THRESHOLD:
+        return True
+    return avg_logprob < MIN_AVG_LOGPROB or segment.get("compression_ratio", 0.0) > COMPRESSION_RATIO_THRESHOLD
+
+
+def _key(word):
+    return normalize_arabic(word.strip(_PUNCTUATION))
+
+
+def clean_text(text):
+    """Remove filler words and collapse a word repeated 3+ times in a row to two; returns (text, words removed)"""
+    kept, removed = [], 0
+    for word in _WORD.findall(text):
+        key = _key(word)
+        if key in FILLER_WORDS or (len(kept) >= 2 and key and key == _key(kept[-1]) == _key(kept[-2])):
+            removed += 1
+            continue
+        kept.append(word)
+    return " ".join(kept), removed
+
+
+def _fit_text(text, token_budget, gemini_model):
+    """Head and tail of a transcript without segments, cut to the budget"""
+    tokens = estimate_tokens(gemini_model, text)
+    if tokens <= token_budget:
+        return text
+    chars_per_token = len(text) / max(1, tokens)
+    head = int(token_budget * HEAD_SHARE / (HEAD_SHARE + TAIL_SHARE) * chars_per_token)
+    tail = int(token_budget * chars_per_token) - head
+    return f"{text[:head]} {OMITTED} {text[-tail:]}"
+
+
+def compact_transcript(result, token_budget=None, gemini_model=None):
+    """The transcript text to analyze for a Whisper result, within token_budget (default TRANSCRIPT_TOKEN_BUDGET).
+
+    Returns {'text', 'original_tokens', 'tokens', 'dropped' (segment counts
+    by reason), 'filler_words'}; tokens are estimates (see analysis.estimate_tokens).
+    """
+    token_budget = token_budget or TRANSCRIPT_TOKEN_BUDGET
+    full_text = result.get("text", "").strip()
+    original_tokens = estimate_tokens(gemini_model, full_text)
+    dropped = {"low_confidence": 0, "repeated": 0, "hallucinated": 0, "over_budget": 0}
+    segments = [s for s in result.get("segments", []) if s.get("text", "").strip()]
+    if not segments:
+        text = _fit_text(full_text, token_budget, gemini_model)
+        return {"text": text, "original_tokens": original_tokens, "tokens": estimate_tokens(gemini_model, text),
+                "dropped": dropped, "filler_words": 0}
+
+    reliable = []
+    for segment in segments:
+        if _unreliable(segment):
+            dropped["low_confidence"] += 1
+        else:
+            reliable.append(segment)
+
+    # The protected opening and closing segments
+    costs = [estimate_tokens(gemini_model, s["text"]) for s in reliable]
+    head_tokens = min(HEAD_TOKENS, token_budget * HEAD_SHARE)
+    tail_tokens = min(TAIL_TOKENS, token_budget * TAIL_SHARE)
+    head_end, used = 0, 0
+    while head_end < len(reliable) and (head_end == 0 or used + costs[head_end] <= head_tokens):
+        used += costs[head_end]
+        head_end += 1
+    tail_start, used = len(reliable), 0
+    while tail_start > head_end and (tail_start == len(reliable) or used + costs[tail_start - 1] <= tail_tokens):
+        tail_start -= 1
+        used += costs[tail_start]
+
+    # (text, avg_logprob, protected) per kept segment, in order
+    parts = []
+    recent = []
+    filler_words = 0
+    for i, segment in enumerate(reliable):
+        text = segment["text"].strip()
+        key = " ".join(_key(word) for word in _WORD.findall(text))
+        if any(phrase in key for phrase in HALLUCINATIONS):
+            dropped["hallucinated"] += 1
+            continue
+        if head_end <= i < tail_start:
+            if len(key.split()) >= REPEAT_MIN_WORDS and key in recent:
+                dropped["repeated"] += 1
+                continue
+            recent = (recent + [key])[-REPEAT_WINDOW:]
+            text, removed = clean_text(text)
+            filler_words += removed
+            if not text:
+                continue
+        parts.append([text, segment.get("avg_logprob", 0.0), not head_end <= i < tail_start])
+
+    if not parts:
+        # Nothing passed the filters: analyzing the raw text beats sending Gemini an empty transcript
+        text = _fit_text(full_text, token_budget, gemini_model)
+        return {"text": text, "original_tokens": original_tokens, "tokens": estimate_tokens(gemini_model, text),
+                "dropped": dropped, "filler_words": filler_words}
+
+    def render():
+        out = []
+        for text, _, _ in parts:
+            if text is None:
+                if out and out[-1] == OMITTED:
+                    continue
+                text = OMITTED
+            out.append(text)
+        return " ".join(out)
+
+    # Over budget: drop the least confident middle segments first
+    tokens = estimate_tokens(gemini_model, render())
+    for part in sorted((p for p in parts if not p[2]), key=lambda p: p[1]):
+        if tokens <= token_budget:
+            break
+        tokens -= estimate_tokens(gemini_model, part[0])
+        part[0] = None
+        dropped["over_budget"] += 1
+    text = render()
+    return {"text": text, "original_tokens": original_tokens, "tokens": estimate_tokens(gemini_model, text),
+            "dropped": dropped, "filler_words": filler_words}
+
+
+def prompt_transcript(result, gemini_model=None):
+    """compact_transcript(result), or the full text when COMPACT_TRANSCRIPTS is off; timed as the 'prompt' stage"""
+    start = time.perf_counter()
+    if COMPACT_TRANSCRIPTS:
+        compaction = compact_transcript(result, gemini_model=gemini_model)
+    else:
+        tokens = estimate_tokens(gemini_model, result.get("text", ""))
+        compaction = {"text": result.get("text", ""), "original_tokens": tokens, "tokens": tokens,
+                      "dropped": {"low_confidence": 0, "repeated": 0, "hallucinated": 0, "over_budget": 0},
+                      "filler_words": 0}
+    record("prompt", time.perf_counter() - start, tokens=compaction["tokens"],
+           original_tokens=compaction["original_tokens"])
+    return compaction
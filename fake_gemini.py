@@ -0,0 +1,362 @@
+"""Local stand-in for the Gemini API, for exercising the scheduler and analysis paths offline.
+
+FakeGeminiModel mimics GenerativeModel.generate_content: it sleeps for a
+configurable latency, enforces its own RPM quota, injects 429s and 503s at a
+configurable rate, and returns canned responses with usage_metadata. With
+stream=True the response text arrives in chunks paced by output_token_latency.
+
+FakeGeminiServer serves a FakeGeminiModel over Gemini's REST API on
+localhost, and GeminiHTTPClient is a minimal generate_content client for
+it, so benchmarks include the HTTP round trip. To point the app or src.py
+at it, run `python fake_gemini.py --port 8765` and set
+GEMINI_API_ENDPOINT=http://127.0.0.1:8765.
+"""
+import argparse
+import collections
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "final_customer_sentiment": "Positive",
+    "sentiment_score": 82,
+    "resolution_summary": "The agent applied a credit and the customer accepted it.",
+    "key_issues": ["Billing discrepancy", "Unexpected roaming charge"],
+    "escalation_required": "No",
+    "outcome": "resolved",
+}
+
+# The response shapes Gemini has been seen to return for CALL_ANALYSIS_PROMPT
+RESPONSE_FORMATS = {
+    "json": lambda a: json.dumps(a, ensure_ascii=False, indent=2),
+    "fenced": lambda a: "```json\n" + json.dumps(a, ensure_ascii=False, indent=2) + "\n```",
+    "text": lambda a: "\n".join([
+        f"Final Customer Sentiment: {a['final_customer_sentiment']}",
+        f"Resolution Summary: {a['resolution_summary']}",
+        "Key Issues Mentioned:",
+        *[f"[{issue}]" for issue in a["key_issues"]],
+        f"Escalation Required: {a['escalation_required']}",
+    ]),
+}
+
+
+class FakeAPIError(Exception):
+    """Error carrying an HTTP-style code, like google.api_core exceptions"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, response_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_tokens, count_tokens(text))
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Iterable of FakeChunks; text and usage_metadata are complete once it has been consumed"""
+
+    def __init__(self, text, prompt_tokens, chunk_chars, token_latency, on_done):
+        self._text = text
+        self._prompt_tokens = prompt_tokens
+        self._chunk_chars = chunk_chars
+        self._token_latency = token_latency
+        self._on_done = on_done
+        self.text = ""
+        self.usage_metadata = FakeUsage(prompt_tokens, 0)
+
+    def __iter__(self):
+        for start in range(0, len(self._text), self._chunk_chars):
+            piece = self._text[start:start + self._chunk_chars]
+            time.sleep(self._token_latency * count_tokens(piece))
+            self.text += piece
+            yield FakeChunk(piece)
+        self.usage_metadata = FakeUsage(self._prompt_tokens, count_tokens(self._text))
+        self._on_done()
+
+
+def count_tokens(text):
+    """Rough token count, about what Gemini reports for mixed Arabic/English text"""
+    return max(1, len(text) // 4)
+
+
+class FakeGeminiModel:
+    """In-process fake of GenerativeModel with latency, quota and error injection"""
+
+    def __init__(self, model_name="gemini-1.5-flash-latest", latency=(0.2, 0.6), rpm_limit=None,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_delay=1.0, formats=("fenced",), analysis=None,
+                 output_token_latency=0.0, batch_drop_rate=0.0, stream_chunk_chars=40, ignore_json_mode=False,
+                 seed=None):
+        self.model_name = f"models/{model_name}"
+        self.latency = latency
+        self.rpm_limit = rpm_limit
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_delay = retry_delay
+        self.formats = formats
+        self.analysis = analysis or CANNED_ANALYSIS
+        self.output_token_latency = output_token_latency
+        self.batch_drop_rate = batch_drop_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self.ignore_json_mode = ignore_json_mode
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = collections.deque()
+        self.calls = collections.Counter()
+
+    def _check_quota(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] < now - 60:
+                self._recent.popleft()
+            if self.rpm_limit is not None and len(self._recent) >= self.rpm_limit:
+                wait = 60 - (now - self._recent[0])
+                self.calls["rate_limited"] += 1
+                raise FakeAPIError(429, f"Resource has been exhausted (e.g. check quota). Please retry in {wait:.1f}s")
+            self._recent.append(now)
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self.calls["rate_limited"] += 1
+            raise FakeAPIError(429, f"Resource has been exhausted. retry_delay {{ seconds: {int(self.retry_delay)} }}")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.calls["errors"] += 1
+            raise FakeAPIError(503, "The service is currently unavailable.")
+
+    def respond(self, prompt, json_mode=False):
+        """Response text for a prompt; override for prompt-dependent behaviour.
+
+        Batched prompts (BATCH_CALL_ANALYSIS_PROMPT) get a JSON array with one
+        object per call id, minus any dropped at batch_drop_rate. In JSON
+        response mode the body is bare JSON, unless ignore_json_mode is set
+        (like models that ignore response_mime_type).
+        """
+        call_ids = re.findall(r"^### Call id: (.+)$", prompt, re.MULTILINE)
+        if call_ids:
+            answers = [dict(self.analysis, call_id=call_id) for call_id in call_ids
+                       if self._random.random() >= self.batch_drop_rate]
+            body = json.dumps(answers, ensure_ascii=False, indent=2)
+            return body if json_mode else "```json\n" + body + "\n```"
+        fmt = "json" if json_mode and not self.ignore_json_mode else self._random.choice(self.formats)
+        return RESPONSE_FORMATS[fmt](self.analysis)
+
+    def _succeeded(self):
+        with self._lock:
+            self.calls["succeeded"] += 1
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        with self._lock:
+            self.calls["requests"] += 1
+        self._check_quota()
+        json_mode = (generation_config or {}).get("response_mime_type") == "application/json"
+        text = self.respond(prompt, json_mode=json_mode)
+        if stream:
+            time.sleep(self._random.uniform(*self.latency))
+            return FakeStreamResponse(text, count_tokens(prompt), self.stream_chunk_chars, self.output_token_latency,
+                                      self._succeeded)
+        time.sleep(self._random.uniform(*self.latency) + self.output_token_latency * count_tokens(text))
+        self._succeeded()
+        return FakeResponse(text, count_tokens(prompt))
+
+
+_ENDPOINT = re.compile(r"^/v1(?:beta)?/models/([^:/]+):(generateContent|streamGenerateContent)$")
+_STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+
+def _response_body(text, usage):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}],
+        "usageMetadata": {"promptTokenCount": usage.prompt_token_count,
+                          "candidatesTokenCount": usage.candidates_token_count,
+                          "totalTokenCount": usage.total_token_count},
+    }
+
+
+class FakeGeminiServer:
+    """A FakeGeminiModel behind Gemini's generateContent / streamGenerateContent REST endpoints.
+
+    Errors the model injects come back as HTTP errors with Gemini's error
+    body. Streaming answers with server-sent events for ?alt=sse and with a
+    JSON array otherwise, as the REST client libraries expect.
+    """
+
+    def __init__(self, model=None, host="127.0.0.1", port=0):
+        self.model = model or FakeGeminiModel()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                path, _, query = self.path.partition("?")
+                match = _ENDPOINT.match(path)
+                if not match:
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "".join(part.get("text", "") for content in request.get("contents", [])
+                                 for part in content.get("parts", []))
+                config = request.get("generationConfig") or request.get("generation_config") or {}
+                mime_type = config.get("responseMimeType") or config.get("response_mime_type")
+                stream = match.group(2) == "streamGenerateContent"
+                try:
+                    response = server.model.generate_content(
+                        prompt, generation_config={"response_mime_type": mime_type}, stream=stream)
+                except FakeAPIError as e:
+                    self._send_json(e.code, {"error": {"code": e.code, "message": str(e),
+                                                       "status": _STATUS.get(e.code, "UNKNOWN")}})
+                    return
+                if not stream:
+                    self._send_json(200, _response_body(response.text, response.usage_metadata))
+                    return
+                sse = "alt=sse" in query
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+                self.end_headers()  # no Content-Length: the body ends when the connection closes
+                if not sse:
+                    self.wfile.write(b"[")
+                # Usage is only final once the text is, so it goes in a last, empty chunk
+                for i, text in enumerate(itertools.chain((chunk.text for chunk in response), [""])):
+                    body = json.dumps(_response_body(text, response.usage_metadata), ensure_ascii=False)
+                    self.wfile.write((f"data: {body}\r\n\r\n" if sse else ("," if i else "") + body).encode("utf-8"))
+                    self.wfile.flush()
+                if not sse:
+                    self.wfile.write(b"]")
+
+            def _send_json(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="fake gemini server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class HTTPResponse:
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = FakeUsage(usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
+
+
+class HTTPStreamResponse:
+    """Iterable of chunks read from a server-sent event stream; usage_metadata is final once consumed"""
+
+    def __init__(self, response):
+        self._response = response
+        self.text = ""
+        self.usage_metadata = FakeUsage(0, 0)
+
+    def __iter__(self):
+        with self._response:
+            for line in self._response:
+                if not line.startswith(b"data:"):
+                    continue
+                body = json.loads(line[5:])
+                usage = body.get("usageMetadata", {})
+                self.usage_metadata = FakeUsage(usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
+                piece = "".join(part.get("text", "") for candidate in body.get("candidates", [])
+                                for part in candidate.get("content", {}).get("parts", []))
+                self.text += piece
+                yield FakeChunk(piece)
+
+
+class GeminiHTTPClient:
+    """generate_content over Gemini's REST API with urllib, e.g. against FakeGeminiServer.
+
+    HTTP errors are raised as FakeAPIError with the status code, so
+    GeminiScheduler retries them like the SDK's exceptions.
+    """
+
+    def __init__(self, base_url, model_name="gemini-1.5-flash-latest", api_key="offline", timeout=120):
+        self.base_url = base_url.rstrip("/")
+        self.model_name = f"models/{model_name}"
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        method = "streamGenerateContent?alt=sse" if stream else "generateContent"
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        mime_type = (generation_config or {}).get("response_mime_type")
+        if mime_type:
+            body["generationConfig"] = {"responseMimeType": mime_type}
+        request = urllib.request.Request(
+            f"{self.base_url}/v1beta/{self.model_name}:{method}", data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key}, method="POST")
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())["error"]["message"]
+            except (ValueError, KeyError):
+                message = str(e)
+            raise FakeAPIError(e.code, message) from None
+        if stream:
+            return HTTPStreamResponse(response)
+        with response:
+            answer = json.loads(response.read())
+        text = "".join(part.get("text", "") for candidate in answer.get("candidates", [])
+                       for part in candidate.get("content", {}).get("parts", []))
+        return HTTPResponse(text, answer.get("usageMetadata", {}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini API on localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.2, 0.6], help="Response latency range in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--formats", nargs="+", default=["json"], choices=RESPONSE_FORMATS,
+                        help="Response formats to pick from; other than json, JSON mode requests are ignored")
+    args = parser.parse_args()
+
+    model = FakeGeminiModel(latency=tuple(args.latency), error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, formats=args.formats,
+                            ignore_json_mode=args.formats != ["json"])
+    server = FakeGeminiServer(model, port=args.port)
+    print(f"Fake Gemini API at {server.url} (set GEMINI_API_ENDPOINT={server.url})")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
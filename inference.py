@@ -0,0 +1,258 @@
+"""Local transcription server: one thread owns the Whisper model and serves every session.
+
+Sessions submit() recordings and poll the returned job for queue position
+and progress. Each job is cut at silences into windows of at most 30 s
+(Whisper's input size). The worker runs at most one job per session, starts
+queued jobs from the least recently served session first, and fills each
+batch round-robin across the running jobs, so a long upload cannot starve a
+short one and windows from different uploads share one batched
+encoder/decoder pass.
+
+Unlike whisper's transcribe(), windows are decoded independently (no
+previous-text conditioning) and each becomes one segment spanning its window.
+"""
+import collections
+import dataclasses
+import itertools
+import os
+import threading
+import time
+
+from audio import SAMPLE_RATE, split_on_silence
+from transcription import merge_results
+
+WINDOW_SECONDS = 30.0
+BATCH_WINDOWS = int(os.getenv("TRANSCRIBE_BATCH_WINDOWS", 8))
+QUEUE_SIZE = int(os.getenv("TRANSCRIBE_QUEUE_SIZE", 16))
+BATCH_WAIT_SECONDS = float(os.getenv("TRANSCRIBE_BATCH_WAIT", 0.05))
+
+# whisper.transcribe's defaults for retrying a window at higher temperature
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class QueueFull(Exception):
+    """The server already holds its maximum number of unfinished jobs"""
+
+
+class TranscriptionJob:
+    """One submitted recording; poll progress/state, wait(), then read result or error"""
+
+    def __init__(self, session_id, audio, options):
+        self.session_id = session_id
+        self.options = options
+        chunks = split_on_silence(audio, SAMPLE_RATE, target_seconds=WINDOW_SECONDS - 5, max_seconds=WINDOW_SECONDS)
+        self.windows = [audio[start:end] for start, end in chunks if end > start]
+        self.offsets = [start / SAMPLE_RATE for start, end in chunks if end > start]
+        self.window_results = [None] * len(self.windows)
+        self.next_window = 0
+        self.windows_done = 0
+        self.state = "queued"
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._finished = threading.Event()
+
+    @property
+    def progress(self):
+        return self.windows_done / len(self.windows) if self.windows else 1.0
+
+    def wait(self, timeout=None):
+        """True once the job is done or failed"""
+        return self._finished.wait(timeout)
+
+    def _finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.state = "failed" if error else "done"
+        self.finished_at = time.perf_counter()
+        self._finished.set()
+
+
+def _needs_fallback(result):
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return False  # silence: retrying will not help
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def _window_result(result, seconds):
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return {"text": "", "segments": [], "language": result.language}
+    segment = {
+        "id": 0, "seek": 0, "start": 0.0, "end": round(seconds, 2), "text": result.text, "tokens": result.tokens,
+        "temperature": result.temperature, "avg_logprob": result.avg_logprob,
+        "compression_ratio": result.compression_ratio, "no_speech_prob": result.no_speech_prob,
+    }
+    return {"text": result.text, "segments": [segment], "language": result.language}
+
+
+def decode_windows(model, windows, options):
+    """Transcribe up to 30 s sample arrays in one batched pass, returning a transcribe()-style dict per window.
+
+    options are whisper.transcribe options: 'temperature' may be a float or a
+    fallback tuple, DecodingOptions fields are passed on, the rest is ignored.
+    """
+    import torch
+    import whisper
+
+    temperatures = options.get("temperature", TEMPERATURES)
+    if isinstance(temperatures, (int, float)):
+        temperatures = (temperatures,)
+    fields = {field.name for field in dataclasses.fields(whisper.DecodingOptions)} - {"temperature", "without_timestamps"}
+    decode_options = {key: value for key, value in options.items() if key in fields}
+    decode_options.setdefault("fp16", model.device.type == "cuda")
+
+    mel = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(window), model.dims.n_mels) for window in windows
+    ]).to(model.device)
+    results = whisper.decode(
+        model, mel, whisper.DecodingOptions(temperature=temperatures[0], without_timestamps=True, **decode_options)
+    )
+    # Only the windows that look wrong are retried, one at a time
+    for i, result in enumerate(results):
+        for temperature in temperatures[1:]:
+            if not _needs_fallback(result):
+                break
+            result = whisper.decode(
+                model, mel[i], whisper.DecodingOptions(temperature=temperature, without_timestamps=True, **decode_options)
+            )
+        results[i] = result
+    return [_window_result(result, len(window) / SAMPLE_RATE) for result, window in zip(results, windows)]
+
+
+class TranscriptionServer:
+    """Queue and batch transcriptions for one Whisper model owned by a worker thread.
+
+    load_model is called on the worker thread the first time there is work.
+    """
+
+    def __init__(self, load_model, batch_windows=BATCH_WINDOWS, queue_size=QUEUE_SIZE,
+                 batch_wait=BATCH_WAIT_SECONDS, decode=decode_windows):
+        self.batch_windows = batch_windows
+        self.queue_size = queue_size
+        self.batch_wait = batch_wait
+        self._load_model = load_model
+        self._decode = decode
+        self._cond = threading.Condition()
+        self._queued = []  # submission order
+        self._running = []  # at most one job per session, at most batch_windows jobs
+        self._last_served = {}  # session_id -> sequence number of its last started job
+        self._started = itertools.count()
+        self.batches_decoded = 0
+        self.windows_decoded = 0
+        self._thread = threading.Thread(target=self._run, name="transcription server", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_id, audio, options):
+        """Queue a recording (16 kHz float32 samples) and return its TranscriptionJob"""
+        job = TranscriptionJob(session_id, audio, options)
+        if not job.windows:
+            job._finish({"text": "", "segments": [], "language": None})
+            return job
+        with self._cond:
+            if len(self._queued) + len(self._running) >= self.queue_size:
+                raise QueueFull(f"{self.queue_size} transcriptions are already waiting, please try again shortly")
+            self._queued.append(job)
+            self._cond.notify()
+        return job
+
+    def position(self, job):
+        """How many queued jobs will start before job (0 once it is running)"""
+        with self._cond:
+            if job not in self._queued:
+                return 0
+            return self._start_order().index(job)
+
+    def _start_order(self):
+        # Sessions that were served least recently go first; a session's jobs stay in order
+        running = {j.session_id for j in self._running}
+        ahead = {}
+        for job in self._queued:
+            ahead.setdefault(job.session_id, []).append(job)
+        order = []
+        while ahead:
+            for session_id in sorted(ahead, key=lambda s: (s in running, self._last_served.get(s, -1))):
+                order.append(ahead[session_id].pop(0))
+                if not ahead[session_id]:
+                    del ahead[session_id]
+        return order
+
+    def _start_jobs(self):
+        busy = {job.session_id for job in self._running}
+        for job in self._start_order():
+            if len(self._running) >= self.batch_windows:
+                break
+            if job.session_id in busy:
+                continue
+            self._queued.remove(job)
+            self._running.append(job)
+            busy.add(job.session_id)
+            self._last_served[job.session_id] = next(self._started)
+            job.state, job.started_at = "running", time.perf_counter()
+
+    def _next_batch(self):
+        # One window per running job per round, until the batch is full
+        batch = []
+        while len(batch) < self.batch_windows:
+            added = False
+            for job in self._running:
+                if job.next_window < len(job.windows) and len(batch) < self.batch_windows:
+                    batch.append((job, job.next_window))
+                    job.next_window += 1
+                    added = True
+            if not added:
+                break
+        # Rotate so the next batch starts with a different job
+        if self._running:
+            self._running.append(self._running.pop(0))
+        return batch
+
+    def _run(self):
+        model = None
+        while True:
+            with self._cond:
+                while not self._queued and not self._running:
+                    self._cond.wait()
+                self._start_jobs()
+                waiting = sum(len(job.windows) - job.next_window for job in self._running)
+                if waiting < self.batch_windows and self.batch_wait:
+                    # Give other sessions a moment to join this batch
+                    self._cond.wait(self.batch_wait)
+                    self._start_jobs()
+                batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                if model is None:
+                    model = self._load_model()
+                windows = [job.windows[i] for job, i in batch]
+                # Jobs in one batch may use different options; group them
+                by_options = collections.defaultdict(list)
+                for n, (job, i) in enumerate(batch):
+                    by_options[repr(sorted(job.options.items()))].append(n)
+                results = [None] * len(batch)
+                for indexes in by_options.values():
+                    options = batch[indexes[0]][0].options
+                    for n, result in zip(indexes, self._decode(model, [windows[n] for n in indexes], options)):
+                        results[n] = result
+                error = None
+            except Exception as e:
+                error = e
+            with self._cond:
+                self.batches_decoded += 1
+                self.windows_decoded += len(batch)
+                for n, (job, i) in enumerate(batch):
+                    if job.state != "running":
+                        continue
+                    if error is not None:
+                        self._running.remove(job)
+                        job._finish(error=error)
+                        continue
+                    job.window_results[i] = results[n]
+                    job.windows_done += 1
+                    if job.windows_done == len(job.windows):
+                        self._running.remove(job)
+                        job._finish(merge_results(job.window_results, job.offsets))
@@ -0,0 +1,245 @@
+"""Durable queue of upload jobs in SQLite (WAL), shared by the app and worker.py processes.
+
+The app saves the uploaded audio under UPLOAD_DIR, inserts a queued job and
+returns at once; the page then polls the job row. Workers claim the oldest
+ready job in a single write transaction, report progress and streamed
+analysis fields on the row while they work (which doubles as a heartbeat),
+and store the result. A failed attempt is retried after an exponential
+backoff up to max_attempts; a job whose worker stops heartbeating for
+LEASE_SECONDS (crash, kill) is handed to another worker. Each claim is a
+lease on one attempt: heartbeats, results and failures from a worker whose
+lease was taken over are ignored, and heartbeat() tells it to stop.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join("data", "jobs.sqlite3"))
+UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join("data", "uploads"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY", 5))
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+WORKER_TIMEOUT_SECONDS = 15
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed
+    filename TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    audio_hash TEXT NOT NULL,
+    rep_id TEXT,
+    refresh INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    progress TEXT,
+    partial TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    state TEXT,
+    seen_at REAL NOT NULL
+);
+"""
+
+
+class LeaseLost(Exception):
+    """The job was handed to another worker (or finished) since this worker claimed it"""
+
+
+class JobQueue:
+    """Upload jobs and worker heartbeats; safe to share between threads and processes"""
+
+    def __init__(self, path=None, upload_dir=None):
+        path = path or DEFAULT_JOB_QUEUE_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.upload_dir = upload_dir or UPLOAD_DIR
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for column in ("partial", "result"):
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def submit(self, data, filename, audio_hash, rep_id=None, refresh=False, owner=None, max_attempts=MAX_ATTEMPTS):
+        """Save the upload and queue it; returns the job id"""
+        # One file per job, deleted when the job finishes
+        audio_path = os.path.join(self.upload_dir, f"{audio_hash}-{time.time_ns()}{os.path.splitext(filename)[1].lower()}")
+        with open(audio_path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(audio_path + ".tmp", audio_path)
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO jobs(filename, audio_path, audio_hash, rep_id, refresh, owner, max_attempts, "
+                "available_at, created_at, progress) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'Queued')",
+                (filename, audio_path, audio_hash, rep_id, int(refresh), owner, max_attempts, now, now),
+            ).lastrowid
+
+    def claim(self, worker, lease=LEASE_SECONDS):
+        """Take the oldest ready job for worker and mark it running, or return None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died: retry them, or give up once out of attempts
+                expired = self._conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                    "error = 'Worker ' || worker || ' stopped responding', "
+                    "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+                    "WHERE status = 'running' AND heartbeat_at < ? RETURNING status, audio_path",
+                    (now, now - lease),
+                ).fetchall()
+                row = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, started_at = ?, "
+                    "heartbeat_at = ?, progress = 'Starting', partial = NULL "
+                    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                    "ORDER BY id LIMIT 1) RETURNING *",
+                    (worker, now, now, now),
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        for status, audio_path in expired:
+            if status == "failed":
+                self._remove_file(audio_path)
+        return self._job(row)
+
+    # Matches a job only while the claim that returned it is still its current lease
+    _LEASE_SQL = "id = ? AND status = 'running' AND worker = ? AND attempts = ?"
+
+    @staticmethod
+    def _lease(job):
+        return job["id"], job["worker"], job["attempts"]
+
+    def heartbeat(self, job, progress=None, partial=None):
+        """Record that a claimed job is alive, optionally with a progress message and streamed fields.
+
+        Raises LeaseLost when the job has been handed to another worker.
+        """
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, progress = COALESCE(?, progress), "
+                f"partial = COALESCE(?, partial) WHERE {self._LEASE_SQL}",
+                (time.time(), progress, json.dumps(partial, ensure_ascii=False) if partial is not None else None,
+                 *self._lease(job)),
+            ).rowcount
+        if not updated:
+            raise LeaseLost(f"Job {job['id']} attempt {job['attempts']} is no longer leased to {job['worker']}")
+
+    def complete(self, job, result):
+        """Store a claimed job's result; returns False (changing nothing) if the lease was lost"""
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished_at = ?, progress = 'Done', error = NULL "
+                f"WHERE {self._LEASE_SQL}",
+                (json.dumps(result, ensure_ascii=False), time.time(), *self._lease(job)),
+            ).rowcount
+        if updated:
+            self._remove_file(job["audio_path"])
+        return bool(updated)
+
+    def fail(self, job, error, retry=True):
+        """Record a failed attempt; the job is queued again after a backoff unless out of attempts.
+
+        Returns False (changing nothing) if the lease was lost.
+        """
+        now = time.time()
+        with self._lock:
+            if retry and job["attempts"] < job["max_attempts"]:
+                delay = RETRY_DELAY_SECONDS * 2 ** (job["attempts"] - 1)
+                return bool(self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', available_at = ?, error = ?, "
+                    f"progress = ? WHERE {self._LEASE_SQL}",
+                    (now + delay, error, f"Retrying in {delay:.0f}s after: {error}", *self._lease(job)),
+                ).rowcount)
+            updated = self._conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, progress = 'Failed' WHERE {self._LEASE_SQL}",
+                (error, now, *self._lease(job)),
+            ).rowcount
+        if updated:
+            self._remove_file(job["audio_path"])
+        return bool(updated)
+
+    @staticmethod
+    def _remove_file(audio_path):
+        # One upload per job, so nothing else can be reading it once the job is finished
+        try:
+            os.remove(audio_path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, job_id):
+        with self._lock:
+            return self._job(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def recent(self, limit=20, owner=None):
+        """Newest jobs first (all owners unless owner is given), without their results"""
+        where, params = ("WHERE owner = ?", [owner]) if owner else ("", [])
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, filename, rep_id, attempts, created_at, finished_at, progress, error "
+                f"FROM jobs {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def position(self, job_id):
+        """Number of queued jobs that will be picked up before job_id"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id < ?", (job_id,)
+            ).fetchone()[0]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def worker_seen(self, name, state=None):
+        """Worker heartbeat, shown in the app's sidebar"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers(name, pid, state, seen_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET pid = excluded.pid, state = excluded.state, seen_at = excluded.seen_at",
+                (name, os.getpid(), state, time.time()),
+            )
+
+    def live_workers(self, timeout=WORKER_TIMEOUT_SECONDS):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, pid, state, seen_at FROM workers WHERE seen_at >= ? ORDER BY name",
+                (time.time() - timeout,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,246 @@
+"""Per-stage timings, cache hits and token usage, written as JSON lines and exported for Prometheus.
+
+Usage:
+    python metrics.py --since-minutes 60
+    python metrics.py --prometheus /var/lib/node_exporter/textfile/callcenter.prom
+    python metrics.py --serve 9108
+
+Every process (the app, its job workers, src.py, batch.py) appends one
+event per stage it runs to METRICS_PATH (default data/metrics.jsonl), rotated at
+METRICS_MAX_BYTES with METRICS_BACKUPS old files kept. The stages are
+upload (buffering and saving the upload), decode, transcribe (with audio
+seconds and real-time factor; in job workers the time queued behind other
+jobs for the transcription server is left out and recorded as
+queue_wait_s), prompt (compaction and prompt build),
+gemini (the round trip, with token usage) and parse (which response
+format it took: bare JSON, JSON in a markdown fence, the text format or
+nothing). Transcribe and gemini events with cached=true are cache hits and
+are left out of the latency percentiles. summarize() rolls events up; the
+app's Admin page shows it, and --prometheus / --serve export it in the
+Prometheus text format. Set METRICS=0 to write nothing.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS = os.getenv("METRICS", "1") != "0"
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join("data", "metrics.jsonl"))
+METRICS_MAX_BYTES = int(os.getenv("METRICS_MAX_BYTES", 20 * 1024 * 1024))
+METRICS_BACKUPS = int(os.getenv("METRICS_BACKUPS", 3))
+STAGES = ("upload", "decode", "transcribe", "prompt", "gemini", "parse")
+CACHED_STAGES = {"transcribe": "transcript", "gemini": "analysis"}
+PROMETHEUS_PREFIX = "callcenter"
+
+_lock = threading.Lock()
+_source = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+_write_failed = False
+
+
+def set_source(name):
+    """Name this process's events (e.g. 'app', 'worker'); defaults to the script name"""
+    global _source
+    _source = name
+
+
+def percentile(values, q):
+    """Nearest-rank q-th percentile of values (0.0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _rotate(path):
+    for i in range(METRICS_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def record(stage, seconds, **fields):
+    """Append one stage event; failures to write are reported once and never raised"""
+    global _write_failed
+    if not METRICS:
+        return
+    event = dict(ts=round(time.time(), 3), source=_source, pid=os.getpid(), stage=stage,
+                 seconds=round(seconds, 4), **fields)
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(METRICS_PATH) or ".", exist_ok=True)
+            try:
+                if os.path.getsize(METRICS_PATH) >= METRICS_MAX_BYTES:
+                    _rotate(METRICS_PATH)
+            except FileNotFoundError:
+                pass  # not written yet, or another process just rotated it
+            # One short append per event, so lines from concurrent processes do not interleave
+            with open(METRICS_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            if not _write_failed:
+                print(f"Could not write metrics to {METRICS_PATH}: {e}")
+                _write_failed = True
+
+
+@contextmanager
+def timed(stage, **fields):
+    """Time the with-block as a stage event; the yielded dict takes fields known only at the end"""
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, **fields)
+
+
+def load_events(since=None, path=None):
+    """Events from the current and rotated files, oldest first, optionally only those after the since timestamp"""
+    path = path or METRICS_PATH
+    events = []
+    for name in [f"{path}.{i}" for i in range(METRICS_BACKUPS, 0, -1)] + [path]:
+        try:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by a crash
+                    if since is None or event.get("ts", 0) >= since:
+                        events.append(event)
+        except FileNotFoundError:
+            continue
+    return events
+
+
+def summarize(events):
+    """Latency percentiles per stage, cache hit counts, token totals, parse formats and transcription RTF"""
+    latencies = {}
+    caches = {cache: {"hits": 0, "misses": 0} for cache in CACHED_STAGES.values()}
+    tokens = {"prompt": 0, "response": 0}
+    parse_formats = {}
+    errors = {}
+    rtfs = []
+    queue_waits = []
+    for event in events:
+        stage = event.get("stage")
+        if stage in CACHED_STAGES:
+            caches[CACHED_STAGES[stage]]["hits" if event.get("cached") else "misses"] += 1
+        if event.get("error"):
+            errors[stage] = errors.get(stage, 0) + 1
+        if event.get("cached"):
+            continue
+        latencies.setdefault(stage, []).append(event.get("seconds", 0.0))
+        if stage == "gemini":
+            tokens["prompt"] += event.get("prompt_tokens") or 0
+            tokens["response"] += event.get("response_tokens") or 0
+        elif stage == "parse":
+            fmt = event.get("format") or "failed"
+            parse_formats[fmt] = parse_formats.get(fmt, 0) + 1
+        elif stage == "transcribe":
+            if event.get("rtf") is not None:
+                rtfs.append(event["rtf"])
+            if event.get("queue_wait_s") is not None:
+                queue_waits.append(event["queue_wait_s"])
+
+    stages = {}
+    for stage in sorted(latencies, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+        values = latencies[stage]
+        stages[stage] = {
+            "count": len(values),
+            "p50_s": round(percentile(values, 50), 3),
+            "p95_s": round(percentile(values, 95), 3),
+            "total_s": round(sum(values), 3),
+            "errors": errors.get(stage, 0),
+        }
+    return {
+        "events": len(events),
+        "stages": stages,
+        "caches": caches,
+        "tokens": tokens,
+        "parse_formats": parse_formats,
+        "transcribe_rtf_p50": round(percentile(rtfs, 50), 3) if rtfs else None,
+        "transcribe_queue_wait_p95_s": round(percentile(queue_waits, 95), 3) if queue_waits else None,
+    }
+
+
+def prometheus_text(summary):
+    """A summary in the Prometheus text exposition format"""
+    p = PROMETHEUS_PREFIX
+    lines = [f"# HELP {p}_stage_seconds Time spent per pipeline stage (cache hits excluded)",
+             f"# TYPE {p}_stage_seconds summary"]
+    for stage, row in summary["stages"].items():
+        lines += [f'{p}_stage_seconds{{stage="{stage}",quantile="0.5"}} {row["p50_s"]}',
+                  f'{p}_stage_seconds{{stage="{stage}",quantile="0.95"}} {row["p95_s"]}',
+                  f'{p}_stage_seconds_sum{{stage="{stage}"}} {row["total_s"]}',
+                  f'{p}_stage_seconds_count{{stage="{stage}"}} {row["count"]}']
+    lines += [f"# HELP {p}_stage_errors Stage runs that raised", f"# TYPE {p}_stage_errors gauge"]
+    lines += [f'{p}_stage_errors{{stage="{stage}"}} {row["errors"]}' for stage, row in summary["stages"].items()]
+    lines += [f"# HELP {p}_cache_lookups Cache lookups by result", f"# TYPE {p}_cache_lookups gauge"]
+    for cache, counts in summary["caches"].items():
+        lines += [f'{p}_cache_lookups{{cache="{cache}",result="{result}"}} {counts[result]}' for result in ("hits", "misses")]
+    lines += [f"# HELP {p}_gemini_tokens Gemini tokens used", f"# TYPE {p}_gemini_tokens gauge"]
+    lines += [f'{p}_gemini_tokens{{kind="{kind}"}} {count}' for kind, count in summary["tokens"].items()]
+    lines += [f"# HELP {p}_analysis_parse Analyses by response format", f"# TYPE {p}_analysis_parse gauge"]
+    lines += [f'{p}_analysis_parse{{format="{fmt}"}} {count}' for fmt, count in summary["parse_formats"].items()]
+    if summary["transcribe_rtf_p50"] is not None:
+        lines += [f"# HELP {p}_transcribe_rtf_median Transcription seconds per audio second",
+                  f"# TYPE {p}_transcribe_rtf_median gauge", f"{p}_transcribe_rtf_median {summary['transcribe_rtf_p50']}"]
+    if summary.get("transcribe_queue_wait_p95_s") is not None:
+        lines += [f"# HELP {p}_transcribe_queue_wait_p95_seconds Time jobs waited for the transcription server",
+                  f"# TYPE {p}_transcribe_queue_wait_p95_seconds gauge",
+                  f"{p}_transcribe_queue_wait_p95_seconds {summary['transcribe_queue_wait_p95_s']}"]
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, since_minutes=None):
+    """Serve prometheus_text() for the retained events at /metrics"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            since = time.time() - since_minutes * 60 if since_minutes else None
+            body = prometheus_text(summarize(load_events(since))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Serving metrics from {METRICS_PATH} at http://0.0.0.0:{port}/metrics")
+    ThreadingHTTPServer(("", port), Handler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--since-minutes", type=float, help="Only events from the last N minutes (default: all retained)")
+    parser.add_argument("--prometheus", help="Write the Prometheus text format to this file instead of printing JSON")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Serve the Prometheus text format at /metrics")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.since_minutes)
+        return
+    summary = summarize(load_events(time.time() - args.since_minutes * 60 if args.since_minutes else None))
+    if args.prometheus:
+        # Written whole and renamed, so a scraper never reads half a file
+        with open(args.prometheus + ".tmp", "w", encoding="utf-8") as f:
+            f.write(prometheus_text(summary))
+        os.replace(args.prometheus + ".tmp", args.prometheus)
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
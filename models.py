@@ -0,0 +1,171 @@
+"""Lazily loaded Whisper and Gemini models with optional background warm-up.
+
+Nothing heavy is imported until a model is first needed: `whisper` (and
+torch with it) and `google.generativeai` are imported inside the loaders, so
+pages that only read the call store start without them. Set MODEL_WARMUP=0
+to skip the startup warm-up thread and load on the first transcription.
+
+Whisper weights can be converted once into a float32 checkpoint that is
+memory-mapped instead of read (python3 models.py turbo). Every process that
+loads it - app servers, transcription workers, src.py - then shares one copy
+of the weights in the OS page cache. This is a CPU-only saving: on a CUDA
+host each process copies the weights into GPU memory anyway, so the
+checkpoint is not used there.
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") != "0"
+WHISPER_MMAP_DIR = os.getenv("WHISPER_MMAP_DIR", os.path.join("data", "whisper"))
+# e.g. http://127.0.0.1:8765 to use `python3 fake_gemini.py` instead of the real API
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+
+class LazyModel:
+    """A model loaded on first get(), at most once, from any thread"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._model = None
+        self.state = "not loaded"
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def get(self):
+        """Return the model, loading it (or waiting for a warm-up in progress) if needed"""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    model = self._loader()
+                except Exception as e:
+                    # Not cached: the next get() tries again
+                    self.state, self.error = "failed", e
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self._model, self.state, self.error = model, "ready", None
+        return self._model
+
+    def warm_up(self):
+        """Start loading in a daemon thread and return immediately"""
+        thread = threading.Thread(target=self._warm_up, name=f"warm-up {self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        try:
+            self.get()
+            print(f"Warm-up: {self.name} loaded in {self.load_seconds:.1f}s")
+        except Exception as e:
+            print(f"Warm-up: failed to load {self.name}: {e}")
+
+
+def mmap_checkpoint_path(model_name):
+    """Where the memory-mappable copy of a Whisper checkpoint is kept"""
+    return os.path.join(WHISPER_MMAP_DIR, f"{os.path.basename(model_name)}.mmap.pt")
+
+
+def convert_whisper_checkpoint(model_name, path=None):
+    """Write a memory-mappable copy of a Whisper checkpoint and return its path.
+
+    The whole float32 model (the dtype whisper.load_model gives on CPU) is
+    saved, not just its state dict, so loading rebuilds the modules around the
+    mapped tensors without running their constructors or weight init.
+    """
+    import torch
+    import whisper
+    path = path or mmap_checkpoint_path(model_name)
+    model = whisper.load_model(model_name, device="cpu")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torch.save(model, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _whisper_classes():
+    """Classes a saved Whisper model is made of, for torch.load(weights_only=True)"""
+    import torch
+    import whisper.model
+    modules = [obj for obj in vars(whisper.model).values() if isinstance(obj, type) and issubclass(obj, torch.nn.Module)]
+    return modules + [whisper.model.ModelDimensions, torch.nn.ModuleList, torch.nn.Sequential, torch.nn.GELU,
+                      torch.nn.Embedding]
+
+
+def load_whisper_mmap(path):
+    """Load a converted Whisper model whose weights are read-only mappings of the file.
+
+    On CUDA the model is moved to the GPU, which copies the weights out of the
+    mapping, so nothing is shared between processes there.
+    """
+    import torch
+    with torch.serialization.safe_globals(_whisper_classes()), warnings.catch_warnings():
+        # alignment_heads is a tiny sparse tensor, checked (with a warning) on every load
+        warnings.filterwarnings("ignore", message="Validating sparse tensor invariants")
+        model = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    if torch.cuda.is_available():
+        model = model.to("cuda")
+    return model
+
+
+def load_whisper(model_name):
+    """Load a Whisper model, memory-mapping its converted checkpoint if there is one"""
+    import torch
+    import whisper
+    if torch.cuda.is_available():
+        # Moving to the GPU copies the weights out of a mapping, so mapping would only add a CPU-side copy
+        return whisper.load_model(model_name)
+    path = mmap_checkpoint_path(model_name)
+    if os.path.exists(path):
+        try:
+            return load_whisper_mmap(path)
+        except Exception as e:
+            # e.g. saved by a different whisper version
+            print(f"Could not memory-map {path} ({e}); re-run `python3 models.py {model_name}`")
+    elif multiprocessing.parent_process() is None:
+        # Once per process (warnings' default filter) and never from pool or job worker processes
+        warnings.warn(f"No memory-mappable checkpoint at {path}; run `python3 models.py {model_name}` "
+                      "to share weights across processes", stacklevel=2)
+    return whisper.load_model(model_name)
+
+
+def configure_gemini(api_key):
+    """Configure the Gemini client, talking REST to GEMINI_API_ENDPOINT when it is set"""
+    import google.generativeai as genai
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
+    return genai
+
+
+def load_gemini(model_name, api_key):
+    """Configure the Gemini client and wrap the model in the shared rate-limit scheduler"""
+    from scheduler import GeminiScheduler
+    genai = configure_gemini(api_key)
+    return GeminiScheduler(genai.GenerativeModel(model_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a Whisper checkpoint for memory-mapped loading")
+    parser.add_argument("model", nargs="?", default="turbo", help="Whisper model name or checkpoint path")
+    parser.add_argument("--output", help=f"Default: {WHISPER_MMAP_DIR}/<model>.mmap.pt")
+    args = parser.parse_args()
+    path = convert_whisper_checkpoint(args.model, args.output)
+    print(f"Wrote {path} ({os.path.getsize(path) / 1e9:.2f} GB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Overlapped transcribe -> analyze pipeline on asyncio.
+
+Transcription runs in an executor (usually the Whisper worker pool) while
+Gemini analysis runs concurrently in threads. A bounded queue between the two
+stages applies backpressure, so sustained throughput approaches the slower
+stage instead of the sum of both.
+"""
+import asyncio
+import time
+
+from metrics import percentile
+
+_DONE = object()
+
+
+class StageStats:
+    """Counters for one pipeline stage: items, busy time, queue wait and queue depth"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy_seconds = 0.0
+        self.waits = []
+        self.depth_samples = []
+
+    def sample_depth(self, queue):
+        self.depth_samples.append(queue.qsize())
+
+    def snapshot(self):
+        return {
+            "stage": self.name,
+            "processed": self.count,
+            "busy_s": round(self.busy_seconds, 3),
+            "wait_p50_s": round(percentile(self.waits, 50), 3),
+            "wait_p95_s": round(percentile(self.waits, 95), 3),
+            "queue_depth_mean": round(sum(self.depth_samples) / len(self.depth_samples), 2) if self.depth_samples else 0,
+            "queue_depth_max": max(self.depth_samples, default=0),
+        }
+
+
+class PipelineStats:
+    """Per-stage stats plus overall wall time and throughput"""
+
+    def __init__(self):
+        self.transcribe = StageStats("transcribe")
+        self.analyze = StageStats("analyze")
+        self.started = None
+        self.finished = 0
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "completed": self.finished,
+            "calls_per_minute": round(self.finished / elapsed * 60, 2) if elapsed else 0.0,
+            "stages": [self.transcribe.snapshot(), self.analyze.snapshot()],
+        }
+
+
+async def run_pipeline(jobs, transcribe, analyze, executor, transcribe_concurrency,
+                       analyze_concurrency=4, queue_size=8, ready=(), stats=None,
+                       analyze_batch_size=1, batch_wait=2.0):
+    """Run jobs through transcribe then analyze, yielding analyze() results as they finish.
+
+    jobs are argument tuples for transcribe, which must be picklable when
+    executor is a process pool. analyze(transcription) runs in a thread.
+    ready holds already-available transcriptions (e.g. cache hits), which go
+    straight to the analysis stage. Exceptions from either stage are re-raised
+    here and stop the run, so callers should catch per-item failures inside
+    transcribe/analyze.
+
+    With analyze_batch_size > 1, analyze receives a list of up to that many
+    transcriptions (waiting at most batch_wait seconds to fill it) and must
+    return a list of results in the same order.
+    """
+    stats = stats or PipelineStats()
+    stats.started = stats.started or time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    pending = asyncio.Queue()
+    for args in jobs:
+        pending.put_nowait((time.perf_counter(), args))
+    to_analyze = asyncio.Queue(maxsize=queue_size)
+    results = asyncio.Queue()
+
+    async def transcriber():
+        while True:
+            try:
+                queued_at, args = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            stats.transcribe.waits.append(time.perf_counter() - queued_at)
+            stats.transcribe.sample_depth(pending)
+            start = time.perf_counter()
+            transcription = await loop.run_in_executor(executor, transcribe, *args)
+            stats.transcribe.busy_seconds += time.perf_counter() - start
+            stats.transcribe.count += 1
+            # Blocks while the analysis stage is behind (backpressure)
+            await to_analyze.put((time.perf_counter(), transcription))
+            stats.analyze.sample_depth(to_analyze)
+
+    async def feed_ready():
+        for transcription in ready:
+            await to_analyze.put((time.perf_counter(), transcription))
+            stats.analyze.sample_depth(to_analyze)
+
+    async def next_batch():
+        """Up to analyze_batch_size items; the second value is True once _DONE was seen"""
+        item = await to_analyze.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = loop.time() + batch_wait
+        while len(batch) < analyze_batch_size:
+            try:
+                item = await asyncio.wait_for(to_analyze.get(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def analyzer():
+        done = False
+        while not done:
+            batch, done = await next_batch()
+            if not batch:
+                return
+            now = time.perf_counter()
+            stats.analyze.waits.extend(now - queued_at for queued_at, _ in batch)
+            stats.analyze.sample_depth(to_analyze)
+            transcriptions = [transcription for _, transcription in batch]
+            try:
+                if analyze_batch_size > 1:
+                    batch_results = await asyncio.to_thread(analyze, transcriptions)
+                else:
+                    batch_results = [await asyncio.to_thread(analyze, transcriptions[0])]
+            except Exception as e:
+                batch_results = [e]
+            stats.analyze.busy_seconds += time.perf_counter() - now
+            stats.analyze.count += len(batch)
+            for result in batch_results:
+                await results.put(result)
+
+    async def produce():
+        producers = [asyncio.create_task(feed_ready())]
+        producers += [asyncio.create_task(transcriber()) for _ in range(transcribe_concurrency)]
+        await asyncio.gather(*producers)
+        for _ in range(analyze_concurrency):
+            await to_analyze.put(_DONE)
+
+    analyzers = [asyncio.create_task(analyzer()) for _ in range(analyze_concurrency)]
+    producer = asyncio.create_task(produce())
+
+    async def close_results():
+        try:
+            await producer
+        except Exception as e:
+            # A broken executor stops the run; the analyzers would otherwise wait forever
+            for task in analyzers:
+                task.cancel()
+            await results.put(e)
+        else:
+            await asyncio.gather(*analyzers)
+        await results.put(_DONE)
+
+    closer = asyncio.create_task(close_results())
+    try:
+        while True:
+            result = await results.get()
+            if result is _DONE:
+                break
+            stats.finished += 1
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        for task in (producer, closer, *analyzers):
+            task.cancel()
@@ -1,14 +1,5 @@
-CALL_ANALYSIS_PROMPT = """
-You are an expert AI assistant tasked with analyzing customer service call transcripts. Your primary goal is to understand the full context of the conversation, from the initial problem to the final resolution.
-
-Analyze the following customer call transcript and provide your analysis in STRICT JSON format only.
-
-Customer Call Transcript:
-{transcript}
-
-Guidelines for analysis:
-
-Final Customer Sentiment: Determine the customer's emotional state **at the end of the call**. This is the most important sentiment metric.
+# Shared by the single-call and batched prompts, so a rule edited here applies to both
+ANALYSIS_GUIDELINES = """Final Customer Sentiment: Determine the customer's emotional state **at the end of the call**. This is the most important sentiment metric.
 
 Resolution Summary: Briefly describe the action the agent took that led to the final sentiment.
 
@@ -23,11 +14,10 @@ Specifically, flag as 'Yes' if:
 - The issue requires an action that was not confirmed as completed during the call (e.g., "a technical team will call you back").
 
 Do not flag for escalation if the customer was initially angry but was successfully de-escalated and satisfied by the agent's solution.
+"""
 
-IMPORTANT: Return ONLY valid JSON in this exact format. Do not include any other text:
-
-{{
-    "final_customer_sentiment": "Positive|Neutral|Negative|Mixed",
+# The fields of one analysis object, without its braces (indented to sit inside them)
+ANALYSIS_SCHEMA_FIELDS = """    "final_customer_sentiment": "Positive|Neutral|Negative|Mixed",
     "sentiment_score": 85,
     "resolution_summary": "Brief one-sentence summary of resolution",
     "key_issues": [
@@ -36,12 +26,55 @@ IMPORTANT: Return ONLY valid JSON in this exact format. Do not include any other
     ],
     "escalation_required": "Yes|No",
     "outcome": "resolved|unresolved"
-}}
+"""
 
-The sentiment_score should be a number from 0-100 where:
+SENTIMENT_SCORE_SCALE = """The sentiment_score should be a number from 0-100 where:
 - 0-30: Very Negative
 - 31-50: Negative  
 - 51-70: Neutral
 - 71-85: Positive
 - 86-100: Very Positive
-"""
\ No newline at end of file
+"""
+
+CALL_ANALYSIS_PROMPT = """
+You are an expert AI assistant tasked with analyzing customer service call transcripts. Your primary goal is to understand the full context of the conversation, from the initial problem to the final resolution.
+
+Analyze the following customer call transcript and provide your analysis in STRICT JSON format only.
+
+Customer Call Transcript:
+{transcript}
+
+Guidelines for analysis:
+
+""" + ANALYSIS_GUIDELINES + """
+IMPORTANT: Return ONLY valid JSON in this exact format. Do not include any other text:
+
+{{
+""" + ANALYSIS_SCHEMA_FIELDS + """}}
+
+""" + SENTIMENT_SCORE_SCALE
+
+BATCH_CALL_ANALYSIS_PROMPT = """
+You are an expert AI assistant tasked with analyzing customer service call transcripts. Your primary goal is to understand the full context of each conversation, from the initial problem to the final resolution.
+
+Below are several independent customer call transcripts, each introduced by a "### Call id:" line. Analyze every call on its own and provide your analysis in STRICT JSON format only.
+
+Guidelines for analysis (apply to each call separately):
+
+""" + ANALYSIS_GUIDELINES + "\n" + SENTIMENT_SCORE_SCALE + """
+IMPORTANT: Return ONLY a valid JSON array with exactly one object per call, in this exact format. Copy each call_id exactly as given. Do not include any other text:
+
+[
+    {{
+        "call_id": "the call id",
+""" + "".join("    " + line + "\n" for line in ANALYSIS_SCHEMA_FIELDS.splitlines()) + """    }}
+]
+
+Call transcripts:
+
+{transcripts}
+"""
+
+BATCH_CALL_TEMPLATE = """### Call id: {call_id}
+{transcript}
+"""
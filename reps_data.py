@@ -2,6 +2,7 @@ reps_data = [
     {
         "id": f"rep{str(i+1).zfill(3)}",
         "name": name,
+        "team": team,
         "sentiment_score": score,
         "escalations": escalations,
         "calls": [
@@ -23,21 +24,23 @@ reps_data = [
             }
         ]
     }
-    for i, (name, score, escalations, tone) in enumerate([
-        ("Alice Johnson", 85, 2, "positive"),
-        ("Bob Smith", 70, 4, "neutral"),
-        ("Carla Diaz", 90, 1, "very positive"),
-        ("David Kim", 60, 3, "neutral"),
-        ("Eva Patel", 77, 2, "generally positive"),
-        ("Faisal Khan", 50, 5, "mixed"),
-        ("Grace Lee", 95, 0, "excellent"),
-        ("Hector Ruiz", 65, 3, "somewhat frustrated"),
-        ("Ivy Wang", 88, 1, "smooth"),
-        ("Jamal White", 73, 2, "fine"),
-        ("Kira Nakamura", 82, 2, "great"),
-        ("Liam Novak", 55, 4, "frustrated")
+    for i, (name, team, score, escalations, tone) in enumerate([
+        ("Alice Johnson", "Billing", 85, 2, "positive"),
+        ("Bob Smith", "Technical", 70, 4, "neutral"),
+        ("Carla Diaz", "Sales", 90, 1, "very positive"),
+        ("David Kim", "Billing", 60, 3, "neutral"),
+        ("Eva Patel", "Technical", 77, 2, "generally positive"),
+        ("Faisal Khan", "Sales", 50, 5, "mixed"),
+        ("Grace Lee", "Billing", 95, 0, "excellent"),
+        ("Hector Ruiz", "Technical", 65, 3, "somewhat frustrated"),
+        ("Ivy Wang", "Sales", 88, 1, "smooth"),
+        ("Jamal White", "Billing", 73, 2, "fine"),
+        ("Kira Nakamura", "Technical", 82, 2, "great"),
+        ("Liam Novak", "Sales", 55, 4, "frustrated")
     ])
 ]
 
+_reps_by_id = {rep["id"]: rep for rep in reps_data}
+
 def get_rep_by_id(rep_id):
-    return next((rep for rep in reps_data if rep["id"] == rep_id), None)
\ No newline at end of file
+    return _reps_by_id.get(rep_id)
\ No newline at end of file
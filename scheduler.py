@@ -0,0 +1,246 @@
+"""Rate-limit-aware scheduling for Gemini requests.
+
+GeminiScheduler wraps a GenerativeModel and is used in its place: every
+generate_content call first takes a request from an RPM bucket and an
+estimated token count from a TPM bucket, and 429s / transient server errors
+are retried with jittered exponential backoff, honoring any retry delay the
+server sends back.
+"""
+import collections
+import os
+import random
+import re
+import threading
+import time
+
+DEFAULT_RPM = int(os.environ.get("GEMINI_RPM", 15))
+DEFAULT_TPM = int(os.environ.get("GEMINI_TPM", 1_000_000))
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                   "DeadlineExceeded", "BadGateway", "GatewayTimeout"}
+_RETRY_HINT_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retryDelay\"?:\s*\"([\d.]+)s\"", re.IGNORECASE),
+]
+
+
+class TokenBucket:
+    """Thread-safe token bucket that never lets more than limit_per_minute through in any 60 s window.
+
+    Quotas are enforced by the server over a sliding minute, so the bucket
+    holds a burst of capacity (a tenth of the limit by default) and refills at
+    (limit - capacity) per minute.
+    """
+
+    def __init__(self, limit_per_minute, capacity=None):
+        self.capacity = capacity or max(1, limit_per_minute // 10)
+        self.rate = max(1, limit_per_minute - self.capacity) / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until amount tokens are available and take them; returns seconds waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) tokens after the fact, e.g. estimate vs actual"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server says the quota is exhausted"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+def is_retryable(exc):
+    """429s, 5xx and deadline errors are retried; anything else is a real failure"""
+    code = getattr(exc, "code", None)
+    if callable(code):  # grpc errors expose code() instead of an attribute
+        code = None
+    try:
+        if code is not None and int(code) in RETRYABLE_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+
+def is_rate_limit(exc):
+    """Whether the server rejected the request for quota reasons"""
+    code = getattr(exc, "code", None)
+    return code == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def retry_hint(exc):
+    """Server-suggested retry delay in seconds, if the error carries one"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    message = str(exc)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class _TrackedStream:
+    """Streamed response that reports its usage to the scheduler once fully iterated.
+
+    Gemini only fills in the final usage_metadata of a stream after the last
+    chunk, so the TPM correction has to wait until then.
+    """
+
+    def __init__(self, response, on_done):
+        self._response = response
+        self._on_done = on_done
+
+    def __iter__(self):
+        yield from self._response
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done(self._response)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._response, name)
+
+
+class GeminiScheduler:
+    """Drop-in wrapper for GenerativeModel that budgets RPM/TPM and retries transient errors.
+
+    Prompt tokens are estimated from the prompt length before sending; the
+    characters-per-token ratio is recalibrated from the usage_metadata of each
+    response, and the TPM bucket is corrected by the difference.
+    """
+
+    def __init__(self, model, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=6, base_delay=1.0, max_delay=60.0,
+                 expected_output_tokens=300, chars_per_token=3.0):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expected_output_tokens = expected_output_tokens
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+        self._window = collections.deque()  # (time, tokens) of successful requests in the last minute
+        self.counters = collections.Counter()
+
+    def __getattr__(self, name):
+        # model_name, count_tokens, ... come from the wrapped model
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def estimate_tokens(self, prompt):
+        """Estimated prompt + response tokens for a request"""
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        return int(len(text) / self.chars_per_token) + self.expected_output_tokens
+
+    def _record_success(self, prompt, estimate, response):
+        usage = getattr(response, "usage_metadata", None)
+        actual = estimate
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count or 0
+            actual = prompt_tokens + (usage.candidates_token_count or 0)
+            self.tokens.adjust(actual - estimate)
+            if prompt_tokens and isinstance(prompt, str):
+                # Smooth the chars/token ratio toward what the API actually counted
+                observed = len(prompt) / prompt_tokens
+                self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * observed
+        now = time.monotonic()
+        with self._lock:
+            self._window.append((now, actual))
+            while self._window and self._window[0][0] < now - 60:
+                self._window.popleft()
+            self.counters["succeeded"] += 1
+            self.counters["tokens"] += actual
+
+    def _backoff(self, attempt, exc):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = retry_hint(exc)
+        if hint is not None:
+            delay = max(delay, hint + random.uniform(0, self.base_delay))
+        return delay
+
+    def generate_content(self, prompt, **kwargs):
+        """Send a request once both budgets allow it, retrying transient failures"""
+        estimate = self.estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            waited = self.requests.acquire(1) + self.tokens.acquire(estimate)
+            with self._lock:
+                self.counters["requests"] += 1
+                self.counters["throttle_wait_ms"] += int(waited * 1000)
+            try:
+                response = self.model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                self.tokens.adjust(-estimate)  # rejected requests don't use token quota
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._lock:
+                        self.counters["failed"] += 1
+                    raise
+                if is_rate_limit(e):
+                    # The server disagrees with our budget: stop sending until the buckets refill
+                    self.requests.drain()
+                    with self._lock:
+                        self.counters["rate_limited"] += 1
+                delay = self._backoff(attempt, e)
+                with self._lock:
+                    self.counters["retries"] += 1
+                    self.counters["backoff_ms"] += int(delay * 1000)
+                time.sleep(delay)
+                continue
+            if kwargs.get("stream"):
+                # Only the opening request is retried; errors mid-stream surface to the caller
+                return _TrackedStream(response, lambda done: self._record_success(prompt, estimate, done))
+            self._record_success(prompt, estimate, response)
+            return response
+
+    def stats(self):
+        """Requests and tokens sent in the last 60 s against the quota, plus retry/throttle counters"""
+        now = time.monotonic()
+        with self._lock:
+            while self._window and self._window[0][0] < now - 60:
+                self._window.popleft()
+            rpm = len(self._window)
+            tpm = sum(tokens for _, tokens in self._window)
+            counters = dict(self.counters)
+        return {
+            "rpm": rpm,
+            "rpm_quota": self.rpm,
+            "rpm_utilization": round(rpm / self.rpm, 3),
+            "tpm": round(tpm),
+            "tpm_quota": self.tpm,
+            "tpm_utilization": round(tpm / self.tpm, 3),
+            "chars_per_token": round(self.chars_per_token, 2),
+            **counters,
+        }
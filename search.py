@@ -0,0 +1,114 @@
+"""Arabic-aware text normalization and query parsing for the transcript search index.
+
+Transcripts and queries go through the same normalize_arabic() and
+index_text() before they reach SQLite FTS5, so hamza/madda forms of alef,
+alef maqsura and taa marbuta match their plain forms, diacritics never block
+a match, and the attached definite article (with its و/ف/ب/ك/ل prefixes) is
+dropped so "فاتورة" finds "الفاتورة".
+"""
+import functools
+import re
+import unicodedata
+
+# Tashkeel, Quranic annotation marks, superscript alef and tatweel
+_STRIP = set(chr(c) for c in range(0x064B, 0x0660)) | set(chr(c) for c in range(0x06D6, 0x06EE)) | {"ٰ", "ـ"}
+_FOLD = {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ؤ": "و", "ئ": "ي",
+}
+# Arabic-Indic and Eastern Arabic-Indic digits
+_FOLD.update({chr(0x0660 + i): str(i) for i in range(10)})
+_FOLD.update({chr(0x06F0 + i): str(i) for i in range(10)})
+
+_TRANSLATE = str.maketrans({**_FOLD, **{char: None for char in _STRIP}})
+
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+")
+_ARTICLE = re.compile(r"^(?:[وفبك]?ال|لل)(?=\w{2})")
+
+
+@functools.lru_cache(maxsize=4096)
+def _fold_char(char):
+    out = []
+    for c in unicodedata.normalize("NFKC", char):
+        if c in _STRIP:
+            continue
+        out.append(_FOLD.get(c, c).lower())
+    return "".join(out)
+
+
+def normalize_arabic(text, offsets=False):
+    """Fold Arabic letter variants, strip diacritics and tatweel, lowercase Latin.
+
+    With offsets=True also returns, for every character of the result, the
+    index of the character of text it came from (for snippets).
+    """
+    if unicodedata.is_normalized("NFKC", text):
+        # Fast path: every character maps to at most one character
+        folded = text.translate(_TRANSLATE)
+        lowered = folded.lower()
+        if len(lowered) == len(folded):
+            if not offsets:
+                return lowered
+            return lowered, [i for i, char in enumerate(text) if char not in _STRIP]
+    if not offsets:
+        return "".join(_fold_char(char) for char in text)
+    out, origin = [], []
+    for i, char in enumerate(text):
+        folded = _fold_char(char)
+        out.append(folded)
+        origin.extend([i] * len(folded))
+    return "".join(out), origin
+
+
+def terms(text):
+    """Normalized word tokens of text, without a leading definite article"""
+    return [_ARTICLE.sub("", token) for token in _WORD.findall(normalize_arabic(text))]
+
+
+def index_text(text):
+    """The form of a transcript that goes into the full-text index"""
+    return " ".join(terms(text))
+
+
+def parse_query(query):
+    """Turn a user query into an FTS5 MATCH expression, or None if it has no terms.
+
+    "quoted text" is a phrase, a trailing * makes a prefix term, and all parts
+    must match. Every token is quoted, so FTS5 operators and punctuation in
+    the query are taken literally.
+    """
+    parts = []
+    for phrase, word in _QUERY_PART.findall(query):
+        tokens = terms(phrase if phrase else word)
+        if not tokens:
+            continue
+        prefix = "*" if word.endswith("*") and len(tokens) == 1 else ""
+        parts.append('"' + " ".join(tokens) + '"' + prefix)
+    return " ".join(parts) or None
+
+
+def snippet(text, query, width=160):
+    """About width characters of text around the first query term, with that term in bold"""
+    wanted = terms(query.replace('"', " ").replace("*", " "))
+    normalized, origin = normalize_arabic(text, offsets=True)
+    match = None
+    for token in wanted:
+        match = re.search(rf"(?<!\w)(?:[وفبك]?ال|لل)?{re.escape(token)}", normalized)
+        if match:
+            break
+    if match is None:
+        return text[:width] + ("…" if len(text) > width else "")
+    start = origin[match.start()]
+    end = origin[match.end() - 1] + 1
+    # Extend to the end of the word for prefix matches
+    while end < len(text) and (text[end].isalnum() or text[end] in _STRIP):
+        end += 1
+    left = max(0, start - width // 2)
+    right = min(len(text), end + width // 2)
+    return (
+        ("…" if left > 0 else "") + text[left:start] + "**" + text[start:end] + "**" + text[end:right]
+        + ("…" if right < len(text) else "")
+    )
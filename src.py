@@ -1,25 +1,79 @@
 import os
 import sys
-import whisper
+import time
+from datetime import date
 from dotenv import load_dotenv
-import google.generativeai as genai
-from prompt import CALL_ANALYSIS_PROMPT
-model = whisper.load_model("turbo")
-result=model.transcribe("test_audio/jawwal3.mp3", language="ar")
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-genai.configure(api_key=api_key)
-model_name = 'gemini-1.5-flash-latest'
+from analysis import analyze_transcript, gemini_model_name
+from audio import SAMPLE_RATE, decode_audio
+from backends import backend_id
+from cache import AnalysisCache, TranscriptCache, hash_audio
+from compaction import prompt_transcript
+from metrics import record
+from models import configure_gemini
+from scheduler import GeminiScheduler
+from store import CallStore
+from transcription import TRIM_NON_SPEECH, transcribe_speech_only
+from triage import LOCAL_TRIAGE, TRIAGE_MODEL_NAME, route
 
-prompt = CALL_ANALYSIS_PROMPT.format(transcript=result['text'])
+audio_path = "test_audio/jawwal3.mp3"
+whisper_model_name = "turbo"
+transcribe_options = {"language": "ar"}
+cache_options = dict(transcribe_options, trim_non_speech=TRIM_NON_SPEECH)
 
-model = genai.GenerativeModel(model_name)
-res = model.generate_content(prompt)
-print(res.text)
-print(f"\nPrompt tokens: {res.usage_metadata.prompt_token_count}")
-print(f"\nResponse tokens: {res.usage_metadata.candidates_token_count}")
+# Only load Whisper when this audio has not been transcribed before
+transcript_cache = TranscriptCache()
+cache_key = TranscriptCache.make_key(hash_audio(audio_path), backend_id(whisper_model_name), cache_options)
+result = transcript_cache.get(cache_key)
+if result is None:
+    from backends import load_backend
+    model = load_backend(whisper_model_name)
+    if TRIM_NON_SPEECH:
+        with open(audio_path, "rb") as f:
+            audio = decode_audio(f.read(), filename=audio_path)
+        start = time.perf_counter()
+        result = transcribe_speech_only(lambda samples: model.transcribe(samples, **transcribe_options), audio)
+        audio_seconds = len(audio) / SAMPLE_RATE
+    else:
+        start = time.perf_counter()
+        result = model.transcribe(audio_path, **transcribe_options)
+        audio_seconds = result['segments'][-1]['end'] if result.get('segments') else 0
+    elapsed = time.perf_counter() - start
+    record("transcribe", elapsed, cached=False, backend=backend_id(whisper_model_name), audio_seconds=round(audio_seconds, 2),
+           rtf=round(elapsed / audio_seconds, 4) if audio_seconds else None)
+    transcript_cache.put(cache_key, result)
+else:
+    record("transcribe", 0.0, cached=True, backend=backend_id(whisper_model_name))
+cache_stats = transcript_cache.stats()
+print(f"Transcript cache - Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']}")
+if result.get('skipped_seconds'):
+    print(f"Skipped {result['skipped_seconds']:.0f}s of silence/hold audio out of {result['audio_seconds']:.0f}s")
 
-print(f"\n Actual call text: {result["text"]}")
+load_dotenv()
+api_key = os.environ.get("GEMINI_API_KEY")
+genai = configure_gemini(api_key)
+model_name = 'gemini-1.5-flash-latest'
 
+model = GeminiScheduler(genai.GenerativeModel(model_name))
+analysis_cache = AnalysisCache()
+analysis, triage = route(result) if LOCAL_TRIAGE else (None, None)
+if triage:
+    print(f"Local triage: {triage['routed']} (confidence {triage['confidence']:.2f})")
+analysis_model_name = TRIAGE_MODEL_NAME if analysis else gemini_model_name(model)
+if analysis is None:
+    compaction = prompt_transcript(result, model)
+    print(f"Prompt transcript: ~{compaction['tokens']} of ~{compaction['original_tokens']} tokens (dropped: {compaction['dropped']})")
+    analysis = analyze_transcript(model, compaction['text'], cache=analysis_cache)
+print(analysis['raw'])
+if analysis['cached']:
+    print("\n(analysis served from cache)")
+print(f"\nPrompt tokens: {analysis['usage'].get('prompt_tokens')}")
+print(f"\nResponse tokens: {analysis['usage'].get('response_tokens')}")
 
+# Save the call so it shows up in the dashboard and transcript search (REP_ID assigns it to a rep)
+if analysis['parsed']:
+    CallStore().add_call(os.environ.get("REP_ID"), date.today().isoformat(), result['text'], analysis['parsed'],
+                         source=audio_path, audio_hash=hash_audio(audio_path), model_name=analysis_model_name)
+else:
+    print("\nAnalysis could not be parsed; the call was not saved")
 
+print(f"\n Actual call text: {result['text']}")
@@ -0,0 +1,712 @@
+"""Persistent call store: reps, calls, transcripts and analyses in SQLite (WAL).
+
+The dashboard pages query this instead of walking the reps_data list. Calls
+are indexed by rep and date, outcome and escalation flag, so rep lookups and
+paged call listings stay index seeks as the tables grow.
+
+Per-rep and global rollups (call count, sentiment sum, escalations and an
+outcome histogram) are updated in the same transaction as each call insert
+or re-analysis, so the overview reads precomputed numbers and sorted top-k
+pages straight off the rollup indexes.
+
+Transcript and analysis bodies are zlib-compressed in their own tables and
+only read for a single call on request; listings return headers (date,
+outcome, score) from the calls table alone.
+
+Transcripts are also indexed for full-text search in a contentless FTS5
+table over Arabic-normalized text (see search.py), updated with each call.
+
+Each save also bumps its rep's version in churn_scores; refresh_churn()
+rescores (see churn.py) only reps whose version moved past the one they
+were last scored at, so the overview reads stored churn rates.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from churn import CHURN_FLAG_RATE, churn_intent, compute_churn
+from search import index_text, parse_query, snippet
+
+DEFAULT_STORE_PATH = os.environ.get("CALL_STORE_PATH", os.path.join("data", "calls.sqlite3"))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reps (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        team TEXT,
+        sentiment_score REAL,
+        escalations INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_reps_name ON reps(name);
+    CREATE INDEX IF NOT EXISTS idx_reps_team ON reps(team);
+    CREATE INDEX IF NOT EXISTS idx_reps_sentiment ON reps(sentiment_score);
+    CREATE INDEX IF NOT EXISTS idx_reps_escalations ON reps(escalations);
+
+    CREATE TABLE IF NOT EXISTS calls (
+        id INTEGER PRIMARY KEY,
+        rep_id TEXT REFERENCES reps(id),
+        call_date TEXT NOT NULL,
+        outcome TEXT,
+        escalation INTEGER NOT NULL DEFAULT 0,
+        sentiment_score REAL,
+        source TEXT,
+        audio_hash TEXT,
+        created_at REAL NOT NULL,
+        churn_intent INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_calls_rep_date ON calls(rep_id, call_date);
+    CREATE INDEX IF NOT EXISTS idx_calls_date ON calls(call_date);
+    CREATE INDEX IF NOT EXISTS idx_calls_outcome ON calls(outcome, call_date);
+    CREATE INDEX IF NOT EXISTS idx_calls_escalation ON calls(escalation, call_date);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_calls_audio_hash ON calls(audio_hash) WHERE audio_hash IS NOT NULL;
+
+    CREATE TABLE IF NOT EXISTS transcripts (
+        call_id INTEGER PRIMARY KEY REFERENCES calls(id) ON DELETE CASCADE,
+        body BLOB NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS analyses (
+        call_id INTEGER PRIMARY KEY REFERENCES calls(id) ON DELETE CASCADE,
+        body BLOB NOT NULL,
+        model_name TEXT,
+        created_at REAL NOT NULL
+    );
+
+    -- Rollups: one row per rep id, plus ALL_CALLS for the whole centre
+    CREATE TABLE IF NOT EXISTS call_stats (
+        scope TEXT PRIMARY KEY,
+        call_count INTEGER NOT NULL DEFAULT 0,
+        scored_calls INTEGER NOT NULL DEFAULT 0,
+        sentiment_sum REAL NOT NULL DEFAULT 0,
+        sentiment_avg REAL,
+        escalations INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_call_stats_sentiment ON call_stats(sentiment_avg, scope);
+    CREATE INDEX IF NOT EXISTS idx_call_stats_count ON call_stats(call_count, scope);
+    CREATE INDEX IF NOT EXISTS idx_call_stats_escalations ON call_stats(escalations, scope);
+
+    -- Full-text index of search.index_text(transcript), rowid = calls.id; the text itself is not stored twice.
+    -- rep and month (e.g. m202503) are indexed as tokens so filters are doclist intersections inside FTS5.
+    CREATE VIRTUAL TABLE IF NOT EXISTS transcript_index USING fts5(body, rep, month, content='', tokenize='unicode61');
+
+    CREATE TABLE IF NOT EXISTS outcome_counts (
+        scope TEXT NOT NULL,
+        outcome TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (scope, outcome)
+    );
+
+    -- Churn risk per rep (churn.py); version counts saves, scored_version the save it was computed after
+    CREATE TABLE IF NOT EXISTS churn_scores (
+        rep_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        scored_version INTEGER NOT NULL DEFAULT 0,
+        month TEXT,
+        churn_rate REAL,
+        indicators TEXT,
+        scored_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_churn_stale ON churn_scores(rep_id) WHERE version > scored_version;
+"""
+
+ALL_CALLS = "*"
+# Only this many of the newest matching calls are ranked, so very common terms stay fast
+RANK_WINDOW = 5000
+# Date filters spanning more months than this are applied after the index lookup instead
+MAX_MONTH_TOKENS = 36
+
+# (min inclusive, max exclusive) sentiment score, matching get_sentiment_color in app.py
+SCORE_BANDS = {
+    "high": (80, None),
+    "medium": (60, 80),
+    "low": (None, 60),
+}
+
+_SCORE_SQL = "COALESCE(s.sentiment_avg, r.sentiment_score)"
+# Flagged for review: a stored churn rate (churn_scores k) at or above churn.CHURN_FLAG_RATE
+_FLAGGED_SQL = f"(COALESCE(k.churn_rate, 0) >= {CHURN_FLAG_RATE!r})"
+
+# Orderings that walk a call_stats index backwards, so a LIMIT reads only the top k rows
+REP_SORT_COLUMNS = {
+    "sentiment_score": "s.sentiment_avg DESC, s.scope DESC",
+    "call_count": "s.call_count DESC, s.scope DESC",
+    "escalations": "s.escalations DESC, s.scope DESC",
+    "name": "r.name",
+}
+
+
+def _compress(text):
+    return zlib.compress(text.encode("utf-8"))
+
+
+def _decompress(blob):
+    return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+
+def call_fields(analysis):
+    """Indexed (outcome, escalation, sentiment_score) columns derived from an analysis dict.
+
+    Handles both Gemini analyses (outcome, escalation_required,
+    sentiment_score out of 100) and the seed data's {outcome, score} dicts.
+    """
+    analysis = analysis or {}
+    outcome = analysis.get("outcome")
+    escalation = str(analysis.get("escalation_required", "")).strip().lower() == "yes" or outcome == "escalated"
+    score = analysis.get("sentiment_score")
+    if score is None and analysis.get("score") is not None:
+        score = round(analysis["score"] * 100, 2)
+    try:
+        score = float(score) if score is not None else None
+    except (TypeError, ValueError):
+        score = None
+    return outcome, int(escalation), score
+
+
+def _month_token(call_date):
+    return "m" + call_date[:7].replace("-", "") if call_date else ""
+
+
+def _month_tokens(date_from, date_to):
+    """Month tokens covering [date_from, date_to], or None if the range is open or too long to enumerate"""
+    if not date_from or not date_to:
+        return None
+    year, month = int(date_from[:4]), int(date_from[5:7])
+    end = (int(date_to[:4]), int(date_to[5:7]))
+    tokens = []
+    while (year, month) <= end:
+        if len(tokens) == MAX_MONTH_TOKENS:
+            return None
+        tokens.append(f"m{year:04d}{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return tokens
+
+
+def _fts_string(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+class CallStore:
+    """Thread-safe handle on the call store database.
+
+    reps.sentiment_score and reps.escalations keep the figures a rep was
+    seeded with; rep dicts returned here report the rollups over their calls,
+    falling back to the seeded score for reps without scored calls. A rep's
+    call_stats.sentiment_avg holds that same fallback, so sorting by score
+    walks its index and agrees with the score shown and the band filters.
+    """
+
+    def __init__(self, path=None):
+        path = path or DEFAULT_STORE_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate_plain_bodies()
+        has_index = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'transcript_index'"
+        ).fetchone() is not None
+        self._conn.executescript(SCHEMA)
+        if self._conn.execute("SELECT 1 FROM call_stats LIMIT 1").fetchone() is None:
+            # New store, or one created before rollups existed
+            self._rebuild_stats()
+        if not has_index:
+            # Transcript matches count; rep and month tokens don't affect the ranking
+            self._conn.execute("INSERT INTO transcript_index(transcript_index, rank) VALUES ('rank', 'bm25(1.0, 0.0, 0.0)')")
+            self._rebuild_search_index()
+        self._fill_seeded_scores()
+        self._migrate_churn_intent()
+        if self._conn.execute("SELECT 1 FROM churn_scores LIMIT 1").fetchone() is None:
+            # New store, or one created before churn scoring: every rep with calls needs scoring
+            self._conn.execute(
+                "INSERT INTO churn_scores(rep_id, version) SELECT DISTINCT rep_id, 1 FROM calls WHERE rep_id IS NOT NULL"
+            )
+        self._conn.commit()
+
+    def _migrate_plain_bodies(self):
+        """Compress transcript/analysis bodies of stores created before they were stored compressed"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(transcripts)")]
+        if "text" not in columns:
+            return
+        self._conn.execute("ALTER TABLE transcripts RENAME TO transcripts_plain")
+        self._conn.execute("ALTER TABLE analyses RENAME TO analyses_plain")
+        self._conn.executescript(SCHEMA)
+        for call_id, text in self._conn.execute("SELECT call_id, text FROM transcripts_plain").fetchall():
+            self._conn.execute("INSERT INTO transcripts(call_id, body) VALUES (?, ?)", (call_id, _compress(text)))
+        rows = self._conn.execute("SELECT call_id, analysis, model_name, created_at FROM analyses_plain").fetchall()
+        for call_id, analysis, model_name, created_at in rows:
+            self._conn.execute(
+                "INSERT INTO analyses(call_id, body, model_name, created_at) VALUES (?, ?, ?, ?)",
+                (call_id, _compress(analysis), model_name, created_at),
+            )
+        self._conn.execute("DROP TABLE transcripts_plain")
+        self._conn.execute("DROP TABLE analyses_plain")
+        self._conn.commit()
+
+    def _migrate_churn_intent(self):
+        """Add and fill calls.churn_intent in stores created before churn scoring"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(calls)")]
+        if "churn_intent" in columns:
+            return
+        self._conn.execute("ALTER TABLE calls ADD COLUMN churn_intent INTEGER NOT NULL DEFAULT 0")
+        self._fill_churn_intent()
+
+    def _fill_churn_intent(self):
+        for call_id, body in self._conn.execute("SELECT call_id, body FROM analyses").fetchall():
+            flag = int(churn_intent(json.loads(_decompress(body))))
+            self._conn.execute("UPDATE calls SET churn_intent = ? WHERE id = ? AND churn_intent != ?", (flag, call_id, flag))
+
+    def seed(self, reps):
+        """Load reps in the reps_data format if the store has no reps yet; returns the number added.
+
+        reps may be any iterable; everything goes in as one transaction.
+        """
+        added = 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM reps LIMIT 1").fetchone():
+                return 0
+            for rep in reps:
+                self._insert_rep(rep["id"], rep["name"], rep.get("team"), rep.get("sentiment_score"),
+                                 rep.get("escalations", 0))
+                for call in rep.get("calls", []):
+                    self._insert_call(rep["id"], call["date"], call["transcript"], call.get("sentiment"), "seed",
+                                      None, None)
+                added += 1
+            self._conn.commit()
+        return added
+
+    def _insert_rep(self, rep_id, name, team, sentiment_score, escalations):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO reps(id, name, team, sentiment_score, escalations, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rep_id, name, team, sentiment_score, escalations, time.time()),
+        )
+        self._conn.execute("INSERT OR IGNORE INTO call_stats(scope) VALUES (?)", (rep_id,))
+        self._conn.execute("UPDATE call_stats SET sentiment_avg = ? WHERE scope = ? AND scored_calls = 0",
+                           (sentiment_score, rep_id))
+
+    def add_rep(self, rep_id, name, team=None, sentiment_score=None, escalations=0):
+        with self._lock:
+            self._insert_rep(rep_id, name, team, sentiment_score, escalations)
+            self._conn.commit()
+
+    def _insert_call(self, rep_id, call_date, transcript, analysis, source, audio_hash, model_name):
+        outcome, escalation, score = call_fields(analysis)
+        intent = int(churn_intent(analysis))
+        now = time.time()
+        row = None
+        if audio_hash is not None:
+            row = self._conn.execute(
+                "SELECT id, rep_id, call_date, outcome, escalation, sentiment_score FROM calls WHERE audio_hash = ?",
+                (audio_hash,),
+            ).fetchone()
+        if row is None:
+            self._apply_stats(rep_id, outcome, escalation, score, 1)
+            self._touch_churn(rep_id)
+            call_id = self._conn.execute(
+                "INSERT INTO calls(rep_id, call_date, outcome, escalation, sentiment_score, source, audio_hash, "
+                "created_at, churn_intent) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rep_id, call_date, outcome, escalation, score, source, audio_hash, now, intent),
+            ).lastrowid
+        else:
+            call_id = row["id"]
+            # Re-analysis: take the old figures out of the rollups before adding the new ones
+            self._apply_stats(row["rep_id"], row["outcome"], row["escalation"], row["sentiment_score"], -1)
+            self._apply_stats(rep_id, outcome, escalation, score, 1)
+            self._touch_churn(row["rep_id"])
+            self._touch_churn(rep_id)
+            old = self._conn.execute("SELECT body FROM transcripts WHERE call_id = ?", (call_id,)).fetchone()
+            if old is not None:
+                self._unindex(call_id, _decompress(old["body"]), row["rep_id"], row["call_date"])
+            self._conn.execute(
+                "UPDATE calls SET rep_id = ?, call_date = ?, outcome = ?, escalation = ?, sentiment_score = ?, "
+                "source = ?, churn_intent = ? WHERE id = ?",
+                (rep_id, call_date, outcome, escalation, score, source, intent, call_id),
+            )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO transcripts(call_id, body) VALUES (?, ?)", (call_id, _compress(transcript))
+        )
+        self._index(call_id, transcript, rep_id, call_date)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO analyses(call_id, body, model_name, created_at) VALUES (?, ?, ?, ?)",
+            (call_id, _compress(json.dumps(analysis or {}, ensure_ascii=False)), model_name, now),
+        )
+        return call_id
+
+    @staticmethod
+    def _index_row(call_id, transcript, rep_id, call_date):
+        return call_id, index_text(transcript), rep_id or "", _month_token(call_date)
+
+    def _index(self, call_id, transcript, rep_id, call_date):
+        self._conn.execute(
+            "INSERT INTO transcript_index(rowid, body, rep, month) VALUES (?, ?, ?, ?)",
+            self._index_row(call_id, transcript, rep_id, call_date),
+        )
+
+    def _unindex(self, call_id, transcript, rep_id, call_date):
+        # Contentless FTS5 deletes need the exact values that were indexed
+        self._conn.execute(
+            "INSERT INTO transcript_index(transcript_index, rowid, body, rep, month) VALUES ('delete', ?, ?, ?, ?)",
+            self._index_row(call_id, transcript, rep_id, call_date),
+        )
+
+    def _rebuild_search_index(self):
+        self._conn.execute("INSERT INTO transcript_index(transcript_index) VALUES ('delete-all')")
+        rows = self._conn.execute(
+            "SELECT t.call_id, t.body, c.rep_id, c.call_date FROM transcripts t JOIN calls c ON c.id = t.call_id"
+        )
+        for call_id, body, rep_id, call_date in rows.fetchall():
+            self._index(call_id, _decompress(body), rep_id, call_date)
+
+    def rebuild_search_index(self):
+        """Re-index every stored transcript, e.g. after changing the normalization rules"""
+        with self._lock:
+            self._rebuild_search_index()
+            self._conn.commit()
+
+    def add_call(self, rep_id, call_date, transcript, analysis, source=None, audio_hash=None, model_name=None):
+        """Save a call with its transcript and analysis; returns the call id.
+
+        A call with the same audio_hash replaces the earlier one (re-analysis
+        or reassignment to another rep).
+        """
+        with self._lock:
+            call_id = self._insert_call(rep_id, call_date, transcript, analysis, source, audio_hash, model_name)
+            self._conn.commit()
+        return call_id
+
+    def _apply_stats(self, rep_id, outcome, escalation, score, sign):
+        """Add (sign=1) or remove (sign=-1) one call's figures from its rep's and the global rollups"""
+        scored = 0 if score is None else 1
+        score = score or 0.0
+        for scope in ([rep_id] if rep_id is not None else []) + [ALL_CALLS]:
+            self._conn.execute("INSERT OR IGNORE INTO call_stats(scope) VALUES (?)", (scope,))
+            self._conn.execute(
+                "UPDATE call_stats SET call_count = call_count + ?, scored_calls = scored_calls + ?, "
+                "sentiment_sum = sentiment_sum + ?, escalations = escalations + ?, "
+                "sentiment_avg = CASE WHEN scored_calls + ? > 0 THEN (sentiment_sum + ?) / (scored_calls + ?) "
+                "ELSE (SELECT sentiment_score FROM reps WHERE id = scope) END "
+                "WHERE scope = ?",
+                (sign, sign * scored, sign * score, sign * escalation, sign * scored, sign * score, sign * scored, scope),
+            )
+            self._conn.execute(
+                "INSERT INTO outcome_counts(scope, outcome, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(scope, outcome) DO UPDATE SET count = count + excluded.count",
+                (scope, outcome or "unknown", sign),
+            )
+
+    def _touch_churn(self, rep_id):
+        """Mark a rep's churn score out of date"""
+        if rep_id is not None:
+            self._conn.execute(
+                "INSERT INTO churn_scores(rep_id, version) VALUES (?, 1) "
+                "ON CONFLICT(rep_id) DO UPDATE SET version = version + 1",
+                (rep_id,),
+            )
+
+    def refresh_churn(self):
+        """Rescore the reps with calls saved since they were last scored; returns how many were rescored.
+
+        Only those reps' calls are read, as columns for churn.compute_churn.
+        A save made meanwhile leaves its rep out of date for the next refresh.
+        """
+        with self._lock:
+            versions = dict(self._conn.execute(
+                "SELECT rep_id, version FROM churn_scores WHERE version > scored_version"
+            ).fetchall())
+            if not versions:
+                return 0
+            # IN rather than a join, so SQLite seeks each stale rep's calls instead of scanning calls
+            rows = self._conn.execute(
+                "SELECT rep_id, call_date, outcome, escalation, sentiment_score, churn_intent FROM calls "
+                "WHERE rep_id IN (SELECT rep_id FROM churn_scores WHERE version > scored_version)"
+            ).fetchall()
+            scores = compute_churn(*zip(*rows)) if rows else {}
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE churn_scores SET scored_version = ?, month = ?, churn_rate = ?, indicators = ?, scored_at = ? "
+                "WHERE rep_id = ?",
+                [
+                    (version, *(scores[rep_id][:2] if rep_id in scores else (None, None)),
+                     json.dumps(scores[rep_id][2]) if rep_id in scores else None, now, rep_id)
+                    for rep_id, version in versions.items()
+                ],
+            )
+            self._conn.commit()
+        return len(versions)
+
+    def _fill_seeded_scores(self):
+        """Give reps without scored calls their seeded score as sentiment_avg (stores from before this was kept)"""
+        self._conn.execute(
+            "UPDATE call_stats SET sentiment_avg = (SELECT sentiment_score FROM reps WHERE id = scope) "
+            "WHERE scored_calls = 0 AND sentiment_avg IS NULL AND scope IN (SELECT id FROM reps)"
+        )
+
+    def _rebuild_stats(self):
+        """Recompute every rollup from the calls table"""
+        self._conn.execute("DELETE FROM call_stats")
+        self._conn.execute("DELETE FROM outcome_counts")
+        aggregates = (
+            "COUNT(*), COUNT(sentiment_score), COALESCE(SUM(sentiment_score), 0), AVG(sentiment_score), "
+            "COALESCE(SUM(escalation), 0)"
+        )
+        self._conn.execute(
+            "INSERT INTO call_stats(scope, call_count, scored_calls, sentiment_sum, sentiment_avg, escalations) "
+            f"SELECT rep_id, {aggregates} FROM calls WHERE rep_id IS NOT NULL GROUP BY rep_id"
+        )
+        self._conn.execute(
+            "INSERT INTO call_stats(scope, call_count, scored_calls, sentiment_sum, sentiment_avg, escalations) "
+            f"SELECT ?, {aggregates} FROM calls",
+            (ALL_CALLS,),
+        )
+        self._conn.execute("INSERT OR IGNORE INTO call_stats(scope) SELECT id FROM reps")
+        self._fill_seeded_scores()
+        self._conn.execute(
+            "INSERT INTO outcome_counts(scope, outcome, count) "
+            "SELECT rep_id, COALESCE(outcome, 'unknown'), COUNT(*) FROM calls WHERE rep_id IS NOT NULL "
+            "GROUP BY rep_id, COALESCE(outcome, 'unknown')"
+        )
+        self._conn.execute(
+            "INSERT INTO outcome_counts(scope, outcome, count) "
+            "SELECT ?, COALESCE(outcome, 'unknown'), COUNT(*) FROM calls GROUP BY COALESCE(outcome, 'unknown')",
+            (ALL_CALLS,),
+        )
+
+    def rescore_churn(self):
+        """Re-derive every call's churn-intent flag and rescore all reps, e.g. after editing churn.CHURN_TERMS"""
+        with self._lock:
+            self._fill_churn_intent()
+            self._conn.execute(
+                "INSERT OR IGNORE INTO churn_scores(rep_id, version) SELECT DISTINCT rep_id, 0 FROM calls "
+                "WHERE rep_id IS NOT NULL"
+            )
+            self._conn.execute("UPDATE churn_scores SET version = scored_version + 1")
+            self._conn.commit()
+        return self.refresh_churn()
+
+    def rebuild_stats(self):
+        """Recompute the rollups from scratch, e.g. after editing calls outside this class"""
+        with self._lock:
+            self._rebuild_stats()
+            self._conn.commit()
+
+    def _outcomes(self, scope):
+        rows = self._conn.execute(
+            "SELECT outcome, count FROM outcome_counts WHERE scope = ? AND count > 0 ORDER BY count DESC", (scope,)
+        )
+        return {outcome: count for outcome, count in rows}
+
+    def _rep_query(self, where="", order="", limit=""):
+        return (
+            f"SELECT r.id, r.name, r.team, {_SCORE_SQL} AS sentiment_score, s.escalations, s.call_count, "
+            f"{_FLAGGED_SQL} AS flagged, k.churn_rate, k.month AS churn_month "
+            f"FROM call_stats s JOIN reps r ON r.id = s.scope LEFT JOIN churn_scores k ON k.rep_id = r.id "
+            f"{where} {order} {limit}"
+        )
+
+    @staticmethod
+    def _rep_filters(team=None, score_band=None, flagged=None):
+        """WHERE clause and params for the overview filters"""
+        clauses, params = [], []
+        if team is not None:
+            clauses.append("r.team = ?")
+            params.append(team)
+        if score_band is not None:
+            low, high = SCORE_BANDS[score_band]
+            if low is not None:
+                clauses.append(f"{_SCORE_SQL} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{_SCORE_SQL} < ?")
+                params.append(high)
+        if flagged is not None:
+            clauses.append(_FLAGGED_SQL if flagged else f"NOT {_FLAGGED_SQL}")
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def get_rep(self, rep_id):
+        """Rep dict (id, name, team, sentiment_score, escalations, call_count, outcomes, churn_rate,
+        churn_month, churn_indicators) or None"""
+        with self._lock:
+            row = self._conn.execute(self._rep_query("WHERE s.scope = ?"), (rep_id,)).fetchone()
+            if row is None:
+                return None
+            indicators = self._conn.execute("SELECT indicators FROM churn_scores WHERE rep_id = ?", (rep_id,)).fetchone()
+            rep = dict(row, flagged=bool(row["flagged"]), outcomes=self._outcomes(rep_id),
+                       churn_indicators=json.loads(indicators[0]) if indicators and indicators[0] else None)
+        return rep
+
+    def list_reps(self, sort_by="sentiment_score", limit=None, offset=0, team=None, score_band=None, flagged=None):
+        """Reps ordered by one of REP_SORT_COLUMNS, optionally filtered and one page at a time.
+
+        Filters: team name, a SCORE_BANDS key, and flagged True/False.
+        """
+        where, params = self._rep_filters(team, score_band, flagged)
+        order = f"ORDER BY {REP_SORT_COLUMNS[sort_by]}"
+        page = ""
+        if limit is not None:
+            page = "LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(self._rep_query(where, order, page), params).fetchall()
+        return [dict(row, flagged=bool(row["flagged"])) for row in rows]
+
+    def count_reps(self, team=None, score_band=None, flagged=None):
+        """Number of reps matching the list_reps filters"""
+        where, params = self._rep_filters(team, score_band, flagged)
+        query = "SELECT COUNT(*) FROM reps r"
+        if score_band is not None or flagged is not None:
+            query += " JOIN call_stats s ON s.scope = r.id"
+        if flagged is not None:
+            query += " LEFT JOIN churn_scores k ON k.rep_id = r.id"
+        with self._lock:
+            return self._conn.execute(f"{query} {where}", params).fetchone()[0]
+
+    def teams(self):
+        """Distinct team names, for filter pickers"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT team FROM reps WHERE team IS NOT NULL ORDER BY team")]
+
+    def rep_choices(self):
+        """(id, name) pairs for pickers, ordered by name"""
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute("SELECT id, name FROM reps ORDER BY name")]
+
+    def get_calls(self, rep_id, limit=20, offset=0):
+        """One page of a rep's call headers (date, outcome, escalation, score), newest first.
+
+        Bodies are not read; use get_call_detail for the call being opened.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, rep_id, call_date, outcome, escalation, sentiment_score, source FROM calls "
+                "WHERE rep_id = ? ORDER BY call_date DESC, id DESC LIMIT ? OFFSET ?",
+                (rep_id, limit, offset),
+            ).fetchall()
+        return [dict(row, escalation=bool(row["escalation"])) for row in rows]
+
+    def get_call_detail(self, call_id):
+        """Transcript and analysis of one call, decompressed, or None if there is no such call"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT t.body AS transcript, a.body AS analysis, a.model_name FROM calls c "
+                "LEFT JOIN transcripts t ON t.call_id = c.id LEFT JOIN analyses a ON a.call_id = c.id WHERE c.id = ?",
+                (call_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        analysis = _decompress(row["analysis"])
+        return {
+            "transcript": _decompress(row["transcript"]) or "",
+            "analysis": json.loads(analysis) if analysis else {},
+            "model_name": row["model_name"],
+        }
+
+    def search_calls(self, query, rep_id=None, date_from=None, date_to=None, limit=20, offset=0):
+        """Calls whose transcript matches query, best match first, as headers plus a snippet.
+
+        See search.parse_query for the query syntax. Ranking is FTS5's bm25
+        over the newest RANK_WINDOW matching calls, so a term found in most
+        calls is ranked among recent ones rather than all of them.
+        """
+        text_match = parse_query(query)
+        if text_match is None:
+            return []
+        match = f"body : ({text_match})"
+        if rep_id is not None:
+            match += f" AND rep : {_fts_string(rep_id)}"
+        months = _month_tokens(date_from, date_to)
+        if months is not None:
+            match += " AND month : (" + " OR ".join(months) + ")"
+
+        clauses, params = [], []
+        if date_from is not None:
+            clauses.append("c.call_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("c.call_date <= ?")
+            params.append(date_to)
+        with self._lock:
+            floor = None
+            if months is not None or not clauses:
+                # (Without month tokens the newest matches could all fall outside the date range)
+                floor = self._conn.execute(
+                    "SELECT rowid FROM transcript_index WHERE transcript_index MATCH ? "
+                    "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                    (match, RANK_WINDOW - 1),
+                ).fetchone()
+            window = "AND rowid >= ?" if floor is not None else ""
+            window_params = [floor[0]] if floor is not None else []
+            rows = self._conn.execute(
+                "SELECT c.id, c.rep_id, c.call_date, c.outcome, c.escalation, c.sentiment_score, c.source, "
+                "m.rank, t.body AS transcript "
+                f"FROM (SELECT rowid, rank FROM transcript_index WHERE transcript_index MATCH ? {window}) m "
+                "JOIN calls c ON c.id = m.rowid LEFT JOIN transcripts t ON t.call_id = c.id "
+                f"{'WHERE ' + ' AND '.join(clauses) if clauses else ''} ORDER BY m.rank LIMIT ? OFFSET ?",
+                (match, *window_params, *params, limit, offset),
+            ).fetchall()
+        results = []
+        for row in rows:
+            call = dict(row, escalation=bool(row["escalation"]))
+            call["snippet"] = snippet(_decompress(call.pop("transcript")) or "", query)
+            results.append(call)
+        return results
+
+    def find_calls(self, outcome=None, escalation=None, date_from=None, date_to=None, limit=100):
+        """Calls matching all given filters, newest first, without transcript bodies"""
+        clauses, params = [], []
+        if outcome is not None:
+            clauses.append("outcome = ?")
+            params.append(outcome)
+        if escalation is not None:
+            clauses.append("escalation = ?")
+            params.append(int(escalation))
+        if date_from is not None:
+            clauses.append("call_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("call_date <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, rep_id, call_date, outcome, escalation, sentiment_score, source "
+                f"FROM calls {where} ORDER BY call_date DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self):
+        """Totals for the overview header from the global rollup: reps, calls, average sentiment, escalations, outcomes"""
+        with self._lock:
+            reps = self._conn.execute("SELECT COUNT(*) FROM reps").fetchone()[0]
+            stats = self._conn.execute(
+                "SELECT call_count, sentiment_avg, escalations FROM call_stats WHERE scope = ?", (ALL_CALLS,)
+            ).fetchone()
+            outcomes = self._outcomes(ALL_CALLS)
+        return {
+            "reps": reps,
+            "calls": stats["call_count"] if stats else 0,
+            "avg_sentiment": (stats["sentiment_avg"] if stats else None) or 0.0,
+            "escalations": stats["escalations"] if stats else 0,
+            "outcomes": outcomes,
+        }
+
+    def analysis_sources(self):
+        """Number of saved calls per analysis model (e.g. Gemini vs local triage)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model_name, COUNT(*) FROM analyses WHERE model_name IS NOT NULL GROUP BY model_name ORDER BY 2 DESC"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
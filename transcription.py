@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from audio import SAMPLE_RATE, decode_audio, split_on_silence, trim_non_speech
+
+HOP_LENGTH = 160  # audio samples per Whisper mel frame, used for segment 'seek'
+LONG_AUDIO_SECONDS = float(os.environ.get("LONG_AUDIO_SECONDS", 600))
+TRIM_NON_SPEECH = os.environ.get("TRIM_NON_SPEECH", "1") != "0"
+
+# Per-process transcription backend, loaded once by init_worker
+_worker_model = None
+
+
+def init_worker(whisper_model_name, torch_threads=None):
+    """Load the transcription backend once per worker process.
+
+    torch_threads limits intra-op threads so N workers share the cores instead
+    of each trying to use all of them; TRANSCRIBE_THREADS overrides it.
+    """
+    global _worker_model
+    from backends import TRANSCRIBE_THREADS, load_backend
+    # Workers share the weights when a memory-mappable checkpoint exists
+    _worker_model = load_backend(whisper_model_name, threads=TRANSCRIBE_THREADS or torch_threads)
+
+
+def transcribe_in_worker(audio, options):
+    """Transcribe a path or sample array inside a worker process"""
+    return _worker_model.transcribe(audio, **options)
+
+
+def transcribe_file_in_worker(path, options, trim=False):
+    """Transcribe one file inside a worker process, returning (path, result, seconds, error).
+
+    The result carries 'audio_seconds' (the recording's length) either way.
+    """
+    start = time.perf_counter()
+    try:
+        # Decoded here rather than by whisper from the path, so the recording's length is known
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read(), filename=path)
+        if trim:
+            result = transcribe_speech_only(lambda a: transcribe_in_worker(a, options), audio)
+        else:
+            result = dict(transcribe_in_worker(audio, options), audio_seconds=round(len(audio) / SAMPLE_RATE, 2))
+        return path, result, time.perf_counter() - start, None
+    except Exception as e:
+        return path, None, time.perf_counter() - start, str(e)
+
+
+def create_worker_pool(whisper_model_name, workers):
+    """Process pool whose workers each hold one Whisper model and a fair share of the cores"""
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn keeps torch state out of the forked children
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(whisper_model_name, torch_threads),
+    )
+
+
+def transcribe_speech_only(transcribe, audio):
+    """Drop non-speech spans, transcribe the rest with transcribe(audio), and map timestamps back.
+
+    The result gets 'audio_seconds' and 'skipped_seconds' so the decode time
+    and prompt tokens saved per call can be measured.
+    """
+    trimmed, offsets = trim_non_speech(audio, SAMPLE_RATE)
+    if len(trimmed):
+        result = offsets.remap_result(transcribe(trimmed))
+    else:
+        result = {"text": "", "segments": [], "language": None}
+    result["audio_seconds"] = round(offsets.original_seconds, 2)
+    result["skipped_seconds"] = round(offsets.skipped_seconds, 2)
+    return result
+
+
+def merge_results(chunk_results, offsets):
+    """Merge per-chunk Whisper results into one result with timestamps on the original timeline.
+
+    offsets are chunk start times in seconds. Segment ids are renumbered and
+    'seek' is shifted by the chunk offset in mel frames.
+    """
+    segments = []
+    texts = []
+    for result, offset in zip(chunk_results, offsets):
+        seek_offset = int(round(offset * SAMPLE_RATE / HOP_LENGTH))
+        for seg in result.get("segments", []):
+            seg = dict(seg, id=len(segments), start=seg["start"] + offset, end=seg["end"] + offset)
+            if "seek" in seg:
+                seg["seek"] += seek_offset
+            if "words" in seg:
+                seg["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in seg["words"]]
+            segments.append(seg)
+        text = result.get("text", "").strip()
+        if text:
+            texts.append(text)
+
+    language = next((r.get("language") for r in chunk_results if r.get("language")), None)
+    return {"text": " ".join(texts), "segments": segments, "language": language}
+
+
+def transcribe_long(pool, audio, options, target_chunk_seconds=120.0, on_wait=None, wait_seconds=1.0):
+    """Transcribe a long recording by splitting it on silence and decoding chunks in parallel.
+
+    pool is a create_worker_pool() executor. on_wait(done, total), if given,
+    is called every wait_seconds while chunks are outstanding (a job
+    worker's heartbeat). Returns the same text/segments dict as whisper's
+    transcribe.
+    """
+    chunks = split_on_silence(audio, SAMPLE_RATE, target_seconds=target_chunk_seconds)
+    futures = [pool.submit(transcribe_in_worker, audio[start:end], options) for start, end in chunks]
+    if on_wait is not None:
+        while True:
+            done, pending = wait(futures, timeout=wait_seconds)
+            if not pending:
+                break
+            on_wait(len(done), len(futures))
+    results = [f.result() for f in futures]
+    return merge_results(results, [start / SAMPLE_RATE for start, _ in chunks])
@@ -0,0 +1,126 @@
+"""Local triage: answer clear-cut routine calls without Gemini.
+
+classify() scores a Whisper result with Arabic lexicons (resolution,
+dissatisfaction and follow-up cues, weighted towards the closing turns, as
+CALL_ANALYSIS_PROMPT's rules are) plus segment features (length, ASR
+confidence), and returns the prompt's JSON schema with a 'confidence'.
+route() keeps the answer only for calls that look resolved with confidence
+at least TRIAGE_MIN_CONFIDENCE; anything that may need escalation or is
+uncertain still goes to Gemini. Enable with LOCAL_TRIAGE=1. Calls answered
+locally are saved with model name TRIAGE_MODEL_NAME, so the share routed
+locally can be read from the call store (CallStore.analysis_sources()).
+"""
+import json
+import os
+import time
+
+from search import normalize_arabic, terms
+
+LOCAL_TRIAGE = os.getenv("LOCAL_TRIAGE", "0") == "1"
+TRIAGE_MIN_CONFIDENCE = float(os.getenv("TRIAGE_MIN_CONFIDENCE", 0.85))
+TRIAGE_MODEL_NAME = "local-triage"
+CLOSING_WORDS = 80  # the closing turns the sentiment and escalation rules look at
+RESOLUTION_WORDS = 30  # resolution cues count only this close to the end, not in a short call's opening complaint
+LONG_CALL_WORDS = 800
+LOW_ASR_LOGPROB = -0.8
+
+# Normalized phrases (see search.normalize_arabic), matched as substrings of normalized text.
+# An explicit resolution cue is required to answer a call locally; "تم الغاء" is a service change done
+# on request, while cancelling the line or the contract (CANCELLATION, shared with churn.py) is not.
+RESOLVED = ("تم حل", "اتحلت", "انحلت", "تم ارجاع", "رجعت المبلغ", "تم تفعيل", "تم الغاء", "تم تعديل", "اشتغل")
+# Courtesies that end almost every call, resolved or not: a small bonus, never a resolution on their own
+PLEASANTRIES = ("شكرا", "مشكور", "يعطيك العافيه", "الله يسعدك", "ممتاز", "تمام")
+CANCELLATION = ("الغي الخط", "الغاء الخط", "اقطع الخط", "الغاء الاشتراك", "انهاء الاشتراك", "انهاء العقد",
+                "شركه ثانيه", "شركه اخري")
+DISSATISFIED = ("غير راض", "مش راضي", "مو راضي", "زعلان", "سيء", "مستاء", "حرام عليكم", "مش معقول", "كل مره",
+                "نفس المشكله", "لم يتم", "ما انحلت", "ما اتحلت", "لسه", "ما اشتغل", "مش شغال", "لا يعمل",
+                "للاسف", "لا استطيع", "ما نقدر", "مش ممكن") + CANCELLATION
+ESCALATION = ("المدير", "مديرك", "المسؤول", "شكوي", "اشتكي", "سيتصل بك", "هنتواصل", "راح نتواصل", "الفريق الفني",
+              "تذكره", "بلاغ", "خلال 24 ساعه", "خلال يومين")
+ISSUES = {
+    "فاتوره": "Billing issue", "خصم": "Unexpected deduction", "رصيد": "Balance issue", "انترنت": "Internet connectivity",
+    "النت": "Internet connectivity", "تجوال": "Roaming", "باقه": "Package or plan", "شبكه": "Network coverage",
+    "تغطيه": "Network coverage", "شريحه": "SIM card", "راوتر": "Router",
+}
+
+
+def _hits(text, phrases):
+    return [phrase for phrase in phrases if phrase in text]
+
+
+def classify(result):
+    """The CALL_ANALYSIS_PROMPT schema for a Whisper result, plus 'confidence' (0-1) in the local answer"""
+    words = terms(result.get("text", ""))
+    text = " ".join(normalize_arabic(result.get("text", "")).split())
+    closing = " ".join(normalize_arabic(" ".join(result.get("text", "").split()[-CLOSING_WORDS:])).split())
+    last_turns = " ".join(closing.split()[-RESOLUTION_WORDS:])
+    resolved = _hits(last_turns, RESOLVED)
+    pleasantries = _hits(last_turns, PLEASANTRIES)
+    dissatisfied = _hits(closing, DISSATISFIED)
+    escalation = _hits(closing, ESCALATION)
+    earlier_complaints = len(_hits(text, DISSATISFIED + ESCALATION))
+
+    confidence = 0.5
+    confidence += 0.3 if resolved else -0.2
+    confidence += 0.1 if len(resolved) >= 2 else 0
+    confidence += 0.05 if pleasantries else 0
+    confidence -= 0.3 * min(2, len(dissatisfied) + len(escalation))
+    confidence -= 0.05 * min(4, earlier_complaints)  # de-escalated calls are harder to read
+    confidence -= 0.1 if len(words) > LONG_CALL_WORDS else 0
+    segments = result.get("segments", [])
+    if segments and sum(s.get("avg_logprob", 0.0) for s in segments) / len(segments) < LOW_ASR_LOGPROB:
+        confidence -= 0.2  # the transcript itself may be wrong
+
+    unresolved = bool(dissatisfied or escalation) or not resolved
+    if dissatisfied or escalation:
+        sentiment, score = "Negative", max(10, 40 - 10 * len(dissatisfied))
+    elif resolved:
+        sentiment, score = "Positive", min(95, 75 + 5 * len(resolved) + 5 * bool(pleasantries))
+    else:
+        sentiment, score = "Neutral", 55
+    issues = list(dict.fromkeys(issue for keyword, issue in ISSUES.items() if keyword in text)) or ["General inquiry"]
+    if escalation:
+        summary = "The issue was handed to a follow-up or the customer asked to escalate."
+    elif unresolved:
+        summary = "No resolution was confirmed by the end of the call."
+    else:
+        summary = "The agent resolved the issue during the call and the customer confirmed it."
+    return {
+        "final_customer_sentiment": sentiment,
+        "sentiment_score": score,
+        "resolution_summary": summary,
+        "key_issues": issues,
+        "escalation_required": "Yes" if unresolved else "No",
+        "outcome": "unresolved" if unresolved else "resolved",
+        "confidence": round(max(0.0, min(1.0, confidence)), 2),
+    }
+
+
+def route(result, min_confidence=None):
+    """(local analysis or None, triage summary) for a Whisper result.
+
+    The local analysis has analyze_transcript's shape; None means the call
+    should go to Gemini. The summary says where it went and why.
+    """
+    min_confidence = TRIAGE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    start = time.perf_counter()
+    parsed = classify(result)
+    if parsed["escalation_required"] == "Yes":
+        reason = "possible escalation"
+    elif parsed["confidence"] < min_confidence:
+        reason = "low confidence"
+    else:
+        reason = None
+    triage = {"routed": "gemini" if reason else "local", "reason": reason, "confidence": parsed["confidence"]}
+    if reason:
+        return None, triage
+    elapsed = round(time.perf_counter() - start, 3)
+    analysis = {
+        "parsed": parsed,
+        "format": "json",
+        "raw": json.dumps(parsed, ensure_ascii=False, indent=2),
+        "usage": {},
+        "cached": False,
+        "timings": {"first_field_s": elapsed, "total_s": elapsed},
+    }
+    return analysis, triage
@@ -0,0 +1,247 @@
+"""Background workers that transcribe and analyze uploaded calls from the job queue.
+
+Usage:
+    python worker.py --workers 2 --concurrency 4
+
+Each worker process loads Whisper once (memory-mapped when converted, see
+models.py), runs --concurrency job threads that claim jobs from jobs.py, and
+sends their audio through one TranscriptionServer so windows from
+concurrent jobs are batched. Recordings longer than LONG_AUDIO_SECONDS are
+instead split on silence and transcribed in parallel by a process pool of
+LONG_AUDIO_WORKERS (transcription.transcribe_long), started on first use,
+so one long call is not decoded window by window on a single thread. Progress, streamed analysis fields and the
+final result are written to the job row for the app to poll; the analyzed
+call is saved to the call store. The app starts JOB_WORKERS of these itself
+(default 1); set JOB_WORKERS=0 and run this script to manage them separately.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+from analysis import gemini_model_name, stream_analysis
+from audio import SAMPLE_RATE, decode_audio
+from backends import TRANSCRIBE_BACKEND, backend_id, load_backend
+from cache import AnalysisCache, TranscriptCache
+from compaction import prompt_transcript
+from inference import TranscriptionServer
+from jobs import JobQueue, LeaseLost
+from metrics import record, set_source
+from models import MODEL_WARMUP, LazyModel, load_gemini
+from reps_data import reps_data
+from store import CallStore
+from transcription import LONG_AUDIO_SECONDS, TRIM_NON_SPEECH, create_worker_pool, transcribe_long, transcribe_speech_only
+from triage import LOCAL_TRIAGE, TRIAGE_MODEL_NAME, route
+
+WHISPER_MODEL_NAME = "turbo"
+GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
+TRANSCRIBE_OPTIONS = {"language": "ar"}
+POLL_SECONDS = 0.2
+HEARTBEAT_SECONDS = 1.0
+WORKER_HEARTBEAT_SECONDS = 5.0
+LONG_AUDIO_WORKERS = int(os.getenv("LONG_AUDIO_WORKERS", max(1, (os.cpu_count() or 1) // 4)))
+
+
+def default_models():
+    """Lazy Whisper and Gemini handles for one worker process"""
+    api_key = os.environ.get("GEMINI_API_KEY")
+    return {
+        "whisper": LazyModel(f"Whisper {WHISPER_MODEL_NAME} ({TRANSCRIBE_BACKEND})", lambda: load_backend(WHISPER_MODEL_NAME)),
+        "gemini": LazyModel(f"Gemini {GEMINI_MODEL_NAME}", lambda: load_gemini(GEMINI_MODEL_NAME, api_key)),
+    }
+
+
+def transcription_progress(transcription, whisper_model):
+    if transcription.state == "queued":
+        return "Waiting for the transcription model"
+    if transcription.windows_done == 0 and not whisper_model.ready:
+        return "Loading Whisper model"
+    return f"Transcribing: {transcription.windows_done} of {len(transcription.windows)} 30-second windows"
+
+
+class Worker:
+    """One worker process: shared models, caches and transcription server for its job threads"""
+
+    def __init__(self, name, models=None, server=None, queue=None):
+        self.name = name
+        self.queue = queue or JobQueue()
+        self.models = models or default_models()
+        self.server = server or TranscriptionServer(
+            self.models["whisper"].get, decode=lambda backend, windows, options: backend.decode_windows(windows, options)
+        )
+        self._long_pool = None
+        self._long_pool_lock = threading.Lock()
+        self.transcript_cache = TranscriptCache()
+        self.analysis_cache = AnalysisCache()
+        self.store = CallStore()
+        self.store.seed(reps_data)
+
+    def long_audio_pool(self):
+        """The process pool for long recordings, started by the first one"""
+        with self._long_pool_lock:
+            if self._long_pool is None:
+                self._long_pool = create_worker_pool(WHISPER_MODEL_NAME, LONG_AUDIO_WORKERS)
+            return self._long_pool
+
+    def state(self):
+        return ", ".join(f"{model.name}: {model.state}" for model in self.models.values())
+
+    def transcribe(self, job):
+        cache_options = dict(TRANSCRIBE_OPTIONS, trim_non_speech=TRIM_NON_SPEECH)
+        cache_key = TranscriptCache.make_key(job["audio_hash"], backend_id(WHISPER_MODEL_NAME), cache_options)
+        result = self.transcript_cache.get(cache_key)
+        if result is not None:
+            record("transcribe", 0.0, cached=True, backend=backend_id(WHISPER_MODEL_NAME))
+            return result, True
+
+        self.queue.heartbeat(job, "Decoding audio")
+        with open(job["audio_path"], "rb") as f:
+            audio = decode_audio(f.read(), filename=job["filename"])
+
+        queue_wait = 0.0
+
+        def transcribe(samples):
+            nonlocal queue_wait
+            if LONG_AUDIO_WORKERS > 1 and len(samples) / SAMPLE_RATE > LONG_AUDIO_SECONDS:
+                # Long calls: split on silence and transcribe the chunks in parallel
+                def on_wait(done, total):
+                    self.queue.heartbeat(job, f"Transcribing: {done} of {total} long-audio chunks")
+                return transcribe_long(self.long_audio_pool(), samples, TRANSCRIBE_OPTIONS,
+                                       on_wait=on_wait, wait_seconds=HEARTBEAT_SECONDS)
+            # Each job is its own session on the server, so concurrent jobs share batches fairly
+            transcription = self.server.submit(job["id"], samples, TRANSCRIBE_OPTIONS)
+            while not transcription.wait(HEARTBEAT_SECONDS):
+                self.queue.heartbeat(job, transcription_progress(transcription, self.models["whisper"]))
+            if transcription.started_at is not None:
+                queue_wait += transcription.started_at - transcription.submitted_at
+            if transcription.error:
+                raise transcription.error
+            return transcription.result
+
+        # Skip dead air and hold music; timestamps still refer to the original recording
+        start = time.perf_counter()
+        result = transcribe_speech_only(transcribe, audio) if TRIM_NON_SPEECH else transcribe(audio)
+        # Time spent behind other jobs in the server's queue is not transcription: keep it out of RTF and p95
+        elapsed, audio_seconds = time.perf_counter() - start - queue_wait, len(audio) / SAMPLE_RATE
+        record("transcribe", elapsed, cached=False, backend=backend_id(WHISPER_MODEL_NAME),
+               audio_seconds=round(audio_seconds, 2), rtf=round(elapsed / audio_seconds, 4) if audio_seconds else None,
+               queue_wait_s=round(queue_wait, 3))
+        self.transcript_cache.put(cache_key, result)
+        return result, False
+
+    def analyze(self, job, result):
+        # Clear-cut routine calls are answered locally, without loading or calling Gemini
+        analysis, triage = route(result) if LOCAL_TRIAGE else (None, None)
+        compaction = None
+        if analysis is not None:
+            model_name = TRIAGE_MODEL_NAME
+        else:
+            self.queue.heartbeat(job, "Analyzing with Gemini")
+            gemini_model = self.models["gemini"].get()
+            model_name = gemini_model_name(gemini_model)
+            compaction = prompt_transcript(result, gemini_model)
+            fields = {}
+            for event, payload in stream_analysis(
+                gemini_model, compaction.pop("text"), cache=self.analysis_cache, refresh=bool(job["refresh"])
+            ):
+                if event == "field":
+                    key, value = payload
+                    fields[key] = value
+                    self.queue.heartbeat(job, partial=fields)
+                else:
+                    analysis = payload
+        # Keep the call so the overview and profile pages include it
+        if analysis["parsed"]:
+            self.store.add_call(
+                job["rep_id"], date.fromtimestamp(job["created_at"]).isoformat(), result["text"], analysis["parsed"],
+                source=job["filename"], audio_hash=job["audio_hash"], model_name=model_name,
+            )
+            self.store.refresh_churn()
+        return dict(analysis, compaction=compaction, triage=triage)
+
+    def process(self, job):
+        """Run one claimed job to completion and store its result"""
+        result, transcript_cached = self.transcribe(job)
+        transcript = result.get("text", "")
+        analysis = self.analyze(job, result) if transcript.strip() else None
+        completed = self.queue.complete(job, {
+            "transcript": result,
+            "transcript_cached": transcript_cached,
+            "analysis": analysis,
+        })
+        if not completed:
+            raise LeaseLost(f"Job {job['id']} attempt {job['attempts']} finished after another worker took it over")
+
+    def job_loop(self, thread_name):
+        while True:
+            job = self.queue.claim(thread_name)
+            if job is None:
+                time.sleep(POLL_SECONDS)
+                continue
+            try:
+                self.process(job)
+            except LeaseLost as e:
+                # Another worker has the job now; it owns the row and the upload
+                print(f"{thread_name}: {e}")
+            except FileNotFoundError as e:
+                # The upload is gone; retrying cannot help
+                self.queue.fail(job, str(e), retry=False)
+            except Exception as e:
+                print(f"{thread_name}: job {job['id']} failed (attempt {job['attempts']}): {e}")
+                self.queue.fail(job, str(e))
+
+    def run(self, concurrency, parent_pid=None):
+        """Start the job threads and heartbeat until the parent process (if any) exits"""
+        if MODEL_WARMUP:
+            for model in self.models.values():
+                model.warm_up()
+        for i in range(concurrency):
+            threading.Thread(target=self.job_loop, args=(f"{self.name}/{i}",), name=f"job {i}", daemon=True).start()
+        while parent_pid is None or _alive(parent_pid):
+            self.queue.worker_seen(self.name, self.state())
+            time.sleep(WORKER_HEARTBEAT_SECONDS)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def run_worker(index, concurrency, parent_pid=None):
+    load_dotenv()
+    set_source("worker")
+    Worker(f"{socket.gethostname()}:{os.getpid()}:{index}").run(concurrency, parent_pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs per worker process")
+    parser.add_argument("--parent-pid", type=int, help="Exit when this process exits (set by the app)")
+    args = parser.parse_args()
+
+    if args.workers == 1:
+        run_worker(0, args.concurrency, args.parent_pid)
+        return
+    # spawn keeps torch state out of the children
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=run_worker, args=(i, args.concurrency, args.parent_pid), name=f"worker {i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()